@@ -0,0 +1,254 @@
+#coding: utf-8
+
+"""
+    Benchmark the camera layer end to end against local simulated
+    cameras (see ptzpresets.simulator): connecting, the preset and
+    status requests, moves until arrival, and the startup of the
+    model with several cameras. The simulated cameras speak ONVIF or
+    VISCA over IP (--driver visca). For ONVIF, the pre-serialized
+    GotoPreset, Stop and GetStatus requests are compared with zeep.
+    With --driver fake, the cameras are in-process fakes without 
+    latency, which measures the cost of the application itself.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from pathlib import Path
+
+from ptzpresets import camera
+from ptzpresets import devicecache
+from ptzpresets import globals
+from ptzpresets import model
+from ptzpresets import simulator
+from ptzpresets import utils
+from ptzpresets import viscadriver
+
+
+def make_presets(count):
+    """Return count presets spread over the pan and tilt range, as
+    (name, position) by token.
+    """
+    return {str(p + 1): (f'Preset {p + 1}',
+                         (-0.9 + 1.8 * p / max(count - 1, 1),
+                          0.5 - (p % 3) * 0.5, (p % 4) * 0.25))
+            for p in range(count)}
+
+
+def make_fake_config(count, presets):
+    """Return the configuration of count fake cameras."""
+    return {
+        f'fake{i + 1}': {
+            'cameraname': f'fake{i + 1}', 'driver': 'fake',
+            'presets': [{'token': t, 'name': n, 'position': p}
+                        for t, (n, p) in make_presets(presets).items()]
+        }
+        for i in range(count)
+    }
+
+
+def start_simulators(driver, count, presets, latency, jitter, 
+                     failure_rate):
+    """Start count ONVIF or VISCA simulators, each with presets 
+    presets. Each simulator gets its own loopback address, because 
+    connections are pooled per host. The names and positions of the 
+    presets of VISCA cameras are put in the preset store.
+    """
+    servers = []
+    for i in range(count):
+        cam = simulator.SimulatedCamera(
+            name=f'sim{i + 1}', presets=make_presets(presets),
+            latency=latency, jitter=jitter, failure_rate=failure_rate,
+            seed=i
+        )
+        if driver == 'visca':
+            server = simulator.ViscaSimulatorServer(
+                cam, host=f'127.0.0.{i + 1}')
+            for token, (name, position) in cam.presets.items():
+                viscadriver.store.set(cam.name, token, name, position)
+        else:
+            server = simulator.SimulatorServer(cam, host=f'127.0.0.{i + 1}')
+        server.start()
+        servers.append(server)
+    return servers
+
+
+def measure(func, repeat):
+    """Return the durations of repeat calls of func in seconds. Failed
+    calls are left out.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            continue
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(label, durations, repeat):
+    if not durations:
+        print(f'{label:<28} all {repeat} calls failed')
+        return
+    durations = sorted(durations)
+    p95 = durations[min(round(0.95 * len(durations)), len(durations) - 1)]
+    print(f'{label:<28} median {1000 * statistics.median(durations):8.2f} ms'
+          f'   p95 {1000 * p95:8.2f} ms   failed {repeat - len(durations)}')
+
+
+def benchmark_camera(config, repeat):
+    """Measure the requests to a single camera."""
+    cam = camera.Camera(config, connect=False)
+    report('connect (cold cache)', measure(cam.connect, 1), 1)
+    report('connect (warm cache)', measure(cam.connect, repeat), repeat)
+    tokens = list(cam.preset_names)
+    report('GetPresets', measure(cam.resync_presetnames, repeat), repeat)
+    report('GetStatus', measure(cam.get_status, repeat), repeat)
+    report('Stop', measure(cam.stop, repeat), repeat)
+    visits = iter(tokens * repeat)
+    report('GotoPreset', measure(lambda: cam.goto_preset(next(visits)),
+                                 repeat), repeat)
+
+    def goto_until_arrival():
+        token = next(visits)
+        cam.goto_preset(token)
+        if not cam.wait_until_at(cam.preset_positions[token], timeout=10):
+            raise TimeoutError
+    report('GotoPreset until arrival', measure(goto_until_arrival, repeat),
+           repeat)
+    cam.dispatcher.shutdown()
+
+
+def benchmark_soap(config, repeat):
+    """Measure the GotoPreset, Stop and GetStatus requests to an ONVIF
+    camera through zeep and through the pre-serialized fast path.
+    """
+    for label, fast_path in (('zeep', False), ('fast path', True)):
+        cam = camera.Camera({**config, 'soap_fast_path': fast_path})
+        visits = iter(list(cam.preset_names) * repeat)
+        report(f'GotoPreset ({label})', measure(
+            lambda: cam.driver.goto_preset(next(visits)), repeat), repeat)
+        report(f'Stop ({label})', measure(cam.driver.stop, repeat), repeat)
+        report(f'GetStatus ({label})', measure(cam.driver.get_status, 
+                                               repeat), repeat)
+        cam.dispatcher.shutdown()
+
+
+def benchmark_model(config, repeat):
+    """Measure the startup of the model, without and with a snapshot
+    of the presets. The user files are written to a temporary
+    directory instead of the user configuration directory.
+    """
+    user_dir = Path(tempfile.mkdtemp())
+    for name in ('PRESET_SNAPSHOT_FILE', 'PENDING_RENAMES_FILE',
+                 'TRAVEL_TIMES_FILE', 'PRESET_SPEEDS_FILE'):
+        setattr(globals, name, user_dir / getattr(globals, name).name)
+
+    def init_model():
+        m = model.Model(config)
+        m.init_model()
+        for cam in m.cameras.values():
+            cam.dispatcher.shutdown()
+
+    def init_model_cold():
+        globals.PRESET_SNAPSHOT_FILE.unlink(missing_ok=True)
+        init_model()
+    report(f'Model startup ({len(config)} cameras)',
+           measure(init_model_cold, repeat), repeat)
+    report('Model startup (snapshot)', measure(init_model, repeat), repeat)
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--driver',
+        choices=['onvif', 'visca', 'fake'],
+        help=('The driver of the cameras: ONVIF (default) or VISCA with '
+              'simulated cameras, or in-process fakes.'),
+        default='onvif'
+    )
+    argparser.add_argument(
+        '--cameras',
+        type=int,
+        help='The number of simulated cameras for the model startup.',
+        default=4
+    )
+    argparser.add_argument(
+        '--presets',
+        type=int,
+        help='The number of presets of each simulated camera.',
+        default=20
+    )
+    argparser.add_argument(
+        '--latency',
+        type=float,
+        help='The latency of each response in milliseconds.',
+        default=0
+    )
+    argparser.add_argument(
+        '--jitter',
+        type=float,
+        help='The maximum random deviation of the latency in milliseconds.',
+        default=0
+    )
+    argparser.add_argument(
+        '--failure-rate',
+        type=float,
+        help='The fraction of the requests that fail.',
+        default=0
+    )
+    argparser.add_argument(
+        '--repeat', '-r',
+        type=int,
+        help='The number of times each request is measured.',
+        default=20
+    )
+    argparser.add_argument(
+        '--wsdl-dir',
+        help=('The directory with the ONVIF WSDL files (by default, the '
+              'one of the first camera in the configuration file).')
+    )
+    argparser.add_argument(
+        '--config', '-c',
+        dest='config_file',
+        help=('A configuration file, other than the default '
+              'config.json in the current directory.'),
+        default=globals.DEFAULT_CONFIG_FILE
+    )
+    args = argparser.parse_args()
+    wsdl_dir = args.wsdl_dir
+    if wsdl_dir is None and args.driver == 'onvif':
+        try:
+            wsdl_dir = next(iter(utils.read_config(args.config_file)
+                                 .values()))['wsdl_dir']
+        except (OSError, StopIteration):
+            argparser.error('No WSDL directory: use --wsdl-dir.')
+
+    # Keep the device information and presets of the simulators out of
+    # the files of the application.
+    cache_dir = Path(tempfile.mkdtemp())
+    devicecache.cache = devicecache.DeviceCache(
+        cache_dir / globals.DEVICE_CACHE_FILE.name)
+    viscadriver.store = viscadriver.PresetStore(
+        cache_dir / globals.VISCA_PRESETS_FILE.name)
+    servers = []
+    if args.driver == 'fake':
+        config = make_fake_config(args.cameras, args.presets)
+    else:
+        servers = start_simulators(args.driver, args.cameras, args.presets,
+                                   args.latency / 1000, args.jitter / 1000,
+                                   args.failure_rate)
+        options = {'wsdl_dir': wsdl_dir} if args.driver == 'onvif' else {}
+        config = {s.camera.name: s.get_config(**options) for s in servers}
+    try:
+        benchmark_camera(next(iter(config.values())), args.repeat)
+        if args.driver == 'onvif':
+            benchmark_soap(next(iter(config.values())), args.repeat)
+        benchmark_model(config, args.repeat)
+    finally:
+        for server in servers:
+            server.stop()
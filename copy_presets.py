@@ -0,0 +1,61 @@
+#coding: utf-8
+
+"""
+    Export the presets of a camera to a file, or import exported 
+    presets into a camera (e.g. a replacement camera).
+"""
+
+import argparse
+
+from ptzpresets import camera
+from ptzpresets import globals
+from ptzpresets import presetfile
+from ptzpresets import utils
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        'action', 
+        choices=['export', 'import']
+    )
+    argparser.add_argument(
+        'camera',
+        help='The name of the camera in the configuration file.'
+    )
+    argparser.add_argument(
+        'preset_file',
+        help='The file to export the presets to or import them from.'
+    )
+    argparser.add_argument(
+        '--config', '-c',
+        dest='config_file',
+        help=('A configuration file, other than the default '
+              'config.json in the current directory.'),
+        default=globals.DEFAULT_CONFIG_FILE
+    )
+    argparser.add_argument(
+        '--dry-run', '-n',
+        action='store_true',
+        help='Only show what an import would change.'
+    )
+    args = argparser.parse_args()
+    config = utils.read_config(args.config_file)
+    if args.camera not in config:
+        argparser.error(f'Unknown camera: {args.camera}')
+
+    cam = camera.Camera(config[args.camera])
+    if args.action == 'export':
+        presetfile.export_presets(cam, args.preset_file)
+        print(f'{cam.name}: Exported {len(cam.preset_names_committed)} '
+              f'presets to {args.preset_file}')
+    else:
+        names = dict(cam.preset_names_committed)
+        positions = dict(cam.preset_positions)
+        plan, failures = presetfile.import_presets(
+            cam, presetfile.read_presets(args.preset_file), args.dry_run)
+        for line in plan.describe(names, positions):
+            print(f'{cam.name}: {line}')
+        for name, error in failures.items():
+            print(f'{cam.name}: Could not import {name} ({error!r})')
+    cam.dispatcher.shutdown()
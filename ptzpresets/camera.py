@@ -1,52 +1,123 @@
 #coding: utf-8
 
 """
-    Wrapper class for the ONVIFCamera class.
+    Camera class that keeps track of the presets of a camera and 
+    talks to it through a driver.
 """
 
 
-import onvif
+import threading
+import time
 
 from collections import ChainMap
 
+from ptzpresets import dispatcher
+from ptzpresets import driver
+from ptzpresets import easing
 from ptzpresets import errors
+from ptzpresets import globals
+from ptzpresets import positionindex
+from ptzpresets import route
+from ptzpresets import travelmodel
+
+
+def _is_at(position, target):
+    """Return True if position lies within POSITION_TOLERANCE of 
+    target on every axis.
+    """
+    return position is not None and max(
+        abs(p - t) for p, t in zip(position, target)
+    ) <= globals.POSITION_TOLERANCE
 
 
 class Camera:
-    """Camera class that wraps and eases the ONVIFCamera class.
+    """Camera class that eases the use of a camera.
 
     Attributes
     ----------
-    media_service: <ONVIFCamera media service>
-        Service neccessary to set and get a media profile token.
-    ptz_service: <ONVIFCamera PTZ service>
-        The PTZ service to which most functionality of the class
-        is tied.
+    driver: ptzpresets.driver.Driver
+        The driver that sends the requests to the camera: the one 
+        named by the "driver" key of the configuration (ONVIF by 
+        default).
     config: dictionary
         Host, port, user credentials and other configuration info
         needed to connect to the camera.
-    profile_token: string
-        The media profile token needed to use most of the camera's 
-        functionality.
     preset_names: dictionary
         Names of the presets by token.
+    preset_positions: dictionary
+        Positions of the presets by token as (pan, tilt, zoom) tuples
+        (None if the position is unknown).
+    preset_speeds: dictionary
+        Speed profiles of the presets by token: dictionaries with
+        the pan_tilt and zoom velocity (0 to 1) at which the camera 
+        moves to the preset. Stored locally, not in the camera.
+    is_connected: boolean
+        Flag that indicates whether the camera has been connected.
+    health: ptzpresets.health.CircuitBreaker
+        The circuit breaker that keeps track of the health of the 
+        camera and makes requests fail fast while it is down.
+    dispatcher: ptzpresets.dispatcher.CommandDispatcher
+        Queue that sends commands to the camera in the background,
+        one at a time.
+    position: tuple
+        The last known (pan, tilt, zoom) position (None if unknown).
+    travel_model: ptzpresets.travelmodel.TravelModel
+        The travel times learned from the moves to presets.
+    expected_arrival: float
+        The time.monotonic() time at which the camera is expected to
+        arrive at the preset it is moving to (None if unknown).
 
     Methods
     -------
-    get_default_profile_token(): string
-        Get the first media profile token defined in the
-        media service of the camera.
+    connect():
+        Connect to the camera and load its presets. Device information
+        is taken from the device cache where possible.
+    load_snapshot(presets):
+        Initialize the presets from a snapshot (as returned by 
+        get_snapshot) without connecting to the camera.
+    get_snapshot(): list
+        Return the committed presets as a list of dictionaries 
+        with token, name and position.
+    get_ptz_limits(): dictionary
+        Return the limits of the PTZ node (see devicecache.ptz_limits),
+        which are only requested from the camera if they have not
+        been cached.
     get_presets(): list
-        Get all presets defined in the default media profile.
-        This includes the PTZ position details.
+        Get all presets of the camera as dictionaries with token,
+        name and position.
     set_preset(name=None, token=None): string
         Save the current camera position as a PTZ preset. Overwrite
         the current position if token is not None. Return the preset 
         token.
-    goto_preset(token): <GotoPresetResponse>
-        Move the camera to the preset position.
-    get_position(token): dictionary
-        Get the camera position of a preset.
+    set_preset_at(position, name=None, token=None): string
+        Move the camera to a (pan, tilt, zoom) position and save it as
+        a PTZ preset once it has arrived. Return the preset token.
+    resync_presetnames():
+        Reload the committed preset names from the camera.
+    goto_preset(token, speed=None):
+        Move the camera to the preset position: with GotoPreset (at
+        the given speed profile), or along an eased path if the 
+        camera is configured to make smooth moves.
+    stop():
+        Stop the camera where it is.
+    wait_until_idle(timeout=None, should_stop=None): boolean
+        Block until the camera has stopped moving.
+    wait_until_at(position, timeout=None, should_stop=None): boolean
+        Block until the camera has arrived at a position.
+    get_status(): dictionary
+        Get the current position as a (pan, tilt, zoom) tuple and 
+        whether the camera is moving. Record the duration of the
+        move to a preset when it has arrived.
+    estimate_travel_time(token): float
+        Return the predicted number of seconds to move from the 
+        current position to a preset.
+    subscribe_ptz_events(termination_time):
+        Create a PullPoint subscription for the camera's events.
+    pull_ptz_events(timeout, message_limit): list
+        Wait for notifications on the subscription and return the
+        PTZ events among them.
+    unsubscribe_ptz_events():
+        End the PullPoint subscription.
     rename_preset(token, new_name, force_commit):
         Rename a preset by going to it and setting a new with
         a new name. Because the PTZ service does not provide a separate 
@@ -54,71 +125,373 @@ class Camera:
         that the new name will not be attached to the wrong position.
     delete_preset(token):
         Delete a preset.
-    find_preset_by_position(position, ignore_space=True)
-        Return the preset token that matches the current PTZ position. 
-        Return None if no preset matches the current settings.
-    commit_all_presetrenames():
+    find_preset_by_position(position, tolerance=None)
+        Return the token of the preset nearest to a PTZ position, 
+        within a tolerance per axis. Return None if no preset is
+        near enough.
+    plan_visits(tokens): list
+        Return the preset tokens in the order that keeps the travel
+        time from the current position short.
+    commit_all_presetrenames(should_stop=None, on_committed=None):
         Commit all preset renames that have not been committed yet.
     """
-    def __init__(self, config):
-        self._create_camera(config)
-        self.media_service = self.camera.create_media_service()
-        self.profile_token = self.get_default_profile_token()
-        self.ptz_service = self.camera.create_ptz_service()
-        self.preset_names_committed = {p['token'] : p['Name'] 
-                                       for p in self.get_presets()}
+    def __init__(self, config, connect=True):
+        """
+        Parameters
+        ----------
+        config : dict()
+            The configuration of the camera.
+        connect : bool
+            Connect to the camera right away (if that fails, the 
+            error is raised and the dispatcher is shut down). 
+            Otherwise, connect() has to be called before the camera
+            can be used.
+        """
+        self.name = config['cameraname']
+        self.config = config
+        self.driver = driver.create_driver(config)
+        self.is_connected = False
+        self.health = self.driver.health
+        self.preset_names_committed = dict()
         self.preset_names_uncommitted = dict()
         self.preset_names = ChainMap(self.preset_names_uncommitted, 
                                      self.preset_names_committed)
+        self.preset_positions = dict()
+        self.preset_speeds = dict()
+        self._position_index = None
+        self._position_resync = None    # Future of the queued resync
+        self.dispatcher = dispatcher.CommandDispatcher(self.name)
+        self.position = None
+        self.travel_model = travelmodel.TravelModel()
+        self.expected_arrival = None
+        self._move = None
+        self._move_lock = threading.Lock()
+        if connect:
+            try:
+                self.connect()
+            except BaseException:
+                # The camera object is lost to the caller, so its
+                # dispatcher thread would run for the life of the process.
+                self.dispatcher.shutdown()
+                raise
 
-    def _create_camera(self, config):
-        self.name = config['cameraname']
-        try:
-            self.camera = onvif.ONVIFCamera(
-                host=config['ip'],
-                port=config['port'],
-                wsdl_dir=config['wsdl_dir'],
-                user=config['user'],
-                passwd=config['password']
-            )
-        except:
-            raise errors.CouldNotCreateCameraError
-
-    def get_default_profile_token(self):
-        profiles = self.media_service.GetProfiles()
-        return profiles[0].token
+    def connect(self):
+        """Connect to the camera and load its presets."""
+        self._load_presets(self.driver.connect())
+        self.is_connected = True
+
+    def load_snapshot(self, presets):
+        """Initialize the committed presets from a snapshot: a list of
+        dictionaries with token, name and position.
+        """
+        self._set_committed_presets(presets)
+
+    def get_snapshot(self):
+        """Return the committed presets as a list of dictionaries
+        with token, name and position.
+        """
+        return [
+            {'token': t, 'name': n, 'position': self.preset_positions.get(t)}
+            for t, n in self.preset_names_committed.items()
+        ]
+
+    def get_ptz_limits(self):
+        """Return the limits of the camera (see 
+        devicecache.ptz_limits), or None if they are unknown.
+        """
+        if not self.is_connected:
+            return None
+        return self.driver.get_ptz_limits()
 
     def get_presets(self):
-        return self.ptz_service.GetPresets(self.profile_token)
+        return self.driver.get_presets()
 
     def get_committed_presetnames(self):
-        return {p['token'] : p['Name'] for p in self.get_presets()}
+        return {p['token'] : p['name'] for p in self.get_presets()}
+
+    def resync_presetnames(self):
+        """Reload the committed preset names and positions from the 
+        camera.
+        """
+        self._load_presets(self.get_presets())
+
+    def _load_presets(self, presets):
+        """Set the committed preset names and positions."""
+        self._set_committed_presets(presets)
+
+    def _set_committed_presets(self, presets):
+        """Replace the committed preset names and positions by those
+        of presets. The dictionaries are replaced rather than updated
+        in place: presets are reloaded in the background while the
+        main thread reads them, which then sees either the old or the
+        new presets, never an empty or half updated dictionary.
+        """
+        names = {p['token']: p['name'] for p in presets}
+        positions = {
+            p['token']: tuple(p['position']) if p['position'] else None 
+            for p in presets
+        }
+        self.preset_positions = positions
+        self.preset_names.maps[1] = names
+        self.preset_names_committed = names
+        self._position_index = None
 
     def set_preset(self, preset_name=None, preset_token=None):
-        response = self.ptz_service.SetPreset({
-            'ProfileToken': self.profile_token, 
-            'PresetToken': preset_token,
-            'PresetName': preset_name
-        })
-        self.preset_names_committed = self.get_committed_presetnames()
+        """Save the current position as a preset and return its token.
+        The committed names are updated from the returned token and
+        the requested name, which saves a GetPresets round-trip.
+        Raise errors.PresetLimitError if a new preset does not fit in
+        the camera.
+        """
+        if preset_token not in self.preset_names_committed:
+            limits = self.get_ptz_limits()
+            if limits is not None and limits['max_presets'] is not None \
+                    and len(self.preset_names_committed) \
+                    >= limits['max_presets']:
+                raise errors.PresetLimitError
+        response = self.driver.set_preset(preset_name, preset_token)
+        self.preset_positions[response] = None     # Until the next resync
+        self._position_index = None
+        if preset_name is not None:
+            self.preset_names_committed[response] = preset_name
+        elif response not in self.preset_names_committed:
+            # A new preset without a name gets a name chosen by
+            # the camera, which can only be found out by asking.
+            self.resync_presetnames()
         return response
 
-    def goto_preset(self, preset_token):
-        response = self.ptz_service.GotoPreset({
-            'ProfileToken': self.profile_token, 
-            'PresetToken': preset_token
-        })
-        # Commit rename, if needed.
-        if preset_token in self.preset_names_uncommitted:
-            new_name = self.preset_names_uncommitted.pop(preset_token)
+    def set_preset_at(self, position, preset_name=None, preset_token=None,
+                      timeout=None):
+        """Move to position (a (pan, tilt, zoom) tuple) and save it
+        as a preset as soon as the camera has arrived. Return the 
+        preset token. Raise errors.MoveTimeoutError if the camera does
+        not arrive within timeout seconds.
+        """
+        self._send_absolute_move(position)
+        if not self.wait_until_at(position, timeout):
+            raise errors.MoveTimeoutError
+        token = self.set_preset(preset_name, preset_token)
+        self.preset_positions[token] = tuple(position)
+        return token
+
+    def goto_preset(self, preset_token, speed=None):
+        """Move to a preset. speed is a speed profile: a dictionary 
+        with the pan_tilt and zoom velocity (0 to 1). If it is None, 
+        the camera moves at its default speed. A pending rename of the
+        preset is committed once the camera has arrived.
+        """
+        if self.config.get('smooth_move', False):
+            is_sent = self._send_smooth_goto(preset_token)
+        else:
+            self._send_goto(preset_token, speed)
+            is_sent = True
+        # Commit rename, if needed, once the camera has arrived. That 
+        # is a command of its own, so that the move is reported done 
+        # as soon as it has been sent.
+        if is_sent and preset_token in self.preset_names_uncommitted:
+            self.dispatcher.submit(self._commit_rename_on_arrival, 
+                                   preset_token)
+
+    def _commit_rename_on_arrival(self, preset_token):
+        """Commit the pending rename of a preset once the camera has
+        arrived at it (or has stopped, if the position of the preset 
+        is unknown). The rename stays pending if the camera has not 
+        arrived within MOVE_TIMEOUT, or if another command for the 
+        camera is queued in the meantime.
+        """
+        target = self.preset_positions.get(preset_token)
+        if target is None:
+            is_arrived = self.wait_until_idle(
+                should_stop=self.dispatcher.pending)
+        else:
+            is_arrived = self.wait_until_at(
+                target, should_stop=self.dispatcher.pending)
+        new_name = self.preset_names_uncommitted.get(preset_token)
+        if is_arrived and new_name is not None:
             self.set_preset(new_name, preset_token)
-        return response
+            if self.preset_names_uncommitted.get(preset_token) == new_name:
+                del self.preset_names_uncommitted[preset_token]
+
+    def _send_goto(self, preset_token, speed=None):
+        self.driver.goto_preset(preset_token, speed)
+        self._start_move(preset_token, speed)
+
+    def _send_smooth_goto(self, preset_token):
+        """Move to a preset along an eased path, by sending a stream
+        of AbsoluteMove requests. The path is computed up front, so 
+        each step only sends a request. The stream stops as soon as 
+        another command for the camera is queued. Return True if the
+        whole path was sent. A preset with an unknown position is 
+        moved to with GotoPreset.
+        """
+        start = self.get_status()['position']
+        target = self.preset_positions.get(preset_token)
+        if start is None or target is None:
+            self._send_goto(preset_token)
+            return True
+        duration = max(
+            self.config.get('smooth_move_duration', 
+                            globals.SMOOTH_MOVE_DURATION),
+            self.travel_model.predict(start, target) or 0
+        )   # The camera cannot move faster than it does by itself.
+        steps = max(round(duration / globals.SMOOTH_MOVE_STEP_INTERVAL), 1)
+        curve = easing.get_easing(tuple(
+            self.config.get('smooth_move_easing', globals.SMOOTH_MOVE_EASING)))
+        path = easing.eased_path(start, target, curve, steps)
+        start_time = time.monotonic()
+        with self._move_lock:
+            # Not a move at the camera's own speed, so it is not timed.
+            self._move = None
+            self.expected_arrival = start_time + duration
+        is_arrived = True
+        for step, position in enumerate(path, start=1):
+            if self.dispatcher.pending():
+                is_arrived = False
+                break
+            self._send_absolute_move(position)
+            delay = start_time + step * duration / steps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.expected_arrival = None
+        return is_arrived
+
+    def _send_absolute_move(self, position):
+        self.driver.absolute_move(position)
+
+    def _start_move(self, preset_token, speed=None):
+        """Keep track of a move to a preset, so that its duration can
+        be recorded when the camera has arrived (see get_status). 
+        Only moves at the default speed are timed, because the travel
+        model describes that speed.
+        """
+        now = time.monotonic()
+        start = self.position
+        target = self.preset_positions.get(preset_token)
+        with self._move_lock:
+            if start is None or target is None or speed is not None:
+                self._move = None
+                self.expected_arrival = None
+                return
+            self._move = (now, start, target)
+            duration = self.travel_model.predict(start, target)
+            self.expected_arrival = (None if duration is None 
+                                     else now + duration)
+
+    def _finish_move(self, status):
+        """Record the duration of the move in progress if the camera
+        has arrived at its target.
+        """
+        now = time.monotonic()
+        with self._move_lock:
+            if self._move is None:
+                return
+            start_time, start, target = self._move
+            if now - start_time > globals.MOVE_TIMEOUT:
+                # Interrupted, or the preset cannot be reached.
+                self._move = None
+                self.expected_arrival = None
+                return
+            if status['is_moving'] or not _is_at(status['position'], target):
+                return
+            self._move = None
+            self.expected_arrival = None
+        delta = [t - s for s, t in zip(start, target)]
+        self.travel_model.add_sample(delta, now - start_time)
+
+    def stop(self):
+        """Stop the camera where it is. The move in progress is not
+        timed.
+        """
+        self.driver.stop()
+        with self._move_lock:
+            self._move = None
+            self.expected_arrival = None
+
+    def estimate_travel_time(self, preset_token):
+        """Return the predicted number of seconds to move from the
+        last known position to a preset, or None if it cannot be 
+        predicted (yet).
+        """
+        return self.travel_model.predict(
+            self.position, self.preset_positions.get(preset_token))
+
+    def wait_until_idle(self, timeout=None, interval=0.2, 
+                        should_stop=None):
+        """Block until the camera has stopped moving: it does not 
+        report moving and its position did not change (beyond 
+        POSITION_TOLERANCE) between two polls. Return False if it 
+        still moves after timeout seconds, or as soon as should_stop()
+        returns True.
+        """
+        if timeout is None:
+            timeout = globals.MOVE_TIMEOUT
+        deadline = time.monotonic() + timeout
+        previous = None
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            if should_stop is not None and should_stop():
+                return False
+            # Sleep first, a move that was just sent may not have 
+            # started yet.
+            status = self.get_status()
+            if not status['is_moving'] and previous is not None \
+                    and _is_at(status['position'], previous):
+                return True
+            previous = status['position']
+        return False
+
+    def wait_until_at(self, position, timeout=None, interval=0.1, 
+                      should_stop=None):
+        """Block until the camera does not move and is at position, 
+        within POSITION_TOLERANCE on every axis. The first poll waits 
+        for the predicted travel time. Return False if the camera has
+        not arrived after timeout seconds, or as soon as should_stop()
+        returns True.
+        """
+        if timeout is None:
+            timeout = globals.MOVE_TIMEOUT
+        deadline = time.monotonic() + timeout
+        delay = self.travel_model.predict(self.position, position) or interval
+        while True:
+            time.sleep(max(min(delay, deadline - time.monotonic()), 0))
+            if should_stop is not None and should_stop():
+                return False
+            status = self.get_status()
+            if not status['is_moving'] and _is_at(status['position'], 
+                                                  position):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            delay = interval
+
+    def get_status(self):
+        """Return the PTZ status as a dictionary with the current 
+        position ('position', a (pan, tilt, zoom) tuple) and whether
+        the camera reports that it is moving ('is_moving').
+        """
+        status = self.driver.get_status()
+        if status['position'] is not None:
+            self.position = status['position']
+        self._finish_move(status)
+        return status
+
+    def subscribe_ptz_events(self, termination_time):
+        """Create a PullPoint subscription that ends after 
+        termination_time seconds unless messages are pulled. Raise
+        NotImplementedError if the driver does not support events.
+        """
+        self.driver.subscribe_ptz_events(termination_time)
+
+    def pull_ptz_events(self, timeout, message_limit):
+        """Wait at most timeout seconds for notifications on the 
+        PullPoint subscription. Return the PTZ events among them 
+        (see events.parse_notification).
+        """
+        return self.driver.pull_ptz_events(timeout, message_limit)
 
-    def get_position(self):
-        response = self.ptz_service.GetStatus({
-            'ProfileToken': self.profile_token
-        })
-        return response['Position']
+    def unsubscribe_ptz_events(self):
+        """End the PullPoint subscription."""
+        self.driver.unsubscribe_ptz_events()
 
     def rename_preset(self, preset_token, new_name, force_commit=False):
         """Rename a preset. Because the PTZ service does not provide a
@@ -127,47 +500,95 @@ class Camera:
         In order to be able to rename presets without moving the 
         camera, the rename is deferred until the next time the preset 
         is chosen (unless force_commit=True). In the meantime, the 
-        rename action is stored as an uncommitted rename.
+        rename action is stored as an uncommitted rename. A forced 
+        commit waits until the camera has arrived at the preset before 
+        it is saved under the new name.
         """
         if force_commit:
-            self.goto_preset(preset_token)
+            self._send_goto(preset_token)
+            self.wait_until_idle()
             self.set_preset(new_name, preset_token)
+            if self.preset_names_uncommitted.get(preset_token) == new_name:
+                del self.preset_names_uncommitted[preset_token]
         else:
             self.preset_names_uncommitted[preset_token] = new_name
 
     def delete_preset(self, preset_token):
-        if preset_token in self.preset_names_committed:
-            del self.preset_names_committed[preset_token]
-        else:
-            del self.preset_names_uncommitted[preset_token]
-        return self.ptz_service.RemovePreset({
-            'ProfileToken': self.profile_token,
-            'PresetToken': preset_token
-        })
-
-    def find_preset_by_position(self, position, ignore_space=True):
-        """Return the preset token that matches the current PTZ position. 
-        Return None if no preset matches the current settings.
-        """
-        pos = dict(position)   # Force a copy by value
-        if ignore_space:
-            del pos['PanTilt']['space']
-            del pos['Zoom']['space']
-        for p in self.get_presets():
-            pre_pos = dict(p['PTZPosition'])
-            if ignore_space:
-                del pre_pos['PanTilt']['space']
-                del pre_pos['Zoom']['space']
-            if pre_pos == pos:
-                return p['token']
-        return None
-        #TODO: implement
+        self.preset_names_committed.pop(preset_token, None)
+        self.preset_names_uncommitted.pop(preset_token, None)
+        self.preset_positions.pop(preset_token, None)
+        self._position_index = None
+        self.driver.remove_preset(preset_token)
+
+    def find_preset_by_position(self, position, tolerance=None):
+        """Return the token of the preset nearest to position (a 
+        (pan, tilt, zoom) tuple), if it lies within tolerance on every
+        axis. Return None if no preset matches.
+        """
+        if tolerance is None:
+            tolerance = globals.POSITION_TOLERANCE
+        if position is None:
+            return None
+        token, _ = self._get_position_index().nearest(position, tolerance)
+        return token
+
+    def _get_position_index(self):
+        """Return the cached index of preset positions. Rebuild it if
+        it was invalidated. Positions that are unknown (presets saved 
+        since the last resync) are reloaded through the dispatcher (see
+        _resync_position_index), so that the reload is ordered with 
+        the commands that change the presets. Until it is done, an 
+        index of the known positions is returned, which is not cached.
+        This is called from other threads than the dispatcher's, so it
+        does not send requests itself.
+        """
+        index = self._position_index
+        if index is None:
+            positions = self.preset_positions
+            index = positionindex.PositionIndex(positions)
+            if not self.is_connected or None not in positions.values():
+                self._position_index = index
+            elif self._position_resync is None \
+                    or self._position_resync.done():
+                self._position_resync = self.dispatcher.submit(
+                    self._resync_position_index)
+        return index
+
+    def _resync_position_index(self):
+        """Reload the presets and cache the index of their positions,
+        also if some of them are still unknown (a camera need not 
+        report the position of a preset).
+        """
+        self.resync_presetnames()
+        self._position_index = positionindex.PositionIndex(
+            self.preset_positions)
         
-    def commit_all_presetrenames(self):
-        """Commit all preset renames that have not been committed yet.
+    def plan_visits(self, tokens):
+        """Return tokens in an order that keeps the total travel short,
+        starting from the current position. Use it for every job that
+        visits more than one preset.
+        """
+        try:
+            start = self.get_status()['position']
+        except Exception:
+            start = None    # Plan without a starting point.
+        positions = {t: self.preset_positions.get(t) for t in tokens}
+        return route.plan_route(start, positions, 
+                                self.travel_model.get_axis_weights())
+
+    def commit_all_presetrenames(self, should_stop=None, on_committed=None):
+        """Commit all preset renames that have not been committed yet,
+        visiting the presets in the order that keeps the travel short.
+        Before each rename, should_stop() is checked; if it returns 
+        True, the remaining renames stay uncommitted. After each 
+        rename, on_committed(token, new_name) is called.
         """
-        for token in list(self.preset_names_uncommitted.keys()):
-        # List forces a copy so that the dictionary can be changed 
+        for token in self.plan_visits(list(self.preset_names_uncommitted)):
+        # A list of the tokens, so that the dictionary can be changed 
         # during iteration.
-            new_name = self.preset_names_uncommitted.pop(token)
+            if should_stop is not None and should_stop():
+                break
+            new_name = self.preset_names_uncommitted[token]
             self.rename_preset(token, new_name, force_commit=True)
+            if on_committed is not None:
+                on_committed(token, new_name)
@@ -5,9 +5,12 @@ import json
 from functools import partial
 from pathlib import Path
 
+from ptzpresets import events
 from ptzpresets import globals
 from ptzpresets import model
+from ptzpresets import poller
 from ptzpresets import splashscreen
+from ptzpresets import tasks
 from ptzpresets import view
 
 
@@ -19,6 +22,9 @@ class Controller:
         self.master = master
         self.view = None
         self.buttons_presets = dict()
+        self.tasks = None
+        self.poller = None
+        self.subscribers = dict()
 
         self.splashscreen = splashscreen.Splashscreen(master)
         self.splashscreen.show_info('Starting PTZ presets...')
@@ -31,6 +37,15 @@ class Controller:
 
         self.build_main_view()
         self.master.deiconify()
+        self.tasks = tasks.TaskRunner(self.master)
+        self.model.register_health_observer(self.health_observer)
+        self.revalidate_presets()
+        self.poller = poller.StatusPoller(self.model.cameras, 
+                                          self.status_poll_callback)
+        self.poller.start()
+        for camera_key, cam in self.model.cameras.items():
+            if cam.is_connected:
+                self.start_event_subscription(camera_key)
 
     def status_observer(self):
         state = self.model.status.value
@@ -41,21 +56,59 @@ class Controller:
         if event == 'error':
             if state['error_message'] == 'camera_creation_error':
                 message = (f'{camera}: Could not connect to camera. '
-                           f'Continuing without it...')
+                           f'Retrying in the background...')
+            elif state['error_message'] == 'revalidation_error':
+                message = (f'{camera}: Could not connect to camera. '
+                           f'Retrying in {state["eta"]:.0f} s...')
+            elif state['error_message'] == 'camera_timeout_error':
+                message = (f'{camera}: Camera did not respond in time. '
+                           f'Retrying in the background...')
+            elif state['error_message'] == 'camera_unavailable':
+                message = (f'{camera}: Camera does not respond. '
+                           f'Retrying in the background...')
+            elif state['error_message'] == 'goto_error':
+                message = f'{camera}: Could not go to {name} ({token})'
+            elif state['error_message'] == 'save_error':
+                message = f'{camera}: Could not save {name} ({token})'
+            elif state['error_message'] == 'delete_error':
+                message = f'{camera}: Could not delete {name} ({token})'
+            elif state['error_message'] == 'add_error':
+                message = f'{camera}: Could not add new preset {name}'
             else:
                 message = f'{camera}: Unknown error...'
+        elif event == 'connected':
+            message = f'{camera}: Connected'
+        elif event == 'available':
+            message = f'{camera}: Camera responds again'
+        elif event == 'revalidated':
+            message = f'{camera}: Presets are up to date'
+        elif event == 'adding':
+            message = f'{camera}: Adding new preset {name}...'
         elif event == 'new':
-            message = f'{camera}: Adding new preset {name} ({token})'
+            message = f'{camera}: Added new preset {name} ({token})'
         elif event == 'save':
-            message = f'{camera}: Saving current position to {name} ({token})'
+            message = f'{camera}: Saving current position to {name} ({token})...'
+        elif event == 'save_done':
+            message = f'{camera}: Saved current position to {name} ({token})'
         elif event == 'rename':
             message = f'{camera}: Renamed to {name} ({token})'
         elif event == 'goto':
-            message = f'{camera}: Going to {name} ({token})'
+            message = f'{camera}: Going to {name} ({token})...'
+        elif event == 'goto_done':
+            message = f'{camera}: On its way to {name} ({token})'
+            if state['eta'] is not None:
+                message += f', arriving in about {state["eta"]:.1f} s'
         elif event == 'delete':
             message = f'{camera}: Deleting {name} ({token})...'
+        elif event == 'delete_done':
+            message = f'{camera}: Deleted {name} ({token})'
         elif event == 'commit_renames':
             message = f'{camera}: Committing all unsaved renames...'
+        elif event == 'rename_committed':
+            message = f'{camera}: Committed rename to {name} ({token})'
+        elif event == 'renames_postponed':
+            message = (f'{camera}: Unsaved renames will be committed '
+                       f'next time')
         if self.view is not None:
             self.view.statusbar.inform(message)
         else:
@@ -82,10 +135,143 @@ class Controller:
                         panel=panel)
             )
             self.buttons_presets[camera_key] = buttons_presets
+            panel.set_enabled(self.model.is_camera_available(camera_key))
         v.refresh(silent=True)
         v.register_quit_callback(self.quit_callback)
         self.view = v
         
+    def revalidate_presets(self):
+        """Connect the cameras whose presets were taken from the 
+        snapshot, or that could not be connected, in the background. 
+        Update their panels as soon as each camera responds.
+        """
+        for camera_key in self.model.get_unconnected_cameras():
+            self.revalidate_camera(camera_key)
+
+    def revalidate_camera(self, camera_key):
+        """Connect a camera in the background."""
+        # Connect through the camera's dispatcher, so that commands
+        # for the camera are queued until it is connected.
+        cam = self.model.cameras[camera_key]
+        self.tasks.watch(
+            cam.dispatcher.submit(self.model.revalidate_camera, camera_key),
+            on_done=partial(self.revalidation_callback, 
+                            camera_key=camera_key),
+            on_error=partial(self.revalidation_error, camera_key)
+        )
+
+    def revalidation_error(self, camera_key, error):
+        """Grey out the panel of a camera that could not be connected
+        and try again later. The delay grows with each failure, so 
+        that a camera that is down for a long time is not flooded with
+        connection attempts.
+        """
+        delay = self.model.revalidation_failed(camera_key, error)
+        self.view.presetpanels[camera_key].set_enabled(False)
+        self.master.after(round(delay * 1000),
+                          partial(self.revalidate_camera, camera_key))
+
+    def revalidation_callback(self, result, camera_key):
+        """Update the buttons of a revalidated camera. Only the buttons
+        of presets that were added, removed or renamed are touched.
+        """
+        added, removed, renamed = self.model.apply_revalidation(camera_key)
+        panel = self.view.presetpanels[camera_key]
+        for button, preset in list(self.buttons_presets[camera_key]):
+            if preset.token in removed:
+                panel.delete_presetbutton(button)
+                self.buttons_presets[camera_key].remove((button, preset))
+            elif preset.token in renamed:
+                button.rename(preset.name)
+        if added:
+            buttons = panel.create_presetbuttons(len(added))
+            for button, token in zip(buttons, added):
+                preset = self.model.get_preset(camera_key, token)
+                button.rename(preset.name)
+                button.register_callback(
+                    partial(self.presetbutton_callback, 
+                            camera_key=camera_key, preset=preset, 
+                            panel=panel)
+                )
+                self.buttons_presets[camera_key].append((button, preset))
+        panel.set_enabled(self.model.is_camera_available(camera_key))
+        panel.refresh()
+        self.start_event_subscription(camera_key)
+        
+    def health_observer(self, camera_key, state):
+        """Observer for the circuit breakers of the cameras (called 
+        from the thread of a request).
+        """
+        self.tasks.call_in_main(self.health_callback, camera_key)
+
+    def health_callback(self, camera_key):
+        """Grey out the panel of a camera while it is unavailable, so 
+        that it is clear that its buttons will not work.
+        """
+        panel = self.view.presetpanels[camera_key]
+        is_available = self.model.is_camera_available(camera_key)
+        if panel.is_enabled != is_available:
+            panel.set_enabled(is_available)
+            self.model.report_health(camera_key)
+
+    def status_poll_callback(self, camera_key, status):
+        """Callback for the status poller (called from a worker thread).
+        Find the preset at the current position of the camera and 
+        highlight its button in the Tk event loop.
+        """
+        token = self.model.find_current_preset(camera_key, status)
+        if not status['is_moving']:
+            self.tasks.call_in_main(self.highlight_current_preset, 
+                                    camera_key, token)
+
+    def highlight_current_preset(self, camera_key, token):
+        """Highlight the button of the preset at which the camera is, 
+        or no button if the camera is not at a preset.
+        """
+        panel = self.view.presetpanels[camera_key]
+        if token is None:
+            panel.unset_current_button()
+            return
+        for button, preset in self.buttons_presets[camera_key]:
+            if preset.token == token:
+                if panel.highlighted_button is not button:
+                    panel.set_current_button(button)
+                return
+
+    def start_event_subscription(self, camera_key):
+        """Receive the PTZ events of a camera that has "events": true
+        in its configuration. The camera is only polled regularly
+        while the subscription is not active.
+        """
+        cam = self.model.cameras[camera_key]
+        if not (cam.config.get('events') and cam.driver.supports_events) \
+                or camera_key in self.subscribers:
+            return
+        subscriber = events.PullPointSubscriber(
+            cam, self.ptz_event_callback,
+            on_subscribed=self.poller.pause,
+            on_failure=self.event_subscription_failed
+        )
+        self.subscribers[camera_key] = subscriber
+        subscriber.start()
+
+    def ptz_event_callback(self, camera_key, event):
+        """Callback for the event subscribers (called from the
+        subscriber thread). Highlight a reached preset right away.
+        For any other event, poll the camera until it is idle.
+        """
+        if event['preset'] is not None and event['is_moving'] is False:
+            self.tasks.call_in_main(self.highlight_current_preset,
+                                    camera_key, event['preset'])
+        else:
+            self.poller.poke(camera_key)
+
+    def event_subscription_failed(self, camera_key, error):
+        """Fall back to polling a camera whose subscription was given
+        up (called from the subscriber thread).
+        """
+        self.poller.resume(camera_key)
+
     def load_panel_layout(self):
         """Load the panel layout from a JSON file if it exists, 
         or else return a default layout that is determined by
@@ -120,8 +306,12 @@ class Controller:
         presets = self.model.presets[camera_key]
         if camera_key in layout:
             # camera_key does not have to be present in layout file
-            # (e.g. in case a new camera was added).
-            presets_ordered = [presets[t] for t in layout[camera_key]]
+            # (e.g. in case a new camera was added). Neither do all
+            # presets, if they were changed outside the application.
+            presets_ordered = [presets[t] for t in layout[camera_key]
+                               if t in presets]
+            presets_ordered.extend(p for t, p in presets.items() 
+                                   if t not in layout[camera_key])
         else:
             presets_ordered = presets.values()
         return [*zip(panel.presetbuttons, presets_ordered)]
@@ -135,9 +325,13 @@ class Controller:
 
     def presetbutton_callback(self, event, preset, panel, camera_key):
         """Callback function that is attached to each preset button.
+        Camera commands run in the background. The button shows that
+        they are pending until they are done or failed.
         """
         button = event.widget
         state = event.state_decoded
+        if not panel.is_enabled:
+            return      # The camera is unavailable.
         
         # CapsLock state should be ignored.
         state = state.replace('CapsLock-', '')
@@ -148,40 +342,95 @@ class Controller:
             # In the latter case it should be ignored.
             if not panel.is_widgets_reordered:
                 if state == '<ButtonRelease-Button-1>':
-                    preset.goto()
-                    panel.set_current_button(button)
+                    self.track_command(preset.goto(), 'goto', preset, 
+                                       panel, button)
+                elif state == '<Shift-Control-ButtonRelease-Button-1>':
+                    self.track_command(
+                        preset.goto(speed=globals.FAST_CUT_SPEED), 'goto', 
+                        preset, panel, button)
                 elif state == '<Shift-ButtonRelease-Button-1>':
-                    preset.save()
-                    panel.set_current_button(button)
+                    self.track_command(preset.save(), 'save', preset, 
+                                       panel, button)
                 elif state == '<Control-ButtonRelease-Button-1>':
                     new_name = button.rename(new_name=None)
                     preset.rename(new_name)
                 elif state == '<Alt-ButtonRelease-Button-1>':
-                    panel.delete_presetbutton(button)
-                    self.buttons_presets[camera_key].remove((button, preset))
-                    preset.delete()
+                    self.track_command(
+                        preset.delete(), 'delete', preset, panel, button,
+                        on_done=partial(self.delete_presetbutton, 
+                                        camera_key=camera_key, preset=preset, 
+                                        panel=panel, button=button)
+                    )
             else:
                 self.save_panel_layout()
                 panel.is_widgets_reordered = False
+
+    def track_command(self, future, action, preset, panel, button, 
+                      on_done=None):
+        """Show a camera command as pending on its button and report 
+        the outcome as soon as the command is done, has failed or 
+        was superseded by a newer command.
+        """
+        def done(result):
+            self.model.report_outcome(action, preset.camera.name, 
+                                      preset.token, preset.name)
+            self.poller.poke(preset.camera.name)
+            if on_done is not None:
+                on_done()
+            else:
+                panel.set_current_button(button)
+
+        def failed(error):
+            self.model.report_outcome(action, preset.camera.name, 
+                                      preset.token, preset.name, error)
+            panel.set_failed_button(button)
+
+        panel.set_pending_button(button)
+        self.tasks.watch(future, on_done=done, on_error=failed, 
+                         on_cancel=partial(panel.reset_button, button))
+
+    def delete_presetbutton(self, camera_key, preset, panel, button):
+        """Remove the button of a deleted preset."""
+        panel.delete_presetbutton(button)
+        self.buttons_presets[camera_key].remove((button, preset))
+        self.model.unregister_preset(camera_key, preset.token)
             
     def addbutton_observer(self, button, camera_key, panel):
-        """Observer function for the add button. Create a new preset 
-        and a button and connect them to each other.
-        """
-        token = self.model.add_preset(camera_key, button.rename)
-        preset = self.model.get_preset(camera_key, token)
-        button.register_callback(
-            partial(self.presetbutton_callback, camera_key=camera_key, 
-                    preset=preset, panel=panel)
-        )
-        self.buttons_presets[camera_key].append((button, preset))
-        panel.refresh()
-        panel.set_current_button(button)
+        """Observer function for the add button. Ask a name for the
+        new preset, save it in the background and connect the button 
+        to it as soon as it is saved.
+        """
+        new_name = button.rename(new_name=None)
+        panel.set_pending_button(button)
+
+        def done(token):
+            preset = self.model.register_preset(camera_key, token, new_name)
+            button.register_callback(
+                partial(self.presetbutton_callback, camera_key=camera_key, 
+                        preset=preset, panel=panel)
+            )
+            self.buttons_presets[camera_key].append((button, preset))
+            panel.refresh()
+            panel.set_current_button(button)
+
+        def failed(error):
+            self.model.report_outcome('add', camera_key, name=new_name, 
+                                      error=error)
+            panel.delete_presetbutton(button)
+
+        self.tasks.watch(self.model.add_preset(camera_key, new_name), 
+                         on_done=done, on_error=failed)
         
     def quit_callback(self):
         """Callback function that is called before the application 
         is shut down. 
         """
-        self.model.commit_uncommitted_renames()
+        self.poller.stop()
+        for subscriber in self.subscribers.values():
+            subscriber.stop()
+        self.model.commit_uncommitted_renames(
+            progress=self.view.update_idletasks)
+        self.model.save_snapshot()
+        self.model.save_travel_times()
         self.save_panel_layout()
                 
@@ -0,0 +1,152 @@
+#coding: utf-8
+
+"""
+    On-disk cache of the device information of the cameras (service
+    addresses, media profile and PTZ node limits), so that it does
+    not have to be requested at each startup.
+"""
+
+import json
+import os
+import threading
+import time
+
+from ptzpresets import globals
+
+
+_MISSING = object()
+
+def device_key(host, port, device_information):
+    """Return the cache key of a device: its address, serial number
+    and firmware version (from GetDeviceInformation). A replaced
+    camera or a firmware update gets a new key, and therefore fresh
+    information.
+    """
+    return (f'{host}:{port}/{device_information["SerialNumber"]}/'
+            f'{device_information["FirmwareVersion"]}')
+
+
+def _range(space):
+    """Return the XRange of the first space of a PTZ space list as a
+    [min, max] list (None if the node has no such space).
+    """
+    if not space:
+        return None
+    return [space[0]['XRange']['Min'], space[0]['XRange']['Max']]
+
+
+def ptz_limits(node):
+    """Return the limits of a PTZNode (from GetNode) as a dictionary
+    that can be stored as JSON:
+        max_presets: the maximum number of presets,
+        home_supported: whether the node has a home position,
+        pan_range, tilt_range, zoom_range: [min, max] of the absolute
+            position spaces,
+        pan_tilt_speed_range, zoom_speed_range: [min, max] of the
+            speed spaces.
+    Ranges that the node does not report are None.
+    """
+    spaces = node['SupportedPTZSpaces']
+    pan_tilt = spaces['AbsolutePanTiltPositionSpace']
+    return {
+        'max_presets': node['MaximumNumberOfPresets'],
+        'home_supported': node['HomeSupported'],
+        'pan_range': _range(pan_tilt),
+        'tilt_range': (None if not pan_tilt else
+                       [pan_tilt[0]['YRange']['Min'],
+                        pan_tilt[0]['YRange']['Max']]),
+        'zoom_range': _range(spaces['AbsoluteZoomPositionSpace']),
+        'pan_tilt_speed_range': _range(spaces['PanTiltSpeedSpace']),
+        'zoom_speed_range': _range(spaces['ZoomSpeedSpace']),
+    }
+
+
+class DeviceCache:
+    """Cache of device information by device key, stored in a JSON
+    file.
+
+    Each item is stored with the time it was stored. Items older than
+    max_age (or their own maximum age) are not returned, so that they
+    are requested from the camera again the next time they are needed
+    (and stored again). An item can be None, for instance to remember
+    that the camera could not provide it.
+    Items are only requested when needed: the PTZ node limits, for
+    instance, are not requested at startup.
+
+    Attributes
+    ----------
+    cache_file: pathlib.Path
+        The JSON file.
+    max_age: float
+        The number of seconds an item is valid.
+
+    Methods
+    -------
+    get(key, name, default=None): object
+        Return a cached item of a device, or default if it is not 
+        cached.
+    set(key, name, value, max_age=None):
+        Store an item of a device, valid for max_age seconds if given.
+    get_or_fetch(key, name, fetch): object
+        Return a cached item of a device, or call fetch() to get it
+        and store it.
+    invalidate(key):
+        Forget all items of a device.
+    """
+    def __init__(self, cache_file=None, max_age=None):
+        self.cache_file = cache_file or globals.DEVICE_CACHE_FILE
+        self.max_age = max_age or globals.DEVICE_CACHE_MAX_AGE
+        self._devices = None
+        self._lock = threading.Lock()
+
+    def get(self, key, name, default=None):
+        with self._lock:
+            item = self._load().get(key, dict()).get(name)
+        if item is None or time.time() - item['stored'] > item.get(
+                'max_age', self.max_age):
+            return default
+        return item['value']
+
+    def set(self, key, name, value, max_age=None):
+        item = {'value': value, 'stored': time.time()}
+        if max_age is not None:
+            item['max_age'] = max_age
+        with self._lock:
+            devices = self._load()
+            devices.setdefault(key, dict())[name] = item
+            self._save(devices)
+
+    def get_or_fetch(self, key, name, fetch):
+        value = self.get(key, name, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            self.set(key, name, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            devices = self._load()
+            if devices.pop(key, None) is not None:
+                self._save(devices)
+
+    def _load(self):
+        if self._devices is None:
+            try:
+                with open(self.cache_file, 'rt', encoding='utf8') as f:
+                    self._devices = json.load(f)
+            except (OSError, ValueError):
+                self._devices = dict()
+        return self._devices
+
+    def _save(self, devices):
+        """Write the cache atomically, so that a crash cannot leave a
+        partly written file behind.
+        """
+        temp_file = self.cache_file.with_name(
+            f'{self.cache_file.name}.{os.getpid()}.tmp')
+        with open(temp_file, 'wt', encoding='utf8') as f:
+            json.dump(devices, f, indent=4)
+        os.replace(temp_file, self.cache_file)
+
+
+cache = DeviceCache()
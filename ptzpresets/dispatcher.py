@@ -0,0 +1,129 @@
+#coding: utf-8
+
+"""
+    CommandDispatcher class that sends the commands for a camera
+    one at a time and coalesces superseded commands.
+"""
+
+import collections
+import concurrent.futures
+import threading
+
+
+class Command:
+    """A queued camera command.
+
+    Attributes
+    ----------
+    func: callable
+        The function that sends the command.
+    args, kwargs: tuple, dictionary
+        The arguments for func.
+    coalesce: string
+        Commands with the same coalesce key that are queued directly
+        after each other are coalesced: only the newest one is sent
+        (None means never coalesce).
+    future: concurrent.futures.Future
+        The future that receives the outcome of the command.
+    """
+    def __init__(self, func, args, kwargs, coalesce=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.coalesce = coalesce
+        self.future = concurrent.futures.Future()
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except BaseException as error:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+    def __repr__(self):
+        return (f'Command(func={getattr(self.func, "__name__", self.func)}, '
+                f'args={self.args}, coalesce={self.coalesce})')
+
+
+class CommandDispatcher:
+    """Send the commands for a single camera one at a time, from a
+    background thread, in the order in which they were submitted.
+
+    Commands that are superseded before they are sent are dropped:
+    when an operator clicks through presets quickly, only the newest
+    target is sent to the camera after the request in flight, instead
+    of all the outdated moves one after another.
+
+    Attributes
+    ----------
+    name: string
+        The name of the camera (used to name the thread).
+    in_flight: Command
+        The command that is being sent right now (None if idle).
+
+    Methods
+    -------
+    submit(func, *args, coalesce=None, **kwargs): Future
+        Queue a command and return the future of its outcome. If
+        coalesce is given, queued commands with the same key that
+        are not sent yet are cancelled in favour of this one.
+    pending(): integer
+        Return the number of commands that are waiting to be sent.
+    shutdown():
+        Cancel the waiting commands and stop the thread after the
+        command in flight.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.in_flight = None
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._is_shut_down = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'CommandDispatcher-{name}')
+        self._thread.start()
+
+    def submit(self, func, *args, coalesce=None, **kwargs):
+        """Queue a command and return its future."""
+        command = Command(func, args, kwargs, coalesce)
+        with self._condition:
+            if self._is_shut_down:
+                raise RuntimeError(f'Dispatcher {self.name} is shut down')
+            if coalesce is not None:
+                # Only coalesce the tail of the queue, so that commands
+                # are never reordered around other commands.
+                while self._queue and self._queue[-1].coalesce == coalesce:
+                    self._queue.pop().future.cancel()
+            self._queue.append(command)
+            self._condition.notify()
+        return command.future
+
+    def pending(self):
+        """Return the number of commands that are waiting."""
+        with self._condition:
+            return len(self._queue)
+
+    def shutdown(self):
+        """Cancel the waiting commands and stop the thread."""
+        with self._condition:
+            self._is_shut_down = True
+            while self._queue:
+                self._queue.popleft().future.cancel()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._is_shut_down:
+                    self._condition.wait()
+                if self._is_shut_down:
+                    return
+                self.in_flight = self._queue.popleft()
+            try:
+                self.in_flight.run()
+            finally:
+                with self._condition:
+                    self.in_flight = None
@@ -0,0 +1,133 @@
+#coding: utf-8
+
+"""
+    Driver protocol through which a Camera talks to a camera, and the
+    registry of the available drivers.
+"""
+
+import importlib
+
+from ptzpresets import errors
+from ptzpresets import health
+
+
+# The drivers by the name used for the "driver" key of a camera
+# configuration, as (module, class). A driver module is only imported
+# when a camera uses it, so that its dependencies are only needed then.
+# setup.py lists the package for the build, because the dependency
+# detection cannot follow these imports.
+DRIVERS = {
+    'onvif': ('ptzpresets.onvifdriver', 'ONVIFDriver'),
+    'visca': ('ptzpresets.viscadriver', 'ViscaDriver'),
+    'fake': ('ptzpresets.fakedriver', 'FakeDriver'),
+}
+DEFAULT_DRIVER = 'onvif'
+
+
+def create_driver(config):
+    """Return a new driver for a camera configuration. Raise
+    errors.UnknownDriverError if its driver does not exist.
+    """
+    name = config.get('driver', DEFAULT_DRIVER)
+    if name not in DRIVERS:
+        raise errors.UnknownDriverError(name)
+    module_name, class_name = DRIVERS[name]
+    return getattr(importlib.import_module(module_name), class_name)(config)
+
+
+class Driver:
+    """Base class of the camera drivers.
+
+    A driver sends the requests to a single camera. Positions are
+    (pan, tilt, zoom) tuples and speeds are speed profiles:
+    dictionaries with the pan_tilt and zoom velocity (0 to 1).
+    Presets are dictionaries with token, name and position (None if
+    unknown). Bookkeeping, such as the preset names and the travel
+    times, is left to the Camera.
+
+    Attributes
+    ----------
+    config: dictionary
+        The configuration of the camera.
+    name: string
+        The name of the camera.
+    health: ptzpresets.health.CircuitBreaker
+        The circuit breaker that keeps track of the health of the
+        camera.
+    supports_events: boolean
+        Flag that indicates whether the driver can subscribe to the
+        PTZ events of the camera.
+
+    Methods
+    -------
+    connect(): list
+        Connect to the camera and return its presets.
+    get_presets(): list
+        Return the presets.
+    set_preset(name=None, token=None): string
+        Save the current position as a preset (overwriting the preset
+        with token, if given) and return its token.
+    goto_preset(token, speed=None):
+        Start a move to a preset.
+    remove_preset(token):
+        Delete a preset.
+    stop():
+        Stop all movement.
+    get_status(): dictionary
+        Return the current position ('position') and whether the
+        camera moves ('is_moving').
+    absolute_move(position):
+        Start a move to a position.
+    get_ptz_limits(): dictionary
+        Return the limits of the camera (see devicecache.ptz_limits),
+        or None if they are unknown.
+    subscribe_ptz_events(termination_time):
+    pull_ptz_events(timeout, message_limit): list
+    unsubscribe_ptz_events():
+        Receive the PTZ events of the camera, if supports_events.
+    """
+    supports_events = False
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config['cameraname']
+        self.health = health.CircuitBreaker(self.name)
+
+    def connect(self):
+        raise NotImplementedError
+
+    def get_presets(self):
+        raise NotImplementedError
+
+    def set_preset(self, name=None, token=None):
+        raise NotImplementedError
+
+    def goto_preset(self, token, speed=None):
+        raise NotImplementedError
+
+    def remove_preset(self, token):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def get_status(self):
+        raise NotImplementedError
+
+    def absolute_move(self, position):
+        raise NotImplementedError
+
+    def get_ptz_limits(self):
+        return None
+
+    def subscribe_ptz_events(self, termination_time):
+        raise NotImplementedError
+
+    def pull_ptz_events(self, timeout, message_limit):
+        raise NotImplementedError
+
+    def unsubscribe_ptz_events(self):
+        pass
+
+    def __repr__(self):
+        return f'{type(self).__name__}(name={self.name})'
@@ -0,0 +1,90 @@
+#coding: utf-8
+
+"""
+    Cubic Bézier easing curves for smooth camera moves (see
+    doc/bezier.md for the derivation).
+"""
+
+import functools
+
+import numpy as np
+
+from ptzpresets import globals
+
+
+def _coefficients(p, q):
+    """Return the coefficients of B(t) along one axis as a standard
+    cubic polynomial, for control points P1 = p and P2 = q (and P0 = 0,
+    P3 = 1 along that axis).
+    """
+    return [3*p - 3*q + 1, -6*p + 3*q, 3*p, 0]
+
+
+class BezierEasing:
+    """Easing curve defined by a cubic Bézier curve from (0, 0) to
+    (1, 1) with control points P1 = (p_x, p_y) and P2 = (q_x, q_y),
+    like a CSS cubic-bezier() timing function.
+
+    The curve maps the fraction x of the time of a move to the
+    fraction y of the distance that should have been covered. As B is
+    parametrized by t, x has to be inverted to t first, which requires
+    solving a cubic equation. Instead, x and y are tabulated once for
+    evenly spaced t, so that evaluating the curve is an interpolation
+    in that table (for any number of x at once).
+
+    Attributes
+    ----------
+    p, q: tuple
+        The control points P1 and P2.
+
+    Methods
+    -------
+    __call__(x): float or numpy.ndarray
+        Return the eased fraction(s) of the distance at time
+        fraction(s) x.
+    """
+    def __init__(self, p, q, table_size=None):
+        """
+        Parameters
+        ----------
+        p, q : tuple
+            The control points P1 and P2 as (x, y) pairs. Their x
+            coordinates should lie within [0, 1], so that x(t)
+            increases monotonically.
+        table_size : int
+            The number of points in the lookup table.
+        """
+        if not (0 <= p[0] <= 1 and 0 <= q[0] <= 1):
+            raise ValueError('The x coordinates of the control points '
+                             'should lie within [0, 1]')
+        self.p = tuple(p)
+        self.q = tuple(q)
+        t = np.linspace(0, 1, table_size or globals.EASING_TABLE_SIZE)
+        self._x = np.polyval(_coefficients(p[0], q[0]), t)
+        self._y = np.polyval(_coefficients(p[1], q[1]), t)
+
+    def __call__(self, x):
+        return np.interp(x, self._x, self._y)
+
+    def __repr__(self):
+        return f'BezierEasing(p={self.p}, q={self.q})'
+
+
+@functools.lru_cache(maxsize=None)
+def get_easing(control_points):
+    """Return the (shared) BezierEasing for control_points, a tuple
+    (p_x, p_y, q_x, q_y), so that each curve is tabulated only once.
+    """
+    p_x, p_y, q_x, q_y = control_points
+    return BezierEasing((p_x, p_y), (q_x, q_y))
+
+
+def eased_path(start, end, easing, steps):
+    """Return the positions of a move from start to end (tuples of
+    equal length) in steps evenly timed steps, eased by easing, as an
+    array of shape (steps, len(start)). The last position is end.
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    fractions = easing(np.linspace(0, 1, steps + 1)[1:])
+    return start + fractions[:, np.newaxis] * (end - start)
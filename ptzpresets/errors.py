@@ -13,4 +13,46 @@ class CouldNotCreateCameraError(Error):
     """Raised when a Camera could not be created
     for a given camera configuration.
     """
-    pass
\ No newline at end of file
+    pass
+
+class PresetLimitError(Error):
+    """Raised when a preset is added to a camera that already has
+    the maximum number of presets.
+    """
+    pass
+
+class CameraUnavailableError(Error):
+    """Raised instead of sending a request to a camera that has 
+    failed repeatedly (see health.CircuitBreaker).
+    """
+    pass
+
+class MoveTimeoutError(Error):
+    """Raised when a camera did not arrive at a position in time.
+    """
+    pass
+
+class UnknownDriverError(Error):
+    """Raised when the configuration of a camera names a driver that
+    does not exist (see driver.DRIVERS).
+    """
+    pass
+
+class CameraTimeoutError(Error):
+    """Raised when a camera does not answer a request in time.
+    """
+    pass
+
+class ViscaError(Error):
+    """Raised when a VISCA camera answers a request with an error 
+    message. The argument is the error code (e.g. 0x41: the command
+    cannot be executed now).
+    """
+    pass
+
+class UnexpectedResponseError(Error):
+    """Raised when a camera answers a pre-serialized request (see
+    fastsoap.FastPTZService) with something else than the expected
+    response, such as a SOAP fault.
+    """
+    pass
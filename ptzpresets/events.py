@@ -0,0 +1,181 @@
+#coding: utf-8
+
+"""
+    ONVIF event (PullPoint) subscription as a push source for the
+    PTZ status of a camera.
+"""
+
+import threading
+
+import lxml.etree
+
+from ptzpresets import globals
+
+
+PULLPOINT_NAMESPACE = ('http://www.onvif.org/ver10/events/wsdl/'
+                       'PullPointSubscription')
+NOTIFICATION_NAMESPACE = 'http://docs.oasis-open.org/wsn/b-2'
+
+_parser = lxml.etree.XMLParser(resolve_entities=False, no_network=True)
+
+
+def _local_name(element):
+    return element.tag.rsplit('}', maxsplit=1)[-1]
+
+
+def _simple_items(element):
+    """Return the SimpleItem name/value pairs of a notification
+    message (Source as well as Data) as a dictionary.
+    """
+    if element is None:
+        return dict()
+    return {e.get('Name'): e.get('Value') for e in element.iter()
+            if isinstance(e.tag, str) and _local_name(e) == 'SimpleItem'}
+
+
+def parse_pull_response(content):
+    """Return the PTZ events (see parse_notification) in a 
+    PullMessages response. The response is parsed here rather than by
+    zeep, which drops the text of the notification topics.
+    """
+    envelope = lxml.etree.fromstring(content, _parser)
+    ptz_events = (parse_notification(n) for n in envelope.iter(
+        f'{{{NOTIFICATION_NAMESPACE}}}NotificationMessage'))
+    return [e for e in ptz_events if e is not None]
+
+
+def parse_notification(notification):
+    """Return a PTZ event for an ONVIF NotificationMessage element, 
+    or None if it is not about PTZ. The event is a dictionary with:
+        topic: the notification topic,
+        preset: the token of the preset involved (or None),
+        is_moving: whether the camera moves (None if unknown).
+    """
+    topic = (notification.findtext(f'{{{NOTIFICATION_NAMESPACE}}}Topic')
+             or '').strip()
+    if 'PTZController' not in topic:
+        return None
+    items = _simple_items(notification.find(
+        f'{{{NOTIFICATION_NAMESPACE}}}Message'))
+    preset = items.get('PresetToken')
+    is_moving = None
+    if topic.endswith('Reached'):
+        is_moving = False
+    elif topic.endswith('Invoked'):
+        is_moving = True
+    elif topic.endswith(('Left', 'Aborted')):
+        preset = None
+    else:
+        states = [v for k, v in items.items()
+                  if k in ('MoveStatus', 'PanTilt', 'Zoom')]
+        if states:
+            is_moving = 'MOVING' in states
+    return {'topic': topic, 'preset': preset, 'is_moving': is_moving}
+
+
+class PullPointSubscriber:
+    """Receive the PTZ notifications of a camera through an ONVIF
+    PullPoint subscription, in a background thread.
+
+    The subscriber keeps a PullMessages request outstanding, so that
+    notifications arrive as soon as the camera sends them, without
+    the load of polling. If the subscription cannot be created, or
+    breaks and cannot be renewed, on_failure is called so that the
+    camera can be polled instead.
+
+    Attributes
+    ----------
+    camera: ptzpresets.Camera
+        The camera to subscribe to.
+    callback: callable
+        Called as callback(camera_key, event) for each PTZ event (see
+        parse_notification), from the subscriber thread.
+    on_subscribed: callable
+        Called as on_subscribed(camera_key) once the subscription
+        is active.
+    on_failure: callable
+        Called as on_failure(camera_key, error) when the subscription
+        is given up.
+    is_active: boolean
+        Flag that indicates whether the subscription is active.
+
+    Methods
+    -------
+    start():
+        Subscribe and start receiving notifications.
+    stop():
+        Stop receiving notifications and unsubscribe.
+    """
+    def __init__(self, camera, callback, on_subscribed=None,
+                 on_failure=None, pull_timeout=None, message_limit=None,
+                 termination_time=None):
+        self.camera = camera
+        self.callback = callback
+        self.on_subscribed = on_subscribed
+        self.on_failure = on_failure
+        self.pull_timeout = pull_timeout or globals.PULLPOINT_TIMEOUT
+        self.message_limit = message_limit or globals.PULLPOINT_MESSAGE_LIMIT
+        self.termination_time = (termination_time
+                                 or globals.PULLPOINT_TERMINATION_TIME)
+        self.is_active = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Subscribe and start receiving notifications."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, daemon=True,
+            name=f'PullPointSubscriber-{self.camera.name}')
+        self._thread.start()
+
+    def stop(self):
+        """Stop receiving notifications. The subscription is ended
+        after the outstanding PullMessages request returns.
+        """
+        self._stop_event.set()
+
+    def _subscribe(self):
+        self.camera.subscribe_ptz_events(self.termination_time)
+        self.is_active = True
+
+    def _run(self):
+        try:
+            self._subscribe()
+        except Exception as error:
+            self._fail(error)
+            return
+        if self.on_subscribed is not None:
+            self.on_subscribed(self.camera.name)
+        is_renewed = False
+        while not self._stop_event.is_set():
+            try:
+                events = self.camera.pull_ptz_events(self.pull_timeout,
+                                                     self.message_limit)
+            except Exception as error:
+                if self._stop_event.is_set():
+                    break
+                if is_renewed:
+                    # The renewed subscription broke down right away.
+                    self._fail(error)
+                    return
+                try:
+                    self._subscribe()
+                except Exception as error:
+                    self._fail(error)
+                    return
+                is_renewed = True
+                continue
+            is_renewed = False
+            for event in events:
+                self.callback(self.camera.name, event)
+        self.is_active = False
+        try:
+            self.camera.unsubscribe_ptz_events()
+        except Exception:
+            pass    # The subscription expires by itself.
+
+    def _fail(self, error):
+        self.is_active = False
+        if self.on_failure is not None:
+            self.on_failure(self.camera.name, error)
@@ -0,0 +1,93 @@
+#coding: utf-8
+
+"""
+    In-process camera driver without any latency (see driver.Driver),
+    to measure and exercise the application without the network.
+"""
+
+import threading
+
+from ptzpresets import driver
+
+
+class FakeDriver(driver.Driver):
+    """Driver for a fake camera that lives in the process. Requests
+    return at once and moves arrive at once.
+
+    The initial presets are taken from the "presets" key of the
+    camera configuration: a list of dictionaries with token, name and
+    position, like a snapshot. The maximum number of presets is taken
+    from its "max_presets" key (100 by default).
+
+    Attributes
+    ----------
+    presets: dictionary
+        (name, position) of each preset, by token.
+    position: tuple
+        The current (pan, tilt, zoom) position.
+
+    Methods
+    -------
+    See driver.Driver.
+    """
+    def __init__(self, config):
+        super().__init__(config)
+        self.presets = {
+            p['token']: (p['name'], tuple(p['position']))
+            for p in config.get('presets', [])
+        }
+        self.max_presets = config.get('max_presets', 100)
+        self.position = (0.0, 0.0, 0.0)
+        self._last_token = max((int(t) for t in self.presets
+                                if t.isdigit()), default=0)
+        self._lock = threading.Lock()
+
+    def connect(self):
+        return self.get_presets()
+
+    def get_presets(self):
+        with self._lock:
+            return [{'token': t, 'name': n, 'position': p}
+                    for t, (n, p) in self.presets.items()]
+
+    def set_preset(self, name=None, token=None):
+        """Save the current position as a preset. Raise KeyError if
+        the token does not exist.
+        """
+        with self._lock:
+            if token is None:
+                self._last_token += 1
+                token = str(self._last_token)
+                name = name or f'Preset {token}'
+            else:
+                name = name or self.presets[token][0]
+            self.presets[token] = (name, self.position)
+        return token
+
+    def goto_preset(self, token, speed=None):
+        with self._lock:
+            self.position = self.presets[token][1]
+
+    def remove_preset(self, token):
+        with self._lock:
+            del self.presets[token]
+
+    def stop(self):
+        pass
+
+    def get_status(self):
+        return {'position': self.position, 'is_moving': False}
+
+    def absolute_move(self, position):
+        self.position = tuple(float(p) for p in position)
+
+    def get_ptz_limits(self):
+        return {
+            'max_presets': self.max_presets,
+            'home_supported': False,
+            'pan_range': [-1.0, 1.0],
+            'tilt_range': [-1.0, 1.0],
+            'zoom_range': [0.0, 1.0],
+            'pan_tilt_speed_range': [0.0, 1.0],
+            'zoom_speed_range': [0.0, 1.0],
+        }
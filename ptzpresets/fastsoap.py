@@ -0,0 +1,190 @@
+#coding: utf-8
+
+"""
+    Pre-serialized SOAP requests for the PTZ operations that are sent
+    most often (GotoPreset, Stop and GetStatus), which skip the schema
+    machinery of zeep.
+"""
+
+import base64
+import datetime
+import hashlib
+import os
+
+from xml.sax.saxutils import escape
+
+import lxml.etree
+
+from ptzpresets import errors
+
+
+SOAP_ENV = 'http://www.w3.org/2003/05/soap-envelope'
+WSSE = ('http://docs.oasis-open.org/wss/2004/01/'
+        'oasis-200401-wss-wssecurity-secext-1.0.xsd')
+WSU = ('http://docs.oasis-open.org/wss/2004/01/'
+       'oasis-200401-wss-wssecurity-utility-1.0.xsd')
+PASSWORD_DIGEST = ('http://docs.oasis-open.org/wss/2004/01/'
+                   'oasis-200401-wss-username-token-profile-1.0'
+                   '#PasswordDigest')
+PASSWORD_TEXT = ('http://docs.oasis-open.org/wss/2004/01/'
+                 'oasis-200401-wss-username-token-profile-1.0#PasswordText')
+BASE64_BINARY = ('http://docs.oasis-open.org/wss/2004/01/'
+                 'oasis-200401-wss-soap-message-security-1.0#Base64Binary')
+PTZ = 'http://www.onvif.org/ver20/ptz/wsdl'
+SCHEMA = 'http://www.onvif.org/ver10/schema'
+
+ENVELOPE = (
+    f'<?xml version=\'1.0\' encoding=\'utf-8\'?>\n'
+    f'<soap-env:Envelope xmlns:soap-env="{SOAP_ENV}">'
+    f'<soap-env:Header>{{security}}</soap-env:Header>'
+    f'<soap-env:Body>{{body}}</soap-env:Body></soap-env:Envelope>'
+)
+SPEED = (
+    f'<ns0:Speed><ns1:PanTilt xmlns:ns1="{SCHEMA}" x="{{pan_tilt}}" '
+    f'y="{{pan_tilt}}"/><ns2:Zoom xmlns:ns2="{SCHEMA}" x="{{zoom}}"/>'
+    f'</ns0:Speed>'
+)
+
+_parser = lxml.etree.XMLParser(resolve_entities=False, no_network=True,
+                               huge_tree=False)
+
+
+def _body(operation, content):
+    return (f'<ns0:{operation} xmlns:ns0="{PTZ}">{content}'
+            f'</ns0:{operation}>')
+
+
+def _float(element, name):
+    """Return an attribute of element as a float. Raise
+    errors.UnexpectedResponseError if it is missing or not a number.
+    """
+    try:
+        return float(element.get(name))
+    except (TypeError, ValueError):
+        raise errors.UnexpectedResponseError(f'No {name} in {element.tag}')
+
+
+class FastPTZService:
+    """Sends GotoPreset, Stop and GetStatus requests of a single media
+    profile to the PTZ service of an ONVIF camera, without zeep.
+
+    The envelopes are built from templates in which only the preset
+    token, the speed and the WS-Security header (with a fresh nonce
+    and timestamp, as zeep's UsernameToken makes them) vary. They are
+    sent through the transport of the camera, so that its connection
+    pool, timeout and circuit breaker apply. The responses are parsed
+    with lxml. A response other than the expected one, such as a SOAP
+    fault, raises errors.UnexpectedResponseError, after which the
+    caller can send the request through zeep to get its usual result
+    or exception. Network errors are raised as they are.
+
+    Attributes
+    ----------
+    address: string
+        The address of the PTZ service.
+    profile_token: string
+        The token of the media profile.
+
+    Methods
+    -------
+    goto_preset(token, speed=None):
+        Start a move to a preset, at a speed profile if given.
+    stop():
+        Stop all movement.
+    get_status(): dictionary
+        Return the current position ('position', a (pan, tilt, zoom)
+        tuple or None) and whether the camera moves ('is_moving').
+    """
+    def __init__(self, transport, address, profile_token, user, password,
+                 use_digest=True, dt_diff=None):
+        self.transport = transport
+        self.address = address
+        self.profile_token = profile_token
+        self.user = user
+        self.password = password
+        self.use_digest = use_digest
+        self.dt_diff = dt_diff
+        profile = (f'<ns0:ProfileToken>{escape(profile_token)}'
+                   f'</ns0:ProfileToken>')
+        self._goto_preset = _body(
+            'GotoPreset',
+            profile + '<ns0:PresetToken>{token}</ns0:PresetToken>{speed}')
+        self._stop = _body('Stop', profile)
+        self._get_status = _body('GetStatus', profile)
+
+    def goto_preset(self, token, speed=None):
+        body = self._goto_preset.format(
+            token=escape(token),
+            speed='' if speed is None else SPEED.format(
+                pan_tilt=float(speed['pan_tilt']),
+                zoom=float(speed['zoom'])))
+        self._call('GotoPreset', body)
+
+    def stop(self):
+        self._call('Stop', self._stop)
+
+    def get_status(self):
+        status = self._call('GetStatus', self._get_status).find(
+            f'{{{PTZ}}}PTZStatus')
+        if status is None:
+            raise errors.UnexpectedResponseError('No PTZStatus')
+        position = status.find(f'{{{SCHEMA}}}Position')
+        if position is not None:
+            pan_tilt = position.find(f'{{{SCHEMA}}}PanTilt')
+            zoom = position.find(f'{{{SCHEMA}}}Zoom')
+            position = (None if pan_tilt is None or zoom is None else
+                        (_float(pan_tilt, 'x'), _float(pan_tilt, 'y'),
+                         _float(zoom, 'x')))
+        move_status = status.find(f'{{{SCHEMA}}}MoveStatus')
+        is_moving = move_status is not None and 'MOVING' in (
+            move_status.findtext(f'{{{SCHEMA}}}PanTilt'),
+            move_status.findtext(f'{{{SCHEMA}}}Zoom'))
+        return {'position': position, 'is_moving': is_moving}
+
+    def _call(self, operation, body):
+        """Send a request and return the response element of its
+        body. Raise errors.UnexpectedResponseError if the camera does
+        not answer with the response of the operation.
+        """
+        message = ENVELOPE.format(security=self._security_header(),
+                                  body=body).encode('utf-8')
+        headers = {'Content-Type': (f'application/soap+xml; charset=utf-8; '
+                                    f'action="{PTZ}/{operation}"')}
+        response = self.transport.post(self.address, message, headers)
+        if response.status_code != 200:
+            raise errors.UnexpectedResponseError(
+                f'{operation}: HTTP status {response.status_code}')
+        try:
+            envelope = lxml.etree.fromstring(response.content, _parser)
+        except lxml.etree.XMLSyntaxError:
+            raise errors.UnexpectedResponseError(f'{operation}: invalid XML')
+        result = envelope.find(f'{{{SOAP_ENV}}}Body/{{{PTZ}}}'
+                               f'{operation}Response')
+        if result is None:
+            raise errors.UnexpectedResponseError(
+                f'{operation}: no {operation}Response')
+        return result
+
+    def _security_header(self):
+        """Return the WS-Security header with the username token."""
+        if not self.use_digest:
+            password = (f'<wsse:Password Type="{PASSWORD_TEXT}">'
+                        f'{escape(self.password)}</wsse:Password>')
+        else:
+            nonce = os.urandom(16)
+            created = datetime.datetime.now(datetime.timezone.utc)
+            if self.dt_diff is not None:
+                created += self.dt_diff
+            created = created.replace(microsecond=0).isoformat()
+            digest = base64.b64encode(hashlib.sha1(
+                nonce + created.encode('utf-8')
+                + self.password.encode('utf-8')).digest()).decode('ascii')
+            password = (f'<wsse:Password Type="{PASSWORD_DIGEST}">{digest}'
+                        f'</wsse:Password><wsse:Nonce '
+                        f'EncodingType="{BASE64_BINARY}">'
+                        f'{base64.b64encode(nonce).decode("ascii")}'
+                        f'</wsse:Nonce><wsu:Created xmlns:wsu="{WSU}">'
+                        f'{created}</wsu:Created>')
+        return (f'<wsse:Security xmlns:wsse="{WSSE}"><wsse:UsernameToken>'
+                f'<wsse:Username>{escape(self.user)}</wsse:Username>'
+                f'{password}</wsse:UsernameToken></wsse:Security>')
@@ -18,4 +18,111 @@ STATIC_DIR = APP_DIR / 'static'
 CREDITS_LINE = f'{APP_TITLE} {APP_VERSION} by Jan-Willem Lankhaar, October 2021'
 HELP_FILE = Path('static') / 'help.html'
 USER_CONFIG_DIR = utils.get_user_config_dir()
+USER_CACHE_DIR = utils.get_user_cache_dir()
 PANEL_LAYOUT_FILE = USER_CONFIG_DIR / 'panel_layout.json'
+PRESET_SNAPSHOT_FILE = USER_CONFIG_DIR / 'preset_snapshot.json'
+PENDING_RENAMES_FILE = USER_CONFIG_DIR / 'pending_renames.json'
+TRAVEL_TIMES_FILE = USER_CONFIG_DIR / 'travel_times.json'
+PRESET_SPEEDS_FILE = USER_CONFIG_DIR / 'preset_speeds.json'
+VISCA_PRESETS_FILE = USER_CONFIG_DIR / 'visca_presets.json'
+DEFINITION_CACHE_DIR = USER_CACHE_DIR / 'definitions'
+DEVICE_CACHE_FILE = USER_CACHE_DIR / 'devices.json'
+
+# Seconds that cached device information (service addresses, media 
+# profile, PTZ limits) is used before it is requested again. Whether
+# a request for PTZ limits failed is remembered for a shorter time.
+DEVICE_CACHE_MAX_AGE = 7 * 24 * 3600
+DEVICE_CACHE_FAILURE_MAX_AGE = 3600
+
+# The number of parsed definition sets (one per WSDL directory and
+# library versions) that is kept in the definition cache. The least
+# recently used ones are removed.
+DEFINITION_CACHE_MAX_KEYS = 4
+
+# Seconds a camera may take to connect at startup before the
+# application continues without it (override per camera with
+# 'connect_timeout' in the configuration file).
+CAMERA_CONNECT_TIMEOUT = 10
+
+# Seconds an ONVIF request may take before it counts as failed 
+# (override per camera with 'operation_timeout').
+CAMERA_OPERATION_TIMEOUT = 5
+
+# Circuit breaker per camera: after this number of consecutive failed 
+# requests the camera is considered unavailable, and it is tested
+# again after the reset timeout (in seconds).
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 15
+
+# Seconds between the attempts to connect a camera that could not be
+# connected: doubling after each attempt, up to the maximum.
+RECONNECT_INITIAL_DELAY = 2
+RECONNECT_MAX_DELAY = 60
+
+# Keep-alive connection pool per camera host (override per camera 
+# with 'pool_size').
+HTTP_POOL_SIZE = 4
+
+# Largest difference per axis (pan, tilt, zoom) between a position 
+# and a preset position that still counts as being at the preset.
+POSITION_TOLERANCE = 0.005
+
+# PTZ status polling: fast while a camera moves, backing off 
+# exponentially to the maximum interval (in seconds) while it is idle.
+STATUS_POLL_MIN_INTERVAL = 0.25
+STATUS_POLL_MAX_INTERVAL = 8
+STATUS_POLL_WORKERS = 4
+
+# ONVIF event subscription (enable per camera with "events": true).
+PULLPOINT_TIMEOUT = 10              # seconds per PullMessages request
+PULLPOINT_MESSAGE_LIMIT = 16
+PULLPOINT_TERMINATION_TIME = 60     # seconds
+
+# Speed profile (pan/tilt and zoom velocity, from 0 to 1) for a fast 
+# cut to a preset (Control-Shift-click). Presets move at their own speed 
+# profile from the preset speeds file, or at the camera's default speed.
+FAST_CUT_SPEED = {'pan_tilt': 1.0, 'zoom': 1.0}
+
+# Seconds to wait for a camera to finish a move.
+MOVE_TIMEOUT = 30
+
+# Seconds that committing the pending renames may take when the 
+# application is closed. What is left is committed next time.
+RENAME_COMMIT_TIMEOUT = 30
+
+# Travel time model: the number of recorded moves per camera that is
+# kept and that is needed before travel times are predicted.
+TRAVEL_MODEL_MAX_SAMPLES = 200
+TRAVEL_MODEL_MIN_SAMPLES = 3
+TRAVEL_MODEL_FIT_ITERATIONS = 10
+
+# Smooth moves (enable per camera with "smooth_move": true): the 
+# camera is moved along an eased path by a stream of AbsoluteMove 
+# requests. The duration (in seconds) and the Bézier control points 
+# (p_x, p_y, q_x, q_y) can be set per camera with 'smooth_move_duration'
+# and 'smooth_move_easing'.
+SMOOTH_MOVE_DURATION = 3
+SMOOTH_MOVE_STEP_INTERVAL = 0.1
+SMOOTH_MOVE_EASING = (0.42, 0, 0.58, 1)     # Ease in and out
+EASING_TABLE_SIZE = 1024
+
+# VISCA over IP (select per camera with "driver": "visca"). A request
+# is sent again if no reply arrives within the timeout (in seconds).
+# Positions are converted from the camera's units (override per camera
+# with 'visca_pan_range', 'visca_tilt_range' and 'visca_zoom_range') to
+# -1 to 1 for pan and tilt and 0 to 1 for zoom, like ONVIF positions.
+VISCA_PORT = 52381
+VISCA_TIMEOUT = 0.5
+VISCA_RETRIES = 2
+VISCA_MAX_PRESETS = 128
+VISCA_PAN_RANGE = (-2448, 2448)
+VISCA_TILT_RANGE = (-432, 1296)
+VISCA_ZOOM_RANGE = (0, 16384)
+VISCA_MAX_PAN_SPEED = 0x18
+VISCA_MAX_TILT_SPEED = 0x14
+
+# GotoPreset, Stop and GetStatus requests to ONVIF cameras are sent as
+# pre-serialized envelopes instead of through zeep, which is used
+# again for a response that is not the expected one. Disable per
+# camera with "soap_fast_path": false.
+SOAP_FAST_PATH = True
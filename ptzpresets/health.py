@@ -0,0 +1,159 @@
+#coding: utf-8
+
+"""
+    CircuitBreaker class that keeps track of the health of a camera
+    and fails fast while it is unreachable, and Backoff class that
+    spaces the attempts to reconnect to it.
+"""
+
+import random
+import threading
+import time
+
+from ptzpresets import errors
+from ptzpresets import globals
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Circuit breaker for the requests to a single camera.
+
+    While the breaker is closed, requests pass. After
+    failure_threshold consecutive failures (the camera cannot be
+    reached or does not answer in time), the breaker opens: requests
+    fail right away with errors.CameraUnavailableError instead of
+    waiting for the network timeout. After reset_timeout seconds, the
+    breaker half-opens: a single request is let through to test the
+    camera; other requests keep failing fast meanwhile. If the test
+    succeeds, the breaker closes. If it fails, the breaker opens 
+    again.
+
+    Attributes
+    ----------
+    name: string
+        The name of the camera.
+    failure_threshold: integer
+        The number of consecutive failures that opens the breaker.
+    reset_timeout: float
+        Seconds after which an open breaker lets a test request pass.
+    state: string
+        CLOSED, OPEN or HALF_OPEN.
+
+    Methods
+    -------
+    check():
+        Raise errors.CameraUnavailableError if a request may not pass.
+    record_success():
+        Report that a request succeeded.
+    record_failure():
+        Report that a request failed.
+    is_available(): boolean
+        Return True if the breaker is closed.
+    register_observer(func):
+        Register a function that is called as func(state) when the
+        state changes (from the thread of the request).
+    """
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = (failure_threshold
+                                  or globals.BREAKER_FAILURE_THRESHOLD)
+        self.reset_timeout = reset_timeout or globals.BREAKER_RESET_TIMEOUT
+        self.state = CLOSED
+        self.observers = []
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Let a request pass, or raise errors.CameraUnavailableError.
+        The first request after reset_timeout is the test request.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN or (
+                    time.monotonic() - self._opened_at < self.reset_timeout):
+                # Open, or the test request is still in progress.
+                raise errors.CameraUnavailableError(self.name)
+            state = self._set_state(HALF_OPEN)
+        self._notify(state)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            state = self._set_state(CLOSED)
+        self._notify(state)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = None
+            if self.state == HALF_OPEN or (
+                    self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                state = self._set_state(OPEN)
+        self._notify(state)
+
+    def is_available(self):
+        return self.state == CLOSED
+
+    def register_observer(self, func):
+        self.observers.append(func)
+
+    def _set_state(self, state):
+        """Change the state. Return the new state if it changed, so
+        that the observers can be notified outside the lock.
+        """
+        if state == self.state:
+            return None
+        self.state = state
+        return state
+
+    def _notify(self, state):
+        if state is not None:
+            for func in self.observers:
+                func(state)
+
+    def __repr__(self):
+        return f'CircuitBreaker(name={self.name}, state={self.state})'
+
+
+class Backoff:
+    """Jittered exponential backoff for the attempts to reconnect to a
+    camera.
+
+    The delay doubles after each failed attempt, up to maximum. A
+    random part of up to half the delay is taken off, so that cameras 
+    that went down together (e.g. after a power cut) are not all 
+    retried at the same moment.
+
+    Attributes
+    ----------
+    initial, maximum: float
+        The bounds of the delay in seconds.
+    attempts: integer
+        The number of failed attempts since the last reset.
+
+    Methods
+    -------
+    next_delay(): float
+        Return the delay before the next attempt.
+    reset():
+        Start again at the initial delay.
+    """
+    def __init__(self, initial=None, maximum=None):
+        self.initial = initial or globals.RECONNECT_INITIAL_DELAY
+        self.maximum = maximum or globals.RECONNECT_MAX_DELAY
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.initial * 2 ** self.attempts, self.maximum)
+        self.attempts += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempts = 0
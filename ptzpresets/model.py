@@ -3,12 +3,29 @@
 """Model class that defines the application logic.
 """
 
+import concurrent.futures
+import json
+import queue
+import time
+
+from functools import partial
+
 from ptzpresets import camera
 from ptzpresets import errors
+from ptzpresets import globals
+from ptzpresets import health
 from ptzpresets import observables
 from ptzpresets import preset
+from ptzpresets import travelmodel
 
 
+# Errors in connecting a camera that point at a bug or a mistake in
+# the configuration rather than at the camera or the network. These 
+# are raised; after any other error, the camera is connected again 
+# in the background.
+PROGRAMMING_ERRORS = (NameError, TypeError, AttributeError, ImportError,
+                      errors.UnknownDriverError)
+
 class Model:
     """Class that defines the data model and business logic.
     
@@ -31,15 +48,64 @@ class Model:
         Initialize the model. To be able to observe the initialization, 
         a status observer should be registered befor init_model is 
         called.
-    add_preset(camera_key, rename_func)
-        Add a preset object for the given camera. rename_func is a 
-        callback function that will be called in order to as far a new 
-        preset name.
+    add_preset(camera_key, name): concurrent.futures.Future
+        Save the current position of the given camera as a new preset 
+        (in the background). The future returns the new preset token.
+    register_preset(camera_key, token, name)
+        Add a preset object for a preset that was added to the camera.
+    unregister_preset(camera_key, token)
+        Remove the preset object of a preset that was deleted.
+    report_outcome(action, camera_key, token, name, error=None)
+        Report the outcome of a camera command that ran in the 
+        background.
     get_preset(camera_key, token)
         Return the ptzpresets.Preset object for the given token and 
         camera_key.
-    commit_uncommitted_renames()
-        Make all rename actions that have not been committed yet firm.
+    commit_uncommitted_renames(timeout=None, progress=None)
+        Make all rename actions that have not been committed yet firm,
+        concurrently for all cameras and within timeout seconds. What
+        is left is saved, to be committed next time.
+    find_current_preset(camera_key, status): string
+        Return the token of the preset at the position in a status 
+        returned by Camera.get_status (None if there is none).
+    estimate_travel_time(camera_key, token): float
+        Return the predicted number of seconds a camera needs to move
+        to a preset (None if unknown).
+    get_time_to_arrival(camera_key): float
+        Return the predicted number of seconds until a camera arrives
+        at the preset it is moving to (None if unknown).
+    load_preset_speeds()
+        Load the speed profiles of the presets from disk.
+    load_travel_times()
+        Restore the travel time models of the cameras from disk.
+    save_travel_times()
+        Save the moves recorded by the cameras to disk.
+    load_snapshot(): dict
+        Load the last known presets of each camera from disk.
+    save_snapshot()
+        Save the presets of each connected camera to disk.
+    get_unconnected_cameras(): list
+        Return the keys of the cameras that have not been connected
+        (yet) or that are reconnecting. Their presets are taken from 
+        the snapshot (if any).
+    revalidate_camera(camera_key)
+        Connect a camera that was initialized from the snapshot (or 
+        that could not be connected) and reload its presets. 
+        Blocking, so meant to run in the background.
+    apply_revalidation(camera_key): tuple
+        Bring the presets of a revalidated camera up to date and 
+        return the tokens that were added, removed and renamed.
+    revalidation_failed(camera_key, error): float
+        Report that a camera could not be revalidated and return the
+        number of seconds to wait before trying again.
+    register_health_observer(func)
+        Register a function that is called as func(camera_key, state)
+        when the circuit breaker of a camera changes state.
+    is_camera_available(camera_key): boolean
+        Return False while a camera is being reconnected or requests
+        to it fail fast.
+    report_health(camera_key)
+        Report whether a camera is available.
     """
     def __init__(self, config):
         """
@@ -53,29 +119,92 @@ class Model:
         self.cameras = None
         self.camera_labels = None
         self.presets = None
+        self.reconnecting = set()
+        self._backoffs = dict()
         
     def init_model(self):        
         """Initialize the model based on config. To be able 
         to observe the initialization a status observer
         should be registered first.
+        Cameras for which a snapshot of the presets is available
+        are not connected yet, so that the presets can be shown
+        right away. They should be revalidated afterwards, like the
+        cameras that could not be connected: those start without 
+        presets, in the reconnecting state.
         """
-        self.cameras = self._create_cameras(self.config) 
+        snapshot = self.load_snapshot()
+        unknown = {ckey: cfg for ckey, cfg in self.config.items()
+                   if ckey not in snapshot}
+        created, connected = self._create_cameras(unknown)
+        self.cameras = dict()
+        for ckey, cfg in self.config.items():
+            if ckey in created:
+                self.cameras[ckey] = created[ckey]
+                if ckey not in connected:
+                    self.reconnecting.add(ckey)
+            else:
+                cam = camera.Camera(cfg, connect=False)
+                cam.load_snapshot(snapshot[ckey])
+                self.cameras[ckey] = cam
+            self._backoffs[ckey] = health.Backoff()
         self.camera_labels = self.cameras.keys()
+        self._load_pending_renames()
+        self.load_travel_times()
+        self.load_preset_speeds()
         self.presets = self._create_presets()
         self._register_preset_observers()
+        if connected:
+            self.save_snapshot()
         
     def _create_cameras(self, config):
         """Return a dictionary with a Camera object for each
-        camera.
+        camera and the set of the keys of the cameras that connected.
+        The cameras are connected concurrently, each through its 
+        dispatcher, and each result is reported as soon as it comes 
+        in, so that startup takes about as long as the slowest camera. 
+        A camera that failed to connect (for any reason but 
+        PROGRAMMING_ERRORS) or that has not connected before its 
+        deadline is returned unconnected. A connection that is still 
+        in progress at the deadline is not abandoned: the background 
+        reconnection of the camera is queued behind it on the same 
+        dispatcher and uses its result.
         """
         cameras = dict()
+        results = queue.Queue()
+        deadlines = dict()
         for ckey, cfg in config.items():
-            try: 
-                cameras[ckey] = camera.Camera(cfg)
-            except errors.CouldNotCreateCameraError:
-                self._update_state(event='error', camera_key=ckey, 
-                                   error_message='camera_creation_error')
-        return cameras
+            cam = camera.Camera(cfg, connect=False)
+            cameras[ckey] = cam
+            timeout = cfg.get('connect_timeout', 
+                              globals.CAMERA_CONNECT_TIMEOUT)
+            deadlines[ckey] = time.monotonic() + timeout
+            cam.dispatcher.submit(cam.connect).add_done_callback(
+                lambda future, ckey=ckey: results.put(
+                    (ckey, future.exception())))
+        connected = set()
+        while deadlines:
+            timeout = min(deadlines.values()) - time.monotonic()
+            try:
+                ckey, error = results.get(timeout=max(timeout, 0))
+            except queue.Empty:
+                ckey, error = None, None
+            if ckey in deadlines:
+                del deadlines[ckey]
+                if isinstance(error, PROGRAMMING_ERRORS):
+                    raise error
+                elif error is not None:
+                    self._update_state(event='error', camera_key=ckey, 
+                                       error_message='camera_creation_error')
+                else:
+                    connected.add(ckey)
+                    self._update_state(event='connected', camera_key=ckey)
+            now = time.monotonic()
+            for ckey, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    del deadlines[ckey]
+                    self._update_state(event='error', camera_key=ckey, 
+                                       error_message='camera_timeout_error')
+        return cameras, connected
 
     def _create_presets(self):        
         """Return a dictionary with a Preset object for each
@@ -89,6 +218,12 @@ class Model:
             }
         return presets
 
+    def _create_preset(self, cam, token, name):
+        """Return a new, observed Preset object."""
+        new_preset = preset.Preset(name=name, token=token, camera=cam)
+        new_preset.register_observer(self._preset_observer)
+        return new_preset
+
     def _preset_observer(self, event, preset):
         """Observer function that observes preset events."""
         camera_key = preset.camera.name
@@ -105,44 +240,300 @@ class Model:
                 preset.register_observer(self._preset_observer)
 
     def _update_state(self, event=None, camera_key=None, preset_token=None, 
-                     preset_name=None, error_message=None):
+                     preset_name=None, error_message=None, eta=None):
         """Change the status."""
         self.status.value = {
             'event' : event,
             'camera' : camera_key,
             'preset_token' : preset_token,
             'preset_name' : preset_name,
-            'error_message' : error_message
+            'error_message' : error_message,
+            'eta' : eta
         }
         
-    def add_preset(self, camera_key, rename_func=None):
-        """Save the current camera position as a new preset.
-        If rename_func is specified, this callable is called
-        to get a new name for the preset. Return the preset 
-        token.
-        """
-        token = self.cameras[camera_key].set_preset()
-        if rename_func:
-            new_name = rename_func()
-        else:
-            new_name = self.cameras[camera_key].preset_names[token]
-        self.presets[camera_key][token] = preset.Preset(
-            name=new_name,
-            token=token,
-            camera=self.cameras[camera_key]
-        )
+    def add_preset(self, camera_key, name):
+        """Save the current camera position as a new preset with the
+        given name. The command is queued on the camera's dispatcher.
+        Return its future, which returns the new preset token. The
+        preset should be registered with register_preset afterwards.
+        """
+        cam = self.cameras[camera_key]
+        future = cam.dispatcher.submit(cam.set_preset, name)
+        self._update_state(event='adding', camera_key=camera_key, 
+                           preset_name=name)
+        return future
+
+    def register_preset(self, camera_key, token, name):
+        """Add a preset object for a preset that was added to the 
+        camera and return it.
+        """
+        new_preset = self._create_preset(self.cameras[camera_key], 
+                                          token, name)
+        self.presets[camera_key][token] = new_preset
         self._update_state(event='new', camera_key=camera_key, 
-                           preset_token=token, preset_name=new_name)
-        return token
+                           preset_token=token, preset_name=name)
+        return new_preset
+
+    def unregister_preset(self, camera_key, token):
+        """Remove the preset object of a preset that was deleted from
+        the camera.
+        """
+        self.presets[camera_key].pop(token, None)
+
+    def report_outcome(self, action, camera_key, token=None, name=None, 
+                       error=None):
+        """Report the outcome of a camera command that ran in the 
+        background: the event becomes '<action>_done' or an error
+        '<action>_error'. A finished goto comes with the predicted 
+        number of seconds until the camera arrives ('eta').
+        """
+        if error is None:
+            eta = self.get_time_to_arrival(camera_key) \
+                if action == 'goto' else None
+            self._update_state(event=f'{action}_done', camera_key=camera_key, 
+                               preset_token=token, preset_name=name, eta=eta)
+        else:
+            self._update_state(event='error', camera_key=camera_key, 
+                               preset_token=token, preset_name=name,
+                               error_message=f'{action}_error')
         
     def get_preset(self, camera_key, token):
         """Return a preset for the given token."""
         return self.presets[camera_key][token]
     
-    def commit_uncommitted_renames(self):
+    def commit_uncommitted_renames(self, timeout=None, progress=None):
         """Commit all preset rename actions on all cameras that have
-        not been committed.
+        not been committed. The cameras commit their renames 
+        concurrently (each through its dispatcher). No new rename is 
+        started after timeout seconds; the renames that are left are 
+        saved and loaded again the next time the model is initialized.
+        progress() is called regularly while waiting (from the 
+        calling thread), e.g. to update the screen.
+        """
+        if timeout is None:
+            timeout = globals.RENAME_COMMIT_TIMEOUT
+        deadline = time.monotonic() + timeout
+        should_stop = lambda: time.monotonic() >= deadline
+        committed = queue.Queue()
+        futures = []
+        for ckey, cam in self.cameras.items():
+            if cam.is_connected and cam.preset_names_uncommitted:
+                self._update_state(event='commit_renames', camera_key=ckey)
+                on_committed = (lambda token, name, ckey=ckey: 
+                                committed.put((ckey, token, name)))
+                futures.append(cam.dispatcher.submit(
+                    cam.commit_all_presetrenames, should_stop=should_stop,
+                    on_committed=on_committed))
+        while futures:
+            _, pending = concurrent.futures.wait(
+                futures, timeout=0.1, 
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            futures = list(pending)
+            while not committed.empty():
+                ckey, token, name = committed.get()
+                self._update_state(event='rename_committed', camera_key=ckey,
+                                   preset_token=token, preset_name=name)
+            if progress is not None:
+                progress()
+            if should_stop():
+                break
+        self._save_pending_renames()
+
+    def _load_pending_renames(self):
+        """Restore the renames that were not committed last time."""
+        if globals.PENDING_RENAMES_FILE.exists():
+            with open(globals.PENDING_RENAMES_FILE, 'rt', 
+                      encoding='utf8') as f:
+                pending = json.load(f)
+            for ckey, renames in pending.items():
+                if ckey in self.cameras:
+                    self.cameras[ckey].preset_names_uncommitted.update(renames)
+
+    def _save_pending_renames(self):
+        """Save the renames that have not been committed to a JSON 
+        file, which is structured as follows:
+            {"camkey": {"token": "new name", ...}, ...}
+        """
+        pending = dict()
+        for ckey, cam in self.cameras.items():
+            if cam.preset_names_uncommitted:
+                pending[ckey] = dict(cam.preset_names_uncommitted)
+                self._update_state(event='renames_postponed', camera_key=ckey)
+        with open(globals.PENDING_RENAMES_FILE, 'wt', encoding='utf8') as f:
+            json.dump(pending, f, indent=4)
+
+    def find_current_preset(self, camera_key, status):
+        """Return the token of the preset at which a camera is, based
+        on its status. Return None if the camera is moving or not 
+        at a preset.
+        """
+        if status['is_moving']:
+            return None
+        cam = self.cameras[camera_key]
+        return cam.find_preset_by_position(status['position'])
+
+    def estimate_travel_time(self, camera_key, token):
+        """Return the predicted number of seconds the camera needs to
+        move from its last known position to a preset, or None if 
+        that cannot be predicted (yet).
+        """
+        return self.cameras[camera_key].estimate_travel_time(token)
+
+    def get_time_to_arrival(self, camera_key):
+        """Return the predicted number of seconds until the camera
+        arrives at the preset it is moving to, or None if it is not
+        moving to a preset or the arrival cannot be predicted.
+        """
+        arrival = self.cameras[camera_key].expected_arrival
+        if arrival is None:
+            return None
+        return max(arrival - time.monotonic(), 0.0)
+
+    def load_preset_speeds(self):
+        """Load the speed profiles of the presets from a JSON file, 
+        if it exists. The file is edited by hand and is structured as 
+        follows:
+            {"camkey": {"token": {"pan_tilt": 0.5, "zoom": 0.5}, ...}, ...}
+        with velocities from 0 to 1.
         """
-        for cam in self.cameras.values():
-            cam.commit_all_presetrenames()
-            
+        if globals.PRESET_SPEEDS_FILE.exists():
+            with open(globals.PRESET_SPEEDS_FILE, 'rt', encoding='utf8') as f:
+                speeds = json.load(f)
+            for ckey, cam in self.cameras.items():
+                cam.preset_speeds.update(speeds.get(ckey, dict()))
+
+    def load_travel_times(self):
+        """Restore the travel time model of each camera from the 
+        moves that were recorded before.
+        """
+        if globals.TRAVEL_TIMES_FILE.exists():
+            with open(globals.TRAVEL_TIMES_FILE, 'rt', encoding='utf8') as f:
+                samples = json.load(f)
+            for ckey, cam in self.cameras.items():
+                if ckey in samples:
+                    cam.travel_model = travelmodel.TravelModel(samples[ckey])
+
+    def save_travel_times(self):
+        """Save the moves recorded by each camera to a JSON file, 
+        which is structured as follows:
+            {"camkey": [[pan, tilt, zoom, seconds], ...], ...}
+        where pan, tilt and zoom are the distances moved along each
+        axis.
+        """
+        samples = dict()
+        if globals.TRAVEL_TIMES_FILE.exists():
+            with open(globals.TRAVEL_TIMES_FILE, 'rt', encoding='utf8') as f:
+                samples = json.load(f)
+        for ckey, cam in self.cameras.items():
+            camera_samples = cam.travel_model.get_samples()
+            if camera_samples:
+                samples[ckey] = camera_samples
+        with open(globals.TRAVEL_TIMES_FILE, 'wt', encoding='utf8') as f:
+            json.dump(samples, f)
+
+    def load_snapshot(self):
+        """Load the last known presets of each camera from a JSON 
+        file, if it exists.
+        """
+        if globals.PRESET_SNAPSHOT_FILE.exists():
+            with open(globals.PRESET_SNAPSHOT_FILE, 'rt', encoding='utf8') as f:
+                return json.load(f)
+        return dict()
+
+    def save_snapshot(self):
+        """Save the presets of each camera to a JSON file, which is 
+        structured as follows:
+            {"camkey": [{"token": "...", "name": "...", 
+                         "position": [pan, tilt, zoom]}, ...], ...}
+        Cameras that have not been connected keep their previous 
+        snapshot.
+        """
+        snapshot = self.load_snapshot()
+        for ckey, cam in self.cameras.items():
+            if cam.is_connected:
+                snapshot[ckey] = cam.get_snapshot()
+        with open(globals.PRESET_SNAPSHOT_FILE, 'wt', encoding='utf8') as f:
+            json.dump(snapshot, f, indent=4)
+
+    def get_unconnected_cameras(self):
+        """Return the keys of the cameras that have not been connected,
+        or that are reconnecting.
+        """
+        return [ckey for ckey, cam in self.cameras.items() 
+                if not cam.is_connected or ckey in self.reconnecting]
+
+    def revalidate_camera(self, camera_key):
+        """Connect a camera that was initialized from the snapshot
+        (which loads its presets). This blocks until the camera 
+        responds, so it should be run in the background (through the
+        camera's dispatcher) and followed by apply_revalidation in the
+        main thread. A camera whose startup connection completed after
+        its deadline is already connected and is not connected again.
+        """
+        cam = self.cameras[camera_key]
+        if not cam.is_connected:
+            cam.connect()
+
+    def apply_revalidation(self, camera_key):
+        """Bring the presets of a revalidated camera in line with the
+        camera. Return a tuple with lists of the tokens that were 
+        added, removed and renamed.
+        """
+        cam = self.cameras[camera_key]
+        presets = self.presets[camera_key]
+        for token in list(cam.preset_names_uncommitted):
+            if token not in cam.preset_names_committed:
+                # Pending rename of a preset that no longer exists.
+                del cam.preset_names_uncommitted[token]
+        added = [t for t in cam.preset_names if t not in presets]
+        removed = [t for t in presets if t not in cam.preset_names]
+        renamed = [t for t in presets 
+                   if t in cam.preset_names 
+                   and presets[t].name != cam.preset_names[t]]
+        for token in added:
+            presets[token] = self._create_preset(cam, token,
+                                                 cam.preset_names[token])
+        for token in removed:
+            del presets[token]
+        for token in renamed:
+            presets[token].name = cam.preset_names[token]
+        self.reconnecting.discard(camera_key)
+        self._backoffs[camera_key].reset()
+        self.save_snapshot()
+        self._update_state(event='revalidated', camera_key=camera_key)
+        return added, removed, renamed
+
+    def revalidation_failed(self, camera_key, error):
+        """Report that a camera could not be revalidated. The camera 
+        is (still) reconnecting: return the number of seconds to wait 
+        before the next attempt, which grows with each failure.
+        """
+        self.reconnecting.add(camera_key)
+        delay = self._backoffs[camera_key].next_delay()
+        self._update_state(event='error', camera_key=camera_key, 
+                           error_message='revalidation_error', eta=delay)
+        return delay
+
+    def register_health_observer(self, func):
+        """Register a function that is called as func(camera_key, 
+        state) when the circuit breaker of a camera changes state (see 
+        health.CircuitBreaker). It is called from the thread of the 
+        request that changed the state.
+        """
+        for ckey, cam in self.cameras.items():
+            cam.health.register_observer(partial(func, ckey))
+
+    def is_camera_available(self, camera_key):
+        """Return False while a camera is being reconnected, or while
+        the requests to it fail fast because it failed repeatedly.
+        """
+        return camera_key not in self.reconnecting and \
+            self.cameras[camera_key].health.is_available()
+
+    def report_health(self, camera_key):
+        """Report whether a camera is available."""
+        if self.is_camera_available(camera_key):
+            self._update_state(event='available', camera_key=camera_key)
+        else:
+            self._update_state(event='error', camera_key=camera_key, 
+                               error_message='camera_unavailable')
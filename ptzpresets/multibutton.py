@@ -30,6 +30,12 @@ class MultiButton(ttk.Button):
     highlight_style: string
         The name of the ttk style that is used to highlight the button 
         (should descend from the TButton style).
+    pending_style: string
+        The name of the ttk style that is used while the action of 
+        the button is pending (should descend from the TButton style).
+    failed_style: string
+        The name of the ttk style that is used when the action of 
+        the button failed (should descend from the TButton style).
     callback: callable
         The callable that is used to handle the click events (should 
         accept an event argument). The event object passed to the callback 
@@ -50,13 +56,20 @@ class MultiButton(ttk.Button):
         Apply the highlight style to the button.
     playdown:
         Apply the default style to the button (i.e. turn highlighting off)
+    show_pending:
+        Apply the pending style to the button.
+    show_failed:
+        Apply the failed style to the button.
     """
     def __init__(self, master=None, text=None, number=None, default_style=None, 
-                 highlight_style=None, callback=None, *args, **kwargs):
+                 highlight_style=None, pending_style=None, failed_style=None,
+                 callback=None, *args, **kwargs):
         super().__init__(master=master, *args, **kwargs)
              
         self.default_style = default_style or 'TButton'
         self.highlight_style = highlight_style or 'TButton'
+        self.pending_style = pending_style or self.default_style
+        self.failed_style = failed_style or self.default_style
         self.current_style = default_style or 'TButton'
         
         self.number = number
@@ -74,7 +87,8 @@ class MultiButton(ttk.Button):
             '<ButtonRelease-1>', 
             '<Shift-ButtonRelease-1>', 
             '<Control-ButtonRelease-1>', 
-            '<Alt-ButtonRelease-1>'
+            '<Alt-ButtonRelease-1>',
+            '<Control-Shift-ButtonRelease-1>'
         ]
         for pattern in event_patterns:
             self.bind(pattern, MultiButton._add_decoded_event_state(callback), 
@@ -105,6 +119,15 @@ class MultiButton(ttk.Button):
         self.current_style = self.default_style
         self.__is_highlighted = False
         
+    def show_pending(self):
+        self.config(style=self.pending_style)
+        self.current_style = self.pending_style
+
+    def show_failed(self):
+        self.config(style=self.failed_style)
+        self.current_style = self.failed_style
+        self.__is_highlighted = False
+        
     @property
     def is_highlighted(self): return self.__is_highlighted
     
@@ -0,0 +1,287 @@
+#coding: utf-8
+
+"""
+    Camera driver for ONVIF cameras (see driver.Driver).
+"""
+
+import datetime
+
+from ptzpresets import devicecache
+from ptzpresets import driver
+from ptzpresets import errors
+from ptzpresets import events
+from ptzpresets import fastsoap
+from ptzpresets import globals
+from ptzpresets import services
+from ptzpresets import transport
+
+
+_UNKNOWN = object()
+
+
+def position_tuple(position):
+    """Return a PTZPosition as a (pan, tilt, zoom) tuple, or None if
+    the position is incomplete.
+    """
+    if position is None or position['PanTilt'] is None \
+            or position['Zoom'] is None:
+        return None
+    return (position['PanTilt']['x'], position['PanTilt']['y'],
+            position['Zoom']['x'])
+
+
+class ONVIFDriver(driver.Driver):
+    """Driver that talks to a camera through its ONVIF media and PTZ
+    services.
+
+    Attributes
+    ----------
+    camera: ptzpresets.services.ONVIFCamera
+        The ONVIF camera (None until connected).
+    media_service: <ONVIFCamera media service>
+        Service neccessary to set and get a media profile token.
+    ptz_service: <ONVIFCamera PTZ service>
+        The PTZ service to which most functionality is tied.
+    fast_ptz_service: ptzpresets.fastsoap.FastPTZService
+        The PTZ service for the pre-serialized GotoPreset, Stop and 
+        GetStatus requests (None if disabled). The requests are sent
+        again through ptz_service if the response is unexpected.
+    profile_token: string
+        The media profile token needed to use most of the camera's
+        functionality.
+    ptz_node_token: string
+        The token of the PTZ node of the media profile.
+    transport: ptzpresets.transport.PooledTransport
+        The transport for all requests to the camera. Its circuit
+        breaker is the health of the driver.
+
+    Methods
+    -------
+    See driver.Driver.
+    """
+    supports_events = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.camera = None
+        self.media_service = None
+        self.profile_token = None
+        self.ptz_node_token = None
+        self.ptz_service = None
+        self.fast_ptz_service = None
+        self.pullpoint_service = None
+        self.subscription_address = None
+        self.transport = transport.get_transport(
+            config['ip'],
+            pool_size=config.get('pool_size'),
+            operation_timeout=config.get('operation_timeout')
+        )
+        self.health = self.transport.health
+
+    def connect(self):
+        """Connect to the camera and return its presets. The service
+        addresses and the media profile are taken from the device
+        cache if possible. If the camera does not accept them, they
+        are requested again.
+        """
+        self._create_camera(self.config)
+        is_cached = self.camera.is_from_cache or (
+            self.camera.device_key is not None and devicecache.cache.get(
+                self.camera.device_key, 'profile') is not None)
+        try:
+            return self._load_services()
+        except Exception:
+            if not is_cached:
+                raise
+            devicecache.cache.invalidate(self.camera.device_key)
+            self._create_camera(self.config)
+            return self._load_services()
+
+    def _load_services(self):
+        self.media_service = self.camera.create_media_service()
+        profile = self._get_device_info('profile', self._get_default_profile)
+        self.profile_token = profile['token']
+        self.ptz_node_token = profile['ptz_node_token']
+        self.ptz_service = self.camera.create_ptz_service()
+        self.fast_ptz_service = None
+        if self.config.get('soap_fast_path', globals.SOAP_FAST_PATH):
+            self.fast_ptz_service = fastsoap.FastPTZService(
+                self.transport, self.ptz_service.xaddr, self.profile_token,
+                self.camera.user, self.camera.passwd,
+                use_digest=self.camera.encrypt, dt_diff=self.camera.dt_diff)
+        return self.get_presets()
+
+    def _get_device_info(self, name, fetch):
+        """Return an item of device information from the device cache,
+        or call fetch() to request it (and cache it).
+        """
+        if self.camera.device_key is None:
+            return fetch()
+        return devicecache.cache.get_or_fetch(self.camera.device_key, name,
+                                              fetch)
+
+    def _create_camera(self, config):
+        try:
+            self.camera = services.ONVIFCamera(
+                host=config['ip'],
+                port=config['port'],
+                wsdl_dir=config['wsdl_dir'],
+                user=config['user'],
+                passwd=config['password'],
+                transport=self.transport,
+                device_cache=devicecache.cache
+            )
+        except:
+            raise errors.CouldNotCreateCameraError
+
+    def _get_default_profile(self):
+        """Return the token of the first media profile and of its PTZ
+        node as a dictionary.
+        """
+        profile = self.media_service.GetProfiles()[0]
+        ptz_configuration = profile['PTZConfiguration']
+        return {
+            'token': profile['token'],
+            'ptz_node_token': (ptz_configuration['NodeToken']
+                               if ptz_configuration is not None else None)
+        }
+
+    def get_ptz_limits(self):
+        """Return the limits of the PTZ node, or None if they are
+        unknown. They are requested from the camera only the first
+        time (and again when the cached limits have expired). A failed
+        request is remembered for DEVICE_CACHE_FAILURE_MAX_AGE, so that
+        a camera without GetNode support is not asked for each new
+        preset.
+        """
+        if self.camera is None or self.ptz_node_token is None:
+            return None
+        key = self.camera.device_key
+        if key is not None:
+            limits = devicecache.cache.get(key, 'ptz_limits', _UNKNOWN)
+            if limits is not _UNKNOWN:
+                return limits
+        try:
+            limits = devicecache.ptz_limits(self.ptz_service.GetNode({
+                'NodeToken': self.ptz_node_token
+            }))
+            max_age = None
+        except Exception:
+            limits = None
+            max_age = globals.DEVICE_CACHE_FAILURE_MAX_AGE
+        if key is not None:
+            devicecache.cache.set(key, 'ptz_limits', limits, max_age=max_age)
+        return limits
+
+    def get_presets(self):
+        presets = self.ptz_service.GetPresets(self.profile_token)
+        return [{'token': p['token'], 'name': p['Name'],
+                 'position': position_tuple(p['PTZPosition'])}
+                for p in presets]
+
+    def set_preset(self, name=None, token=None):
+        return self.ptz_service.SetPreset({
+            'ProfileToken': self.profile_token,
+            'PresetToken': token,
+            'PresetName': name
+        })
+
+    def goto_preset(self, token, speed=None):
+        if self.fast_ptz_service is not None:
+            try:
+                return self.fast_ptz_service.goto_preset(token, speed)
+            except errors.UnexpectedResponseError:
+                pass    # zeep sends it again and handles the response.
+        request = {
+            'ProfileToken': self.profile_token,
+            'PresetToken': token
+        }
+        if speed is not None:
+            request['Speed'] = {
+                'PanTilt': {'x': speed['pan_tilt'], 'y': speed['pan_tilt']},
+                'Zoom': {'x': speed['zoom']}
+            }
+        self.ptz_service.GotoPreset(request)
+
+    def remove_preset(self, token):
+        self.ptz_service.RemovePreset({
+            'ProfileToken': self.profile_token,
+            'PresetToken': token
+        })
+
+    def stop(self):
+        if self.fast_ptz_service is not None:
+            try:
+                return self.fast_ptz_service.stop()
+            except errors.UnexpectedResponseError:
+                pass
+        self.ptz_service.Stop({'ProfileToken': self.profile_token})
+
+    def get_status(self):
+        if self.fast_ptz_service is not None:
+            try:
+                return self.fast_ptz_service.get_status()
+            except errors.UnexpectedResponseError:
+                pass
+        response = self.ptz_service.GetStatus({
+            'ProfileToken': self.profile_token
+        })
+        move_status = response['MoveStatus']
+        is_moving = move_status is not None and 'MOVING' in (
+            move_status['PanTilt'], move_status['Zoom'])
+        return {'position': position_tuple(response['Position']),
+                'is_moving': is_moving}
+
+    def absolute_move(self, position):
+        pan, tilt, zoom = (float(p) for p in position)
+        self.ptz_service.AbsoluteMove({
+            'ProfileToken': self.profile_token,
+            'Position': {
+                'PanTilt': {'x': pan, 'y': tilt},
+                'Zoom': {'x': zoom}
+            }
+        })
+
+    def subscribe_ptz_events(self, termination_time):
+        """Create a PullPoint subscription that ends after
+        termination_time seconds unless messages are pulled.
+        """
+        events_service = self.camera.create_events_service()
+        response = events_service.CreatePullPointSubscription({
+            'InitialTerminationTime': f'PT{termination_time}S'
+        })
+        address = response['SubscriptionReference']['Address']['_value_1']
+        self.camera.xaddrs[events.PULLPOINT_NAMESPACE] = address
+        self.pullpoint_service = self.camera.create_pullpoint_service()
+        self.subscription_address = address
+
+    def pull_ptz_events(self, timeout, message_limit):
+        """Wait at most timeout seconds for notifications on the
+        PullPoint subscription. Return the PTZ events among them
+        (see events.parse_notification). Raise 
+        errors.UnexpectedResponseError if the camera answers with a
+        fault.
+        """
+        # The camera holds the request until there are messages or
+        # the timeout has passed. The raw response is parsed by
+        # events.parse_pull_response.
+        with self.transport.timeout(timeout
+                                    + globals.CAMERA_OPERATION_TIMEOUT), \
+                self.pullpoint_service.zeep_client.settings(
+                    raw_response=True):
+            response = self.pullpoint_service.PullMessages({
+                'Timeout': datetime.timedelta(seconds=timeout),
+                'MessageLimit': message_limit
+            })
+        if response.status_code != 200:
+            raise errors.UnexpectedResponseError(
+                f'PullMessages: HTTP status {response.status_code}')
+        return events.parse_pull_response(response.content)
+
+    def unsubscribe_ptz_events(self):
+        """End the PullPoint subscription."""
+        if self.pullpoint_service is not None:
+            self.pullpoint_service = None
+            address, self.subscription_address = (
+                self.subscription_address, None)
+            self.camera.create_subscription_manager(address).Unsubscribe()
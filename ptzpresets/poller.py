@@ -0,0 +1,166 @@
+#coding: utf-8
+
+"""
+    StatusPoller class that keeps track of the PTZ status of the
+    cameras.
+"""
+
+import concurrent.futures
+import heapq
+import threading
+import time
+
+from ptzpresets import camera
+from ptzpresets import globals
+
+
+class StatusPoller:
+    """Poll the PTZ status of a set of cameras with an adaptive
+    interval.
+
+    A camera that is moving is polled every min_interval seconds.
+    When it is idle, the interval doubles after each poll, up to
+    max_interval, so that idle cameras cost hardly any requests.
+    A camera is considered to be moving if its MoveStatus says so or
+    if its position changed since the previous poll (not all cameras
+    report a MoveStatus). Positions that differ by no more than 
+    POSITION_TOLERANCE count as the same, because some cameras report
+    a slightly different position on each poll. At most max_workers
+    polls run at the same time, however many cameras there are.
+
+    Attributes
+    ----------
+    cameras: dictionary
+        The ptzpresets.Camera objects to poll, by camera key.
+    callback: callable
+        Called as callback(camera_key, status) after each successful
+        poll, from a worker thread. status is the dictionary returned
+        by Camera.get_status, extended with 'is_moving'.
+    min_interval, max_interval: float
+        The polling interval bounds in seconds.
+
+    Methods
+    -------
+    start():
+        Start polling.
+    stop():
+        Stop polling.
+    poke(camera_key):
+        Poll a camera right away and at the fast rate again (e.g.
+        after it has been sent a command).
+    pause(camera_key):
+        Stop polling a camera regularly, e.g. because its status is
+        pushed. A poked camera is still polled until it is idle.
+    resume(camera_key):
+        Poll a paused camera regularly again.
+    """
+    def __init__(self, cameras, callback, min_interval=None,
+                 max_interval=None, max_workers=None):
+        self.cameras = cameras
+        self.callback = callback
+        self.min_interval = min_interval or globals.STATUS_POLL_MIN_INTERVAL
+        self.max_interval = max_interval or globals.STATUS_POLL_MAX_INTERVAL
+        self.max_workers = max_workers or globals.STATUS_POLL_WORKERS
+        self._intervals = {ckey: self.min_interval for ckey in cameras}
+        self._positions = dict()
+        self._schedule = []     # Heap of (due time, camera key)
+        self._polling = set()
+        self._paused = set()
+        self._condition = threading.Condition()
+        self._is_running = False
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        """Start polling all cameras."""
+        with self._condition:
+            if self._is_running:
+                return
+            self._is_running = True
+            now = time.monotonic()
+            self._schedule = [(now, ckey) for ckey in self.cameras]
+            heapq.heapify(self._schedule)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='StatusPoller')
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='StatusPoller')
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling. Polls in progress are not waited for."""
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def poke(self, camera_key):
+        """Poll a camera right away and at the fast rate again."""
+        with self._condition:
+            self._intervals[camera_key] = self.min_interval
+            if camera_key not in self._polling:
+                self._schedule = [(t, k) for t, k in self._schedule
+                                  if k != camera_key]
+                heapq.heapify(self._schedule)
+                heapq.heappush(self._schedule, (time.monotonic(), camera_key))
+            self._condition.notify()
+
+    def pause(self, camera_key):
+        """Stop polling a camera regularly."""
+        with self._condition:
+            self._paused.add(camera_key)
+
+    def resume(self, camera_key):
+        """Poll a paused camera regularly again."""
+        with self._condition:
+            self._paused.discard(camera_key)
+        self.poke(camera_key)
+
+    def _run(self):
+        """Hand the cameras that are due to the workers."""
+        with self._condition:
+            while self._is_running:
+                now = time.monotonic()
+                if self._schedule and self._schedule[0][0] <= now:
+                    _, camera_key = heapq.heappop(self._schedule)
+                    self._polling.add(camera_key)
+                    self._executor.submit(self._poll, camera_key)
+                elif self._schedule:
+                    self._condition.wait(self._schedule[0][0] - now)
+                else:
+                    self._condition.wait()
+
+    def _poll(self, camera_key):
+        """Poll a single camera and schedule its next poll."""
+        cam = self.cameras[camera_key]
+        status = None
+        if cam.is_connected:
+            try:
+                status = cam.get_status()
+            except Exception:
+                pass    # Try again later, the camera may be busy.
+        with self._condition:
+            interval = self._intervals.get(camera_key, self.min_interval)
+            if status is not None:
+                previous = self._positions.get(camera_key)
+                self._positions[camera_key] = status['position']
+                status['is_moving'] = (status['is_moving'] or (
+                    previous is not None 
+                    and not camera._is_at(status['position'], previous)))
+                if status['is_moving']:
+                    interval = self.min_interval
+                else:
+                    interval = min(interval * 2, self.max_interval)
+            else:
+                interval = self.max_interval
+            self._intervals[camera_key] = interval
+            self._polling.discard(camera_key)
+            is_moving = status is not None and status['is_moving']
+            if camera_key in self._paused and not is_moving:
+                pass    # Only poll a paused camera until it is idle.
+            elif self._is_running:
+                heapq.heappush(self._schedule,
+                               (time.monotonic() + interval, camera_key))
+                self._condition.notify()
+        if status is not None:
+            self.callback(camera_key, status)
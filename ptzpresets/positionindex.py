@@ -0,0 +1,65 @@
+#coding: utf-8
+
+"""
+    PositionIndex class for fast nearest-preset lookups.
+"""
+
+import numpy as np
+
+
+class PositionIndex:
+    """Index of preset positions that finds the preset nearest to a
+    PTZ position.
+
+    The positions are kept in a single numpy array, so that a lookup
+    is one vectorized operation instead of a scan over dictionaries.
+    The distance between two positions is the largest difference
+    along the pan, tilt and zoom axes, so that a tolerance can be
+    read as the jitter allowed on each axis.
+
+    Attributes
+    ----------
+    tokens: list
+        The preset tokens, in the order of the rows of positions.
+    positions: numpy.ndarray
+        Array of shape (n, 3) with the (pan, tilt, zoom) position
+        of each preset.
+
+    Methods
+    -------
+    nearest(position, tolerance=None): tuple
+        Return the token of the preset nearest to position and its
+        distance. The token is None if there are no presets or if
+        the nearest preset is farther away than tolerance.
+    """
+    def __init__(self, positions):
+        """
+        Parameters
+        ----------
+        positions : dict()
+            (pan, tilt, zoom) tuples by preset token. Presets without
+            a position (None) are left out.
+        """
+        known = [(t, p) for t, p in positions.items() if p is not None]
+        self.tokens = [t for t, _ in known]
+        self.positions = np.array([p for _, p in known],
+                                  dtype=float).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def nearest(self, position, tolerance=None):
+        """Return a (token, distance) tuple for the preset nearest to
+        position, a (pan, tilt, zoom) tuple. The token is None if no
+        preset lies within tolerance.
+        """
+        if not self.tokens:
+            return None, None
+        distances = np.abs(self.positions - np.asarray(position,
+                                                       dtype=float))
+        distances = distances.max(axis=1)
+        i = int(np.argmin(distances))
+        distance = float(distances[i])
+        if tolerance is not None and distance > tolerance:
+            return None, distance
+        return self.tokens[i], distance
@@ -21,20 +21,26 @@ class Preset:
         in the camera.
     camera
         The camera object the preset belongs to.
+    speed
+        The speed profile of the preset (a dictionary with the 
+        pan_tilt and zoom velocity), or None for the camera's 
+        default speed.
     observers
         A list of observer functions that is triggered on each camera
         action.
         
     Methods
     -------
-    save()
-        Save current position as the new preset position.
+    save(): concurrent.futures.Future
+        Save current position as the new preset position (in the 
+        background).
     rename(new_name)
         Rename the preset.
-    goto()
-        Move the camera to the preset position.
-    delete()
-        Delete the preset.
+    goto(speed=None): concurrent.futures.Future
+        Move the camera to the preset position (in the background), at
+        the preset's own speed profile unless another one is given.
+    delete(): concurrent.futures.Future
+        Delete the preset (in the background).
     register_observer(func)
         Register an observer function that is notified on 
         changes.
@@ -58,10 +64,14 @@ class Preset:
         self.observers = []
 
     def save(self):
-        """Save current position as the new preset position.
+        """Save current position as the new preset position. The
+        command is queued on the camera's dispatcher. Return its 
+        future.
         """
-        self.camera.set_preset(self.name, self.token)
+        future = self.camera.dispatcher.submit(
+            self.camera.set_preset, self.name, self.token)
         self._trigger_observers(event='save')
+        return future
 
     def rename(self, new_name):
         """Rename the preset to new_name."""
@@ -69,15 +79,30 @@ class Preset:
         self.name = new_name
         self._trigger_observers(event='rename')
         
-    def goto(self):
-        """Move the camera to the preset position."""
-        self.camera.goto_preset(self.token)
+    @property
+    def speed(self):
+        return self.camera.preset_speeds.get(self.token)
+
+    def goto(self, speed=None):
+        """Move the camera to the preset position, at the given speed 
+        profile or else at the preset's own. The move is queued on the
+        camera's dispatcher, where it replaces a move that has not 
+        been sent yet. Return the future of the move.
+        """
+        future = self.camera.dispatcher.submit(
+            self.camera.goto_preset, self.token, speed or self.speed, 
+            coalesce='goto')
         self._trigger_observers(event='goto')
+        return future
         
     def delete(self):
-        """Delete the preset position."""
-        self.camera.delete_preset(self.token)
+        """Delete the preset position. The command is queued on the
+        camera's dispatcher. Return its future.
+        """
+        future = self.camera.dispatcher.submit(
+            self.camera.delete_preset, self.token)
         self._trigger_observers(event='delete')
+        return future
         
     def register_observer(self, func):
         """Register an observer function that is notified 
@@ -0,0 +1,162 @@
+#coding: utf-8
+
+"""
+    Export of the presets of a camera to a file, and import of the
+    exported presets into another (e.g. a replacement) camera.
+"""
+
+import json
+
+from ptzpresets import globals
+from ptzpresets import route
+
+
+def export_presets(cam, export_file):
+    """Write the presets of a connected camera to a compact JSON file,
+    structured as follows:
+        {"camera": "camkey",
+         "presets": [["token", "name", pan, tilt, zoom], ...]}
+    A preset without a known position is written as ["token", "name"].
+    """
+    cam.resync_presetnames()
+    rows = [[p['token'], p['name'], *(p['position'] or [])]
+            for p in cam.get_snapshot()]
+    with open(export_file, 'wt', encoding='utf8') as f:
+        json.dump({'camera': cam.name, 'presets': rows}, f,
+                  separators=(',', ':'), ensure_ascii=False)
+
+
+def read_presets(export_file):
+    """Read an export file. Return a list of dictionaries with token,
+    name and position (None if unknown) for each preset.
+    """
+    with open(export_file, 'rt', encoding='utf8') as f:
+        rows = json.load(f)['presets']
+    return [{'token': r[0], 'name': r[1],
+             'position': tuple(r[2:5]) if len(r) >= 5 else None}
+            for r in rows]
+
+
+class ImportPlan:
+    """The changes that an import makes to a camera.
+
+    Attributes
+    ----------
+    creates: dictionary
+        The positions of the presets to create, by name.
+    updates: dictionary
+        The (name, position) of the existing presets to move, by
+        token. A preset is updated if the camera has a preset with
+        the same name at another position.
+    unchanged: list
+        The tokens of the presets that are already at their position.
+    skipped: list
+        The names of the imported presets that cannot be imported:
+        their position is unknown or their name was imported before.
+
+    Methods
+    -------
+    is_empty(): boolean
+        Return True if nothing has to be changed.
+    describe(names, positions): list
+        Return a line of text for each change (a diff). names and
+        positions are the current ones of the camera, by token.
+    """
+    def __init__(self):
+        self.creates = dict()
+        self.updates = dict()
+        self.unchanged = []
+        self.skipped = []
+
+    def is_empty(self):
+        return not (self.creates or self.updates)
+
+    def describe(self, names, positions):
+        lines = [f'Create {n} at {_format_position(p)}'
+                 for n, p in self.creates.items()]
+        lines.extend(
+            f'Move {n} ({t}) from {_format_position(positions.get(t))} '
+            f'to {_format_position(p)}'
+            for t, (n, p) in self.updates.items()
+        )
+        lines.extend(f'Keep {names[t]} ({t})' for t in self.unchanged)
+        lines.extend(f'Skip {n}' for n in self.skipped)
+        return lines
+
+    def __repr__(self):
+        return (f'ImportPlan(creates={list(self.creates)}, '
+                f'updates={list(self.updates)}, skipped={self.skipped})')
+
+
+def _format_position(position):
+    if position is None:
+        return '(unknown)'
+    return '({:.4f}, {:.4f}, {:.4f})'.format(*position)
+
+
+def plan_import(presets, names, positions, tolerance=None):
+    """Compare imported presets (as returned by read_presets) with the
+    presets of a camera (names and positions by token) and return an
+    ImportPlan. Presets are matched by name, because tokens differ
+    between cameras.
+    """
+    if tolerance is None:
+        tolerance = globals.POSITION_TOLERANCE
+    plan = ImportPlan()
+    tokens = dict()     # The first token by name
+    for token, name in names.items():
+        tokens.setdefault(name, token)
+    imported = set()
+    for preset in presets:
+        name, position = preset['name'], preset['position']
+        if position is None or name in imported:
+            plan.skipped.append(name)
+            continue
+        imported.add(name)
+        token = tokens.get(name)
+        if token is None:
+            plan.creates[name] = position
+        elif positions.get(token) is not None and max(
+                abs(a - b) for a, b in zip(positions[token], position)
+        ) <= tolerance:
+            plan.unchanged.append(token)
+        else:
+            plan.updates[token] = (name, position)
+    return plan
+
+
+def import_presets(cam, presets, dry_run=False):
+    """Import presets (as returned by read_presets) into a connected
+    camera. Return the ImportPlan and a dictionary with the exceptions
+    of the presets that failed, by name.
+
+    The presets are visited in the order that keeps the travel short.
+    Each one is recreated with AbsoluteMove and SetPreset without any
+    other round-trip in between: the camera is polled for its arrival
+    only once it is predicted to have arrived, the next move is sent
+    as soon as a preset is saved, and the presets are reloaded once
+    at the end.
+    """
+    cam.resync_presetnames()
+    plan = plan_import(presets, cam.preset_names_committed,
+                       cam.preset_positions)
+    failures = dict()
+    if dry_run or plan.is_empty():
+        return plan, failures
+    jobs = {name: (None, position) for name, position in plan.creates.items()}
+    jobs.update({name: (token, position)
+                 for token, (name, position) in plan.updates.items()})
+    try:
+        start = cam.get_status()['position']
+    except Exception:
+        start = None
+    order = route.plan_route(start, {n: p for n, (_, p) in jobs.items()},
+                             cam.travel_model.get_axis_weights())
+    for name in order:
+        token, position = jobs[name]
+        try:
+            cam.set_preset_at(position, name, token)
+        except Exception as error:
+            failures[name] = error
+    cam.resync_presetnames()
+    return plan, failures
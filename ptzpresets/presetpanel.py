@@ -24,6 +24,7 @@ class PresetPanel(ttk.Frame, dragandrop.DragAndDropMixin):
         self.addbutton = None
         self.addbutton_observer = None
         self.highlighted_button = None
+        self.is_enabled = True
 
         self.create_generalwidgets()
         self.position_widgets()
@@ -47,9 +48,13 @@ class PresetPanel(ttk.Frame, dragandrop.DragAndDropMixin):
                 number=None, #num_offset+i+1, 
                 default_style='PresetButton.TButton',
                 highlight_style='Highlighted.PresetButton.TButton',
+                pending_style='Pending.PresetButton.TButton',
+                failed_style='Failed.PresetButton.TButton',
                 callback=None
             )
             self.dnd_register_callbacks(button)
+            if not self.is_enabled:
+                button.state(['disabled'])
             buttons.append(button)
         self.presetbuttons.extend(buttons)
         self.dnd_init(master=self, widgets=self.presetbuttons)
@@ -76,6 +81,8 @@ class PresetPanel(ttk.Frame, dragandrop.DragAndDropMixin):
         run the observer function that is registered (if any) to 
         process the add button event in the model.
         """
+        if not self.is_enabled:
+            return
         button = self.create_presetbuttons(1)[0]
         if self.addbutton_observer is not None:
             self.addbutton_observer(button)
@@ -86,6 +93,15 @@ class PresetPanel(ttk.Frame, dragandrop.DragAndDropMixin):
         """
         self.addbutton_observer = function
     
+    def set_enabled(self, is_enabled):
+        """Grey out the panel (is_enabled=False) or restore it."""
+        self.is_enabled = is_enabled
+        state = ['!disabled'] if is_enabled else ['disabled']
+        self.cameralabel.state(state)
+        self.addbutton.state(state)
+        for button in self.presetbuttons:
+            button.state(state)
+
     def set_cameraname(self, camera_name):
         self.cameralabel['text'] = camera_name
         
@@ -122,6 +138,25 @@ class PresetPanel(ttk.Frame, dragandrop.DragAndDropMixin):
         button.highlight()
         self.highlighted_button = button
 
+    def set_pending_button(self, button):
+        """Show that the action of button is pending."""
+        button.show_pending()
+
+    def set_failed_button(self, button):
+        """Show that the action of button failed."""
+        if self.highlighted_button is button:
+            self.highlighted_button = None
+        button.show_failed()
+
+    def reset_button(self, button):
+        """Restore the regular style of button (highlighted if it is
+        the current button).
+        """
+        if self.highlighted_button is button:
+            button.highlight()
+        else:
+            button.playdown()
+
     def unset_current_button(self):
         """Unset the highlighted button.
         """
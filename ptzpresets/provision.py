@@ -0,0 +1,168 @@
+#coding: utf-8
+
+"""
+    Declarative provisioning of the presets of a set of cameras from
+    a manifest.
+"""
+
+import concurrent.futures
+import json
+
+from ptzpresets import camera
+
+
+def read_manifest(manifest_file):
+    """Read a JSON manifest that lists the presets that each camera
+    should have, structured as follows:
+        {"camkey": ["name", {"token": "3", "name": "name"}, ...], ...}
+    A preset is given by its name, or by its token and name if it
+    should be renamed.
+    """
+    with open(manifest_file, 'rt', encoding='utf8') as f:
+        return json.load(f)
+
+
+class ProvisioningPlan:
+    """The changes that bring the presets of a camera in line with
+    its manifest entries.
+
+    Attributes
+    ----------
+    creates: list
+        The names of the presets to create.
+    renames: dictionary
+        The new names of the presets to rename, by token.
+    deletes: list
+        The tokens of the presets to delete.
+    duplicates: list
+        The manifest entries that were ignored because their name
+        was listed before.
+
+    Methods
+    -------
+    is_empty(): boolean
+        Return True if nothing has to be changed.
+    describe(names): list
+        Return a line of text for each change. names are the current
+        preset names by token.
+    """
+    def __init__(self):
+        self.creates = []
+        self.renames = dict()
+        self.deletes = []
+        self.duplicates = []
+
+    def is_empty(self):
+        return not (self.creates or self.renames or self.deletes)
+
+    def describe(self, names):
+        lines = [f'Create {n}' for n in self.creates]
+        lines.extend(f'Rename {names[t]} ({t}) to {n}'
+                     for t, n in self.renames.items())
+        lines.extend(f'Delete {names[t]} ({t})' for t in self.deletes)
+        lines.extend(f'Ignore duplicate {n}' for n in self.duplicates)
+        return lines
+
+    def __repr__(self):
+        return (f'ProvisioningPlan(creates={self.creates}, '
+                f'renames={self.renames}, deletes={self.deletes})')
+
+
+def plan_provisioning(entries, names, delete=True):
+    """Compare the manifest entries of a camera with its presets
+    (names by token, as returned by GetPresets) and return the
+    ProvisioningPlan that turns the latter into the former.
+
+    An entry with a token claims that preset, which is renamed if
+    needed (or created, if the token does not exist). An entry with
+    only a name claims the first unclaimed preset with that name, or
+    else is created. A name is provisioned once: later entries with
+    the same name are duplicates. The presets that are not claimed
+    are deleted, unless delete=False.
+    """
+    plan = ProvisioningPlan()
+    claimed = set()
+    listed = set()
+    by_name = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        name, token = entry['name'], entry.get('token')
+        if name in listed:
+            plan.duplicates.append(name)
+            continue
+        listed.add(name)
+        if token is None:
+            by_name.append(name)    # Matched after all tokens are claimed.
+        elif token in names:
+            claimed.add(token)
+            if names[token] != name:
+                plan.renames[token] = name
+        else:
+            plan.creates.append(name)
+    available = dict()      # The first unclaimed token by name
+    for token, name in names.items():
+        if token not in claimed:
+            available.setdefault(name, token)
+    for name in by_name:
+        token = available.pop(name, None)
+        if token is None:
+            plan.creates.append(name)
+        else:
+            claimed.add(token)
+    if delete:
+        plan.deletes = [t for t in names if t not in claimed]
+    return plan
+
+
+def apply_plan(cam, plan):
+    """Apply a ProvisioningPlan to a connected camera and reload its
+    presets once at the end. Deletes go first, to make room in
+    cameras with a limited number of presets. Renames move the camera
+    to each preset (in the order that keeps the travel short). New
+    presets are saved at the position where the camera is then.
+    """
+    for token in plan.deletes:
+        cam.delete_preset(token)
+    for token in cam.plan_visits(list(plan.renames)):
+        cam.rename_preset(token, plan.renames[token], force_commit=True)
+    for name in plan.creates:
+        cam.set_preset(name)
+    cam.resync_presetnames()
+
+
+def provision_camera(config, entries, delete=True, dry_run=False):
+    """Connect to a camera, plan the provisioning of its presets and
+    apply the plan (unless dry_run=True). Return a tuple with the
+    plan and the preset names by token before provisioning.
+    """
+    cam = camera.Camera(config)
+    try:
+        names = dict(cam.preset_names_committed)
+        plan = plan_provisioning(entries, names, delete)
+        if not dry_run and not plan.is_empty():
+            apply_plan(cam, plan)
+        return plan, names
+    finally:
+        cam.dispatcher.shutdown()
+
+
+def provision(config, manifest, delete=True, dry_run=False):
+    """Provision all cameras in the manifest concurrently. Return a
+    dictionary with, by camera key, the tuple returned by
+    provision_camera or the exception that was raised.
+    """
+    results = dict()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(len(manifest), 1)) as executor:
+        futures = {
+            ckey: executor.submit(provision_camera, config[ckey], entries,
+                                  delete, dry_run)
+            for ckey, entries in manifest.items()
+        }
+        for ckey, future in futures.items():
+            try:
+                results[ckey] = future.result()
+            except Exception as error:
+                results[ckey] = error
+    return results
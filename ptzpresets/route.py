@@ -0,0 +1,88 @@
+#coding: utf-8
+
+"""
+    Ordering of preset visits that keeps the total camera travel
+    short.
+"""
+
+import numpy as np
+
+
+def travel_distances(origins, destinations, axis_weights=None):
+    """Return the matrix of travel distances between two arrays of
+    (pan, tilt, zoom) positions. The axes of a PTZ camera move at
+    the same time, so a move takes as long as its slowest axis: the
+    distance is the largest (weighted) difference along an axis.
+    axis_weights are the seconds per unit along each axis (1 for
+    every axis if not given).
+    """
+    origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+    destinations = np.asarray(destinations, dtype=float).reshape(-1, 3)
+    weights = np.ones(3) if axis_weights is None else np.asarray(
+        axis_weights, dtype=float)
+    deltas = np.abs(origins[:, np.newaxis, :] - destinations[np.newaxis, :, :])
+    return (deltas * weights).max(axis=2)
+
+
+def _nearest_neighbour(distances, start_distances):
+    n = len(start_distances)
+    unvisited = set(range(n))
+    current = int(np.argmin(start_distances))
+    order = [current]
+    unvisited.remove(current)
+    while unvisited:
+        current = min(unvisited, key=lambda j: distances[current, j])
+        order.append(current)
+        unvisited.remove(current)
+    return order
+
+
+def _two_opt(order, distances, start_distances):
+    """Improve an open path (with a fixed starting point) by reversing
+    segments as long as that makes the path shorter. The distances are
+    symmetric, so a reversal only changes the two edges at the ends of
+    the segment: the one into it and the one out of it.
+    """
+    order = list(order)
+    n = len(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                a, b = order[i], order[j]
+                if i == 0:
+                    delta = start_distances[b] - start_distances[a]
+                else:
+                    delta = (distances[order[i - 1], b]
+                             - distances[order[i - 1], a])
+                if j + 1 < n:
+                    delta += (distances[a, order[j + 1]]
+                              - distances[b, order[j + 1]])
+                if delta < -1e-12:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+
+def plan_route(start, positions, axis_weights=None):
+    """Return the tokens of positions (a dictionary of (pan, tilt,
+    zoom) tuples by token) in an order that keeps the total travel
+    from start short: a nearest-neighbour tour improved with 2-opt.
+    Tokens without a known position (None) are visited last, in
+    their original order. If start is None, the route starts at the
+    first position of the tour.
+    """
+    known = [t for t, p in positions.items() if p is not None]
+    unknown = [t for t, p in positions.items() if p is None]
+    if len(known) < 2:
+        return known + unknown
+    points = np.array([positions[t] for t in known], dtype=float)
+    distances = travel_distances(points, points, axis_weights)
+    if start is None:
+        start_distances = np.zeros(len(known))
+    else:
+        start_distances = travel_distances([start], points, axis_weights)[0]
+    order = _nearest_neighbour(distances, start_distances)
+    order = _two_opt(order, distances, start_distances)
+    return [known[i] for i in order] + unknown
@@ -0,0 +1,405 @@
+#coding: utf-8
+
+"""
+    ONVIF service creation with an on-disk cache of the parsed
+    WSDL/XSD service definitions and a process-wide registry that
+    shares them between cameras.
+"""
+
+import collections.abc
+import hashlib
+import importlib.metadata
+import io
+import os
+import pickle
+import shutil
+import threading
+
+from pathlib import Path
+
+import lxml.etree
+import onvif
+import zeep
+
+from onvif.client import ONVIFService, UsernameDigestTokenDtDiff
+from onvif.definition import SERVICES
+from zeep.settings import Settings
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+from ptzpresets import devicecache
+from ptzpresets import globals
+
+
+# The binding of the Renew and Unsubscribe operations of an event
+# subscription, for which onvif-zeep has no service.
+SUBSCRIPTION_MANAGER_BINDING = ('{http://www.onvif.org/ver10/events/wsdl}'
+                                'SubscriptionManagerBinding')
+
+def _library_version(distribution):
+    """Return the installed version of a distribution, or 'unknown'
+    if it cannot be determined (e.g. in a frozen build).
+    """
+    try:
+        return importlib.metadata.version(distribution)
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+_DYNAMIC_MODULES = ('zeep.xsd.dynamic_types', 'zeep.objects')
+
+
+def _create_dynamic_class(name, bases, attributes):
+    """Recreate a class that zeep created while parsing a schema."""
+    return type(name, bases, attributes)
+
+
+def _set_class_attributes(cls, attributes):
+    for name, value in attributes.items():
+        setattr(cls, name, value)
+
+
+class _DefinitionPickler(pickle.Pickler):
+    """Pickler that leaves out the transport and settings of a parsed
+    document and stores XML nodes as text. The classes that zeep
+    creates while parsing a schema are stored by their definition.
+    """
+    def __init__(self, file, transport, settings):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.transport = transport
+        self.settings = settings
+
+    def persistent_id(self, obj):
+        if obj is self.transport:
+            return ('transport',)
+        if obj is self.settings:
+            return ('settings',)
+        if isinstance(obj, lxml.etree._Element):
+            return ('xml', lxml.etree.tostring(obj))
+        if isinstance(obj, lxml.etree.QName):
+            return ('qname', obj.text)
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, collections.abc.ValuesView):
+            # zeep keeps some merged attribute lists as dictionary views.
+            return list, (list(obj),)
+        if not isinstance(obj, type) or obj.__module__ not in _DYNAMIC_MODULES:
+            return NotImplemented
+        attributes = {k: v for k, v in vars(obj).items()
+                      if k in ('__module__', '_xsd_name')}
+        # The type of a value class refers back to the class, so it is
+        # set after the class has been created.
+        references = {k: v for k, v in vars(obj).items() if k == '_xsd_type'}
+        return (_create_dynamic_class, (obj.__name__, obj.__bases__, attributes),
+                references, None, None, _set_class_attributes)
+
+
+class _DefinitionUnpickler(pickle.Unpickler):
+    """Unpickler that restores what _DefinitionPickler left out."""
+    def __init__(self, file, transport, settings):
+        super().__init__(file)
+        self.transport = transport
+        self.settings = settings
+
+    def persistent_load(self, pid):
+        if pid[0] == 'transport':
+            return self.transport
+        if pid[0] == 'settings':
+            return self.settings
+        if pid[0] == 'xml':
+            return lxml.etree.fromstring(pid[1])
+        if pid[0] == 'qname':
+            return lxml.etree.QName(pid[1])
+        raise pickle.UnpicklingError(f'Unknown persistent id {pid[0]}')
+
+
+class DefinitionCache:
+    """On-disk cache of parsed WSDL documents.
+
+    Parsing the ONVIF WSDL and XSD files is by far the most expensive
+    part of creating a service. The parsed documents are therefore
+    pickled to the user cache directory. The cache is keyed by a hash
+    of the contents of the WSDL directory and the versions of the
+    libraries involved, so that it is rebuilt automatically whenever
+    one of them changes. Only the DEFINITION_CACHE_MAX_KEYS most
+    recently used keys are kept, so that cameras with different WSDL
+    directories do not remove each other's documents.
+
+    Attributes
+    ----------
+    wsdl_dir: Path
+        The directory with the WSDL and XSD files.
+    cache_dir: Path
+        The directory in which the parsed documents are stored.
+    key: string
+        The cache key for the current WSDL directory and libraries.
+
+    Methods
+    -------
+    load(wsdl_file, transport, settings): zeep.wsdl.Document
+        Return the parsed document for wsdl_file, from the cache if
+        possible. Otherwise, parse the file and cache the result.
+    clear():
+        Remove all cached documents.
+    """
+    def __init__(self, wsdl_dir, cache_dir=None):
+        self.wsdl_dir = Path(wsdl_dir)
+        self.cache_dir = Path(cache_dir or globals.DEFINITION_CACHE_DIR)
+        self.key = self._compute_key()
+
+    def _compute_key(self):
+        digest = hashlib.sha256()
+        for version in (zeep.__version__, _library_version('onvif-zeep'),
+                        pickle.format_version):
+            digest.update(version.encode('utf8'))
+        for path in sorted(p for p in self.wsdl_dir.rglob('*')
+                           if p.is_file()):
+            digest.update(path.relative_to(self.wsdl_dir).as_posix()
+                          .encode('utf8'))
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:16]
+
+    def _cache_path(self, wsdl_file):
+        name = Path(wsdl_file).resolve()
+        try:
+            name = name.relative_to(self.wsdl_dir.resolve())
+        except ValueError:
+            pass    # A WSDL file outside the WSDL directory.
+        return (self.cache_dir / self.key /
+                (name.as_posix().replace('/', '_') + '.pickle'))
+
+    def load(self, wsdl_file, transport, settings):
+        """Return the parsed document for wsdl_file. Take it from the
+        cache if possible, or else parse the file and cache it.
+        """
+        path = self._cache_path(wsdl_file)
+        document = self._read(path, transport, settings)
+        if document is None:
+            document = Document(str(wsdl_file), transport, settings=settings)
+            self._write(path, document, transport, settings)
+        return document
+
+    def clear(self):
+        """Remove all cached documents."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _read(self, path, transport, settings):
+        """Return the cached document or None if it is not available."""
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                document = _DefinitionUnpickler(f, transport, 
+                                                settings).load()
+        except Exception:
+            # A damaged cache file is not fatal, just parse again.
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path.parent)   # Mark the key as recently used.
+        except OSError:
+            pass
+        return document
+
+    def _write(self, path, document, transport, settings):
+        """Store a parsed document. Documents that cannot be pickled
+        are simply not cached.
+        """
+        buffer = io.BytesIO()
+        try:
+            _DefinitionPickler(buffer, transport, settings).dump(document)
+        except (pickle.PicklingError, TypeError, AttributeError,
+                RecursionError):
+            return
+        self._remove_stale_keys()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+        # Replace atomically, so that concurrent cameras never read
+        # a half-written file.
+
+    def _remove_stale_keys(self):
+        """Remove the least recently used keys other than the current
+        one, so that at most DEFINITION_CACHE_MAX_KEYS are kept.
+        """
+        if not self.cache_dir.exists():
+            return
+        dirs = []
+        for dir in self.cache_dir.iterdir():
+            try:
+                if dir.is_dir() and dir.name != self.key:
+                    dirs.append((dir.stat().st_mtime, dir))
+            except OSError:
+                pass    # Removed by another process.
+        dirs.sort(reverse=True)
+        for _, dir in dirs[globals.DEFINITION_CACHE_MAX_KEYS - 1:]:
+            shutil.rmtree(dir, ignore_errors=True)
+
+
+class _DocumentClient(zeep.Client):
+    """zeep Client for a WSDL document that has already been parsed.
+    """
+    def __init__(self, document, wsse=None, transport=None):
+        self.settings = document.settings
+        self.transport = transport if transport is not None else Transport()
+        self.wsdl = document
+        self.wsse = wsse
+        self.plugins = []
+        self._default_service = None
+        self._default_service_name = None
+        self._default_port_name = None
+        self._default_soapheaders = None
+
+
+class ServiceRegistry:
+    """Process-wide registry of parsed service definitions.
+
+    All cameras use the same WSDL files, so the parsed documents 
+    (with their schemas and types, which are never changed after 
+    parsing) are shared. Each camera only gets a light-weight client 
+    with its own binding: address, credentials and transport.
+
+    Methods
+    -------
+    get_document(wsdl_dir, wsdl_file): zeep.wsdl.Document
+        Return the shared document for a WSDL file. It is parsed 
+        (or loaded from the DefinitionCache) only once per process.
+    create_client(wsdl_dir, wsdl_file, wsse, transport): zeep.Client
+        Return a client that binds the shared document to the 
+        credentials and transport of a single camera.
+    clear():
+        Forget all shared documents.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches = dict()
+        self._documents = dict()
+        self._document_locks = dict()
+        self._transport = None
+        self._settings = Settings(strict=False, xml_huge_tree=True)
+        # The same settings as ONVIFService uses.
+
+    def _get_cache(self, wsdl_dir):
+        key = Path(wsdl_dir).resolve()
+        with self._lock:
+            if key not in self._caches:
+                self._caches[key] = DefinitionCache(key)
+                self._transport = self._transport or Transport()
+                # Only used to load the files, never for requests.
+            return self._caches[key]
+
+    def get_document(self, wsdl_dir, wsdl_file):
+        """Return the shared document for wsdl_file."""
+        cache = self._get_cache(wsdl_dir)
+        key = (cache.key, Path(wsdl_file).resolve())
+        with self._lock:
+            lock = self._document_locks.setdefault(key, threading.Lock())
+        with lock:
+            # Cameras connect concurrently. Make sure that a document 
+            # is loaded only once.
+            if key not in self._documents:
+                self._documents[key] = cache.load(wsdl_file, self._transport,
+                                                  self._settings)
+            return self._documents[key]
+
+    def create_client(self, wsdl_dir, wsdl_file, wsse=None, transport=None):
+        """Return a client for a single camera that uses the shared 
+        document for wsdl_file.
+        """
+        document = self.get_document(wsdl_dir, wsdl_file)
+        return _DocumentClient(document, wsse=wsse, transport=transport)
+
+    def clear(self):
+        """Forget all shared documents."""
+        with self._lock:
+            self._caches.clear()
+            self._documents.clear()
+            self._document_locks.clear()
+
+
+registry = ServiceRegistry()
+
+
+class ONVIFCamera(onvif.ONVIFCamera):
+    """Subclass of onvif.ONVIFCamera that creates its services from
+    the shared service definitions in the registry instead of parsing 
+    the WSDL files for each service.
+
+    If a device cache is given, the service addresses are taken from
+    the cache (keyed by the device serial and firmware, which cost a
+    single GetDeviceInformation request) instead of requesting the 
+    capabilities. Unlike onvif.ONVIFCamera, no PullPoint subscription 
+    is created at startup: subscriptions are created when needed.
+    """
+    def __init__(self, *args, device_cache=None, **kwargs):
+        self.device_cache = device_cache
+        self.device_key = None
+        self.is_from_cache = False
+        super().__init__(*args, **kwargs)
+
+    def update_xaddrs(self):
+        if self.device_cache is None or self.adjust_time:
+            return super().update_xaddrs()
+        self.dt_diff = None
+        self.devicemgmt = self.create_devicemgmt_service()
+        self.device_key = devicecache.device_key(
+            self.host, self.port, self.devicemgmt.GetDeviceInformation())
+        xaddrs = self.device_cache.get(self.device_key, 'xaddrs')
+        self.is_from_cache = xaddrs is not None
+        if xaddrs is None:
+            xaddrs = self._get_capability_xaddrs()
+            self.device_cache.set(self.device_key, 'xaddrs', xaddrs)
+        self.xaddrs = dict(xaddrs)
+
+    def _get_capability_xaddrs(self):
+        """Return the service addresses by namespace from the 
+        capabilities of the device.
+        """
+        xaddrs = dict()
+        capabilities = self.devicemgmt.GetCapabilities({'Category': 'All'})
+        for name in capabilities:
+            capability = capabilities[name]
+            try:
+                if name.lower() in SERVICES and capability is not None:
+                    xaddrs[SERVICES[name.lower()]['ns']] = capability['XAddr']
+            except (KeyError, AttributeError):
+                pass    # Not a service capability
+        return xaddrs
+
+    def _create_zeep_client(self, wsdl_file):
+        wsse = UsernameDigestTokenDtDiff(self.user, self.passwd,
+                                         dt_diff=self.dt_diff,
+                                         use_digest=self.encrypt)
+        return registry.create_client(self.wsdl_dir, wsdl_file, wsse=wsse, 
+                                      transport=self.transport)
+
+    def create_subscription_manager(self, address):
+        """Return a zeep service with the Renew and Unsubscribe 
+        operations of the event subscription at address.
+        """
+        client = self._create_zeep_client(
+            os.path.join(self.wsdl_dir, SERVICES['events']['wsdl']))
+        return client.create_service(SUBSCRIPTION_MANAGER_BINDING, address)
+
+    def create_onvif_service(self, name, from_template=True, portType=None,
+                             **kwargs):
+        """Create an ONVIF service client from the shared definitions.
+        """
+        name = name.lower()
+        xaddr, wsdl_file, binding_name = self.get_definition(name, portType)
+        with self.services_lock:
+            service = ONVIFService(xaddr, self.user, self.passwd, wsdl_file,
+                                   self.encrypt, self.daemon,
+                                   zeep_client=self._create_zeep_client(
+                                       wsdl_file),
+                                   no_cache=self.no_cache,
+                                   portType=portType,
+                                   dt_diff=self.dt_diff,
+                                   binding_name=binding_name,
+                                   transport=self.transport)
+            self.services[name] = service
+            setattr(self, name, service)
+        return service
@@ -0,0 +1,882 @@
+#coding: utf-8
+
+"""
+    Local PTZ camera simulator: a SOAP server that answers the device,
+    media, PTZ and event requests that PTZ presets makes, and a UDP server
+    that answers VISCA over IP, with simulated motion, latency and 
+    failures. It lets Camera and Model be exercised and benchmarked 
+    without real cameras.
+"""
+
+import http.server
+import math
+import random
+import re
+import socketserver
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from xml.sax.saxutils import escape, quoteattr
+
+from ptzpresets import globals
+from ptzpresets import viscadriver
+
+
+SOAP_NAMESPACE = 'http://www.w3.org/2003/05/soap-envelope'
+NAMESPACES = {
+    'tds': 'http://www.onvif.org/ver10/device/wsdl',
+    'trt': 'http://www.onvif.org/ver10/media/wsdl',
+    'tptz': 'http://www.onvif.org/ver20/ptz/wsdl',
+    'tt': 'http://www.onvif.org/ver10/schema',
+    'ter': 'http://www.onvif.org/ver10/error',
+    'tev': 'http://www.onvif.org/ver10/events/wsdl',
+    'wsnt': 'http://docs.oasis-open.org/wsn/b-2',
+    'wsa': 'http://www.w3.org/2005/08/addressing',
+    'tns1': 'http://www.onvif.org/ver10/topics',
+}
+SERVICE_PATHS = {
+    'device': '/onvif/device_service',
+    'media': '/onvif/media_service',
+    'ptz': '/onvif/ptz_service',
+    'events': '/onvif/event_service',
+}
+# Each PullPoint subscription gets its own address: this path followed
+# by its id.
+SUBSCRIPTION_PATH = '/onvif/subscription/'
+
+# Topics of the PTZ notifications.
+PRESET_INVOKED = 'tns1:PTZController/PTZPresets/Invoked'
+PRESET_REACHED = 'tns1:PTZController/PTZPresets/Reached'
+PRESET_ABORTED = 'tns1:PTZController/PTZPresets/Aborted'
+MOVE_STATUS = 'tns1:PTZController/MoveStatus'
+
+# Position and speed ranges of the simulated PTZ node (the generic
+# ONVIF spaces).
+PAN_TILT_RANGE = (-1.0, 1.0)
+ZOOM_RANGE = (0.0, 1.0)
+SPEED_RANGE = (0.0, 1.0)
+
+PROFILE_TOKEN = 'profile_1'
+NODE_TOKEN = 'ptz_node_1'
+
+
+def travel_time(distance, max_speed, acceleration):
+    """Return the time an axis takes to travel distance from standstill
+    to standstill: it accelerates up to max_speed, cruises and
+    decelerates again (or only accelerates and decelerates if the
+    distance is too short to reach max_speed).
+    """
+    distance = abs(distance)
+    if distance * acceleration < max_speed ** 2:
+        return 2 * math.sqrt(distance / acceleration)
+    return distance / max_speed + max_speed / acceleration
+
+
+def travelled(distance, max_speed, acceleration, elapsed):
+    """Return the distance covered elapsed seconds after the start of
+    a move over distance (see travel_time).
+    """
+    distance = abs(distance)
+    duration = travel_time(distance, max_speed, acceleration)
+    if elapsed >= duration:
+        return distance
+    peak_speed = min(max_speed, math.sqrt(distance * acceleration))
+    ramp = peak_speed / acceleration
+    if elapsed <= ramp:
+        return acceleration * elapsed ** 2 / 2
+    remaining = duration - elapsed
+    if remaining <= ramp:
+        return distance - acceleration * remaining ** 2 / 2
+    return acceleration * ramp ** 2 / 2 + peak_speed * (elapsed - ramp)
+
+
+class SimulatedCamera:
+    """The state and motion of a simulated PTZ camera.
+
+    Each axis moves with a trapezoidal speed profile: it accelerates
+    up to its maximum speed (scaled by the requested speed), cruises
+    and decelerates to stop at the target. A new move starts from the
+    current position, from standstill.
+
+    The camera keeps a timeline of the PTZ notifications that a real
+    camera would send: Invoked when a move to a preset starts, Reached
+    when it arrives and Aborted when it is interrupted, and a
+    MoveStatus notification (MOVING, then IDLE) for other moves. Each
+    notification has a serial number, so that subscribers can keep
+    track of what they have received.
+
+    Attributes
+    ----------
+    name: string
+        The name of the camera, also used as its serial number.
+    presets: dictionary
+        (name, position) of each preset, by token.
+    max_presets: integer
+        The maximum number of presets.
+    max_speeds: tuple
+        The maximum speed of each axis (pan, tilt, zoom) in units per
+        second.
+    accelerations: tuple
+        The acceleration of each axis in units per second squared.
+    latency, jitter: float
+        Each response is delayed by latency plus a uniformly random
+        jitter in [-jitter, jitter] seconds.
+    failure_rate: float
+        The probability that a request fails with a SOAP fault.
+
+    Methods
+    -------
+    get_position(): tuple
+        Return the current (pan, tilt, zoom) position.
+    is_moving(): boolean
+        Return True if the camera has not arrived yet.
+    time_to_arrival(): float
+        Return the number of seconds until the camera arrives.
+    move_to(position, speed=None, preset=None):
+        Start a move to a position.
+    stop():
+        Stop at the current position.
+    event_cursor(): integer
+        Return the serial number of the last notification sent so far.
+    get_events(cursor, timeout, limit): list
+        Wait for the notifications after cursor and return them.
+    set_preset(name=None, token=None, create=False): string
+        Save the current position as a preset and return its token.
+    goto_preset(token, speed=None):
+        Start a move to a preset.
+    remove_preset(token):
+        Delete a preset.
+    delay(): float
+        Return the (random) delay of the next response.
+    should_fail(): boolean
+        Return True if the next request should fail.
+    """
+    max_events = 1000   # Notifications kept in the timeline
+
+    def __init__(self, name='simulator', presets=None, max_presets=100,
+                 max_speeds=(1.0, 0.5, 0.5), accelerations=(2.0, 1.0, 1.0),
+                 latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.name = name
+        self.presets = dict(presets or {})
+        self.max_presets = max_presets
+        self.max_speeds = tuple(max_speeds)
+        self.accelerations = tuple(accelerations)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._start = (0.0, 0.0, 0.0)
+        self._target = self._start
+        self._speeds = self.max_speeds
+        self._start_time = time.monotonic()
+        self._last_token = max((int(t) for t in self.presets
+                                if t.isdigit()), default=0)
+        self._events = []   # (serial, time, topic, items), in time order
+        self._event_serial = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _position_at(self, now):
+        return tuple(
+            s + math.copysign(travelled(t - s, v, a, now - self._start_time),
+                              t - s)
+            for s, t, v, a in zip(self._start, self._target, self._speeds,
+                                  self.accelerations)
+        )
+
+    def get_position(self):
+        with self._lock:
+            return self._position_at(time.monotonic())
+
+    def is_moving(self):
+        with self._lock:
+            return self._position_at(time.monotonic()) != self._target
+
+    def time_to_arrival(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._start_time
+            return max(max(travel_time(t - s, v, a) for s, t, v, a in zip(
+                self._start, self._target, self._speeds, self.accelerations
+            )) - elapsed, 0)
+
+    def move_to(self, position, speed=None, preset=None):
+        """Start a move to position. An axis that is None in position
+        keeps its current target. speed is a (pan, tilt, zoom) tuple of
+        fractions of the maximum speeds (None for full speed). preset
+        is the token of the preset the camera moves to, if any.
+        """
+        speed = speed or (1.0, 1.0, 1.0)
+        with self._lock:
+            now = time.monotonic()
+            self._start = self._position_at(now)
+            self._target = tuple(
+                t if p is None else min(max(p, low), high)
+                for p, t, (low, high) in zip(
+                    position, self._target,
+                    (PAN_TILT_RANGE, PAN_TILT_RANGE, ZOOM_RANGE))
+            )
+            self._speeds = tuple(m * max(s, 0.01) for m, s
+                                 in zip(self.max_speeds, speed))
+            self._start_time = now
+            arrival = now + max(travel_time(t - s, v, a) for s, t, v, a in zip(
+                self._start, self._target, self._speeds, self.accelerations))
+            self._interrupt_move(now)
+            if preset is not None:
+                self._add_event(now, PRESET_INVOKED, {'PresetToken': preset})
+                self._add_event(arrival, PRESET_REACHED,
+                                {'PresetToken': preset})
+            else:
+                self._add_event(now, MOVE_STATUS,
+                                {'PanTilt': 'MOVING', 'Zoom': 'MOVING'})
+                self._add_event(arrival, MOVE_STATUS,
+                                {'PanTilt': 'IDLE', 'Zoom': 'IDLE'})
+            self._changed.notify_all()
+
+    def stop(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._interrupt_move(now):
+                self._add_event(now, MOVE_STATUS,
+                                {'PanTilt': 'IDLE', 'Zoom': 'IDLE'})
+                self._changed.notify_all()
+            self._start = self._target = self._position_at(now)
+            self._start_time = now
+
+    def _add_event(self, at, topic, items):
+        self._event_serial += 1
+        self._events.append((self._event_serial, at, topic, items))
+        del self._events[:-self.max_events]
+
+    def _interrupt_move(self, now):
+        """Drop the notifications of the move in progress that have
+        not been sent yet, and send Aborted if it was a move to a
+        preset. Return True if a move was in progress. The caller
+        holds the lock.
+        """
+        was_moving = False
+        while self._events and self._events[-1][1] > now:
+            _, _, topic, items = self._events.pop()
+            was_moving = True
+            if topic == PRESET_REACHED:
+                self._add_event(now, PRESET_ABORTED, items)
+        return was_moving
+
+    def event_cursor(self):
+        """Return the serial number of the last notification that has
+        been sent, so that a new subscriber only gets later ones.
+        """
+        with self._lock:
+            now = time.monotonic()
+            pending = [e[0] for e in self._events if e[1] > now]
+            return pending[0] - 1 if pending else self._event_serial
+
+    def get_events(self, cursor, timeout, limit):
+        """Wait at most timeout seconds for notifications with a
+        serial number above cursor. Return at most limit of them as
+        (serial, topic, items) tuples, where items is a dictionary of
+        the simple items of the message.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                now = time.monotonic()
+                events = [e for e in self._events
+                          if e[0] > cursor and e[1] <= now]
+                if events or now >= deadline:
+                    return [(serial, topic, items) for serial, _, topic, items
+                            in events[:limit]]
+                due = min([e[1] for e in self._events if e[0] > cursor]
+                          + [deadline])
+                self._changed.wait(due - now)
+
+    def set_preset(self, name=None, token=None, create=False):
+        """Save the current position as a preset. Raise KeyError if
+        the token does not exist (unless create=True), or 
+        OverflowError if there is no room for a new preset.
+        """
+        position = self.get_position()
+        with self._lock:
+            if token is not None and token in self.presets:
+                name = name or self.presets[token][0]
+            elif token is not None and not create:
+                raise KeyError(token)
+            elif len(self.presets) >= self.max_presets:
+                raise OverflowError
+            elif token is not None:
+                name = name or f'Preset {token}'
+            else:
+                self._last_token += 1
+                token = str(self._last_token)
+                name = name or f'Preset {token}'
+            self.presets[token] = (name, position)
+        return token
+
+    def goto_preset(self, token, speed=None):
+        """Start a move to a preset. Raise KeyError if the token does
+        not exist.
+        """
+        with self._lock:
+            position = self.presets[token][1]
+        self.move_to(position, speed, preset=token)
+
+    def remove_preset(self, token):
+        with self._lock:
+            del self.presets[token]
+
+    def delay(self):
+        return max(self.latency
+                   + self._random.uniform(-self.jitter, self.jitter), 0)
+
+    def should_fail(self):
+        return self._random.random() < self.failure_rate
+
+    def __repr__(self):
+        return f'SimulatedCamera(name={self.name})'
+
+
+def _local_name(element):
+    return element.tag.rsplit('}', maxsplit=1)[-1]
+
+
+def _find(element, *names):
+    """Return the descendant of element along a path of local names
+    (ignoring namespaces), or None.
+    """
+    for name in names:
+        if element is None:
+            return None
+        element = next((e for e in element if _local_name(e) == name), None)
+    return element
+
+
+def _text(element, *names):
+    element = _find(element, *names)
+    return element.text if element is not None else None
+
+
+def _vector(element, default=None):
+    """Return a (pan, tilt, zoom) tuple from a PTZVector or PTZSpeed
+    element. Missing axes get the value of default.
+    """
+    pan_tilt = _find(element, 'PanTilt')
+    zoom = _find(element, 'Zoom')
+    if pan_tilt is None and zoom is None:
+        return None
+    return (
+        float(pan_tilt.get('x')) if pan_tilt is not None else default[0],
+        float(pan_tilt.get('y')) if pan_tilt is not None else default[1],
+        float(zoom.get('x')) if zoom is not None else default[2],
+    )
+
+
+def _xml_vector(tag, position):
+    return (f'<{tag}><tt:PanTilt x="{position[0]:.6f}" y="{position[1]:.6f}"/>'
+            f'<tt:Zoom x="{position[2]:.6f}"/></{tag}>')
+
+
+def _duration(text, default):
+    """Return the number of seconds of an xsd:duration (such as
+    PT10S), or default if text is None or not a duration.
+    """
+    match = re.fullmatch(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?'
+                         r'(?:(\d+(?:\.\d*)?)S)?)?', (text or '').strip())
+    if text is None or match is None:
+        return default
+    days, hours, minutes, seconds = (float(g or 0) for g in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def _utc_time(offset=0):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() 
+                                                           + offset))
+
+
+def _xml_notification(topic, items):
+    data = ''.join(f'<tt:SimpleItem Name={quoteattr(n)} Value={quoteattr(v)}/>'
+                   for n, v in items.items())
+    return (f'<wsnt:NotificationMessage><wsnt:Topic Dialect="http://'
+            f'www.onvif.org/ver10/tev/topicExpression/ConcreteSet">{topic}'
+            f'</wsnt:Topic><wsnt:Message><tt:Message UtcTime="{_utc_time()}" '
+            f'PropertyOperation="Changed"><tt:Source><tt:SimpleItem '
+            f'Name="ProfileToken" Value="{PROFILE_TOKEN}"/></tt:Source>'
+            f'<tt:Data>{data}</tt:Data></tt:Message></wsnt:Message>'
+            f'</wsnt:NotificationMessage>')
+
+
+def _xml_range(tag, bounds, y_bounds=None):
+    y_range = ('' if y_bounds is None else
+               f'<tt:YRange><tt:Min>{y_bounds[0]}</tt:Min>'
+               f'<tt:Max>{y_bounds[1]}</tt:Max></tt:YRange>')
+    return (f'<tt:{tag}><tt:URI>http://www.onvif.org/ver10/tptz/'
+            f'{tag}/Generic</tt:URI><tt:XRange><tt:Min>{bounds[0]}</tt:Min>'
+            f'<tt:Max>{bounds[1]}</tt:Max></tt:XRange>{y_range}</tt:{tag}>')
+
+
+class SOAPFault(Exception):
+    """A request that is answered with a SOAP fault."""
+    def __init__(self, subcode, reason):
+        super().__init__(reason)
+        self.subcode = subcode
+        self.reason = reason
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Handler that answers the SOAP requests to a SimulatorServer.
+    The WS-Security header is accepted as is: credentials are not
+    checked.
+    """
+    protocol_version = 'HTTP/1.1'    # Keep-alive, like real cameras
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        camera = self.server.camera
+        time.sleep(camera.delay())
+        try:
+            if camera.should_fail():
+                raise SOAPFault('ter:Simulated', 'Simulated failure')
+            body = _find(ET.fromstring(request), 'Body')
+            operation = body[0]
+            response = self.server.handle(_local_name(operation), operation,
+                                          self.path)
+            status = 200
+        except SOAPFault as fault:
+            response = (f'<SOAP-ENV:Fault><SOAP-ENV:Code><SOAP-ENV:Value>'
+                        f'SOAP-ENV:Sender</SOAP-ENV:Value><SOAP-ENV:Subcode>'
+                        f'<SOAP-ENV:Value>{fault.subcode}</SOAP-ENV:Value>'
+                        f'</SOAP-ENV:Subcode></SOAP-ENV:Code><SOAP-ENV:Reason>'
+                        f'<SOAP-ENV:Text xml:lang="en">{escape(fault.reason)}'
+                        f'</SOAP-ENV:Text></SOAP-ENV:Reason></SOAP-ENV:Fault>')
+            status = 500
+        except (ET.ParseError, IndexError):
+            self.send_error(400)
+            return
+        namespaces = ' '.join(f'xmlns:{p}="{ns}"'
+                              for p, ns in NAMESPACES.items())
+        envelope = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                    f'<SOAP-ENV:Envelope xmlns:SOAP-ENV="{SOAP_NAMESPACE}" '
+                    f'{namespaces}><SOAP-ENV:Body>{response}</SOAP-ENV:Body>'
+                    f'</SOAP-ENV:Envelope>').encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(envelope)))
+        self.end_headers()
+        self.wfile.write(envelope)
+
+    def log_message(self, format, *args):
+        pass    # Keep benchmarks quiet.
+
+
+class SimulatorServer(http.server.ThreadingHTTPServer):
+    """SOAP server that serves a SimulatedCamera. It implements
+    GetDeviceInformation, GetCapabilities and GetSystemDateAndTime
+    (device), GetProfiles (media), GetPresets, SetPreset,
+    GotoPreset, RemovePreset, GetStatus, AbsoluteMove, Stop and
+    GetNode (PTZ), and CreatePullPointSubscription (events) with
+    PullMessages and Unsubscribe at the address of the subscription.
+    PullMessages waits for the PTZ notifications of the camera. A
+    subscription ends when it has not been pulled from within its
+    termination time. Other requests get an ActionNotSupported fault.
+
+    Attributes
+    ----------
+    camera: SimulatedCamera
+        The simulated camera.
+    host, port: string and integer
+        The address the server listens on.
+
+    Methods
+    -------
+    start():
+        Serve in a background thread.
+    stop():
+        Stop serving and close the socket.
+    get_config(wsdl_dir, **options): dict
+        Return a camera configuration (as in config.json) for the
+        simulator.
+    handle(operation, request, path=None): string
+        Return the body of the response to a request (to the service
+        or subscription at path).
+    """
+    daemon_threads = True
+
+    def __init__(self, camera=None, host='127.0.0.1', port=0):
+        """
+        Parameters
+        ----------
+        camera : SimulatedCamera
+            The camera to serve (a new SimulatedCamera by default).
+        host : string
+            The address to listen on.
+        port : integer
+            The port to listen on (0 picks a free port).
+        """
+        super().__init__((host, port), _RequestHandler)
+        self.camera = camera or SimulatedCamera()
+        self.host, self.port = self.server_address[:2]
+        self._thread = None
+        self._subscriptions = dict()
+        self._last_subscription = 0
+        self._subscriptions_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True,
+            name=f'SimulatorServer-{self.camera.name}')
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def get_config(self, wsdl_dir, **options):
+        return {'cameraname': self.camera.name, 'ip': self.host,
+                'port': self.port, 'user': 'admin', 'password': 'admin',
+                'wsdl_dir': wsdl_dir, **options}
+
+    def handle(self, operation, request, path=None):
+        if path is not None and path.startswith(SUBSCRIPTION_PATH):
+            subscription = self._get_subscription(
+                path[len(SUBSCRIPTION_PATH):])
+            handler = getattr(self, f'_handle_subscription_{operation}', 
+                              None)
+            if handler is None:
+                raise SOAPFault('ter:ActionNotSupported',
+                                f'{operation} is not supported')
+            return handler(subscription, request)
+        handler = getattr(self, f'_handle_{operation}', None)
+        if handler is None:
+            raise SOAPFault('ter:ActionNotSupported',
+                            f'{operation} is not supported')
+        return handler(request)
+
+    def _get_subscription(self, subscription_id):
+        """Return the subscription with an id as a dictionary with
+        its id, cursor (see SimulatedCamera.get_events), termination 
+        time in seconds and expiry time. Raise a SOAPFault if it does not
+        exist (anymore).
+        """
+        with self._subscriptions_lock:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is not None \
+                    and subscription['expires'] < time.monotonic():
+                del self._subscriptions[subscription_id]
+                subscription = None
+        if subscription is None:
+            raise SOAPFault('ter:InvalidArgVal',
+                            'The subscription does not exist')
+        return subscription
+
+    def _xaddr(self, service):
+        return f'http://{self.host}:{self.port}{SERVICE_PATHS[service]}'
+
+    def _handle_GetSystemDateAndTime(self, request):
+        now = time.gmtime()
+        return (f'<tds:GetSystemDateAndTimeResponse><tds:SystemDateAndTime>'
+                f'<tt:DateTimeType>Manual</tt:DateTimeType>'
+                f'<tt:DaylightSavings>false</tt:DaylightSavings>'
+                f'<tt:UTCDateTime><tt:Time><tt:Hour>{now.tm_hour}</tt:Hour>'
+                f'<tt:Minute>{now.tm_min}</tt:Minute>'
+                f'<tt:Second>{now.tm_sec}</tt:Second></tt:Time><tt:Date>'
+                f'<tt:Year>{now.tm_year}</tt:Year>'
+                f'<tt:Month>{now.tm_mon}</tt:Month>'
+                f'<tt:Day>{now.tm_mday}</tt:Day></tt:Date></tt:UTCDateTime>'
+                f'</tds:SystemDateAndTime></tds:GetSystemDateAndTimeResponse>')
+
+    def _handle_GetDeviceInformation(self, request):
+        return (f'<tds:GetDeviceInformationResponse>'
+                f'<tds:Manufacturer>PTZ presets</tds:Manufacturer>'
+                f'<tds:Model>Simulator</tds:Model>'
+                f'<tds:FirmwareVersion>1.0</tds:FirmwareVersion>'
+                f'<tds:SerialNumber>{escape(self.camera.name)}'
+                f'</tds:SerialNumber><tds:HardwareId>1</tds:HardwareId>'
+                f'</tds:GetDeviceInformationResponse>')
+
+    def _handle_GetCapabilities(self, request):
+        return (f'<tds:GetCapabilitiesResponse><tds:Capabilities>'
+                f'<tt:Device><tt:XAddr>{self._xaddr("device")}</tt:XAddr>'
+                f'</tt:Device>'
+                f'<tt:Events><tt:XAddr>{self._xaddr("events")}</tt:XAddr>'
+                f'<tt:WSSubscriptionPolicySupport>false'
+                f'</tt:WSSubscriptionPolicySupport>'
+                f'<tt:WSPullPointSupport>true</tt:WSPullPointSupport>'
+                f'<tt:WSPausableSubscriptionManagerInterfaceSupport>false'
+                f'</tt:WSPausableSubscriptionManagerInterfaceSupport>'
+                f'</tt:Events>'
+                f'<tt:Media><tt:XAddr>{self._xaddr("media")}</tt:XAddr>'
+                f'<tt:StreamingCapabilities>'
+                f'<tt:RTPMulticast>false</tt:RTPMulticast>'
+                f'<tt:RTP_TCP>true</tt:RTP_TCP>'
+                f'<tt:RTP_RTSP_TCP>true</tt:RTP_RTSP_TCP>'
+                f'</tt:StreamingCapabilities></tt:Media>'
+                f'<tt:PTZ><tt:XAddr>{self._xaddr("ptz")}</tt:XAddr></tt:PTZ>'
+                f'</tds:Capabilities></tds:GetCapabilitiesResponse>')
+
+    def _handle_GetProfiles(self, request):
+        return (f'<trt:GetProfilesResponse>'
+                f'<trt:Profiles token="{PROFILE_TOKEN}" fixed="true">'
+                f'<tt:Name>Simulator</tt:Name>'
+                f'<tt:PTZConfiguration token="ptz_configuration_1">'
+                f'<tt:Name>PTZ</tt:Name><tt:UseCount>1</tt:UseCount>'
+                f'<tt:NodeToken>{NODE_TOKEN}</tt:NodeToken>'
+                f'</tt:PTZConfiguration></trt:Profiles>'
+                f'</trt:GetProfilesResponse>')
+
+    def _handle_GetNode(self, request):
+        return (f'<tptz:GetNodeResponse><tptz:PTZNode token="{NODE_TOKEN}">'
+                f'<tt:Name>Simulator</tt:Name><tt:SupportedPTZSpaces>'
+                + _xml_range('AbsolutePanTiltPositionSpace', PAN_TILT_RANGE,
+                             PAN_TILT_RANGE)
+                + _xml_range('AbsoluteZoomPositionSpace', ZOOM_RANGE)
+                + _xml_range('PanTiltSpeedSpace', SPEED_RANGE)
+                + _xml_range('ZoomSpeedSpace', SPEED_RANGE)
+                + f'</tt:SupportedPTZSpaces><tt:MaximumNumberOfPresets>'
+                f'{self.camera.max_presets}</tt:MaximumNumberOfPresets>'
+                f'<tt:HomeSupported>false</tt:HomeSupported>'
+                f'</tptz:PTZNode></tptz:GetNodeResponse>')
+
+    def _handle_GetPresets(self, request):
+        presets = ''.join(
+            f'<tptz:Preset token={quoteattr(t)}><tt:Name>{escape(n)}'
+            f'</tt:Name>{_xml_vector("tt:PTZPosition", p)}</tptz:Preset>'
+            for t, (n, p) in list(self.camera.presets.items())
+        )
+        return f'<tptz:GetPresetsResponse>{presets}</tptz:GetPresetsResponse>'
+
+    def _handle_SetPreset(self, request):
+        try:
+            token = self.camera.set_preset(_text(request, 'PresetName'),
+                                           _text(request, 'PresetToken'))
+        except KeyError:
+            raise SOAPFault('ter:NoToken', 'The preset token does not exist')
+        except OverflowError:
+            raise SOAPFault('ter:TooManyPresets',
+                            'The maximum number of presets is reached')
+        return (f'<tptz:SetPresetResponse><tptz:PresetToken>{escape(token)}'
+                f'</tptz:PresetToken></tptz:SetPresetResponse>')
+
+    def _handle_GotoPreset(self, request):
+        speed = _vector(_find(request, 'Speed'), default=(1.0, 1.0, 1.0))
+        try:
+            self.camera.goto_preset(_text(request, 'PresetToken'), speed)
+        except KeyError:
+            raise SOAPFault('ter:NoToken', 'The preset token does not exist')
+        return '<tptz:GotoPresetResponse/>'
+
+    def _handle_RemovePreset(self, request):
+        try:
+            self.camera.remove_preset(_text(request, 'PresetToken'))
+        except KeyError:
+            raise SOAPFault('ter:NoToken', 'The preset token does not exist')
+        return '<tptz:RemovePresetResponse/>'
+
+    def _handle_AbsoluteMove(self, request):
+        position = _vector(_find(request, 'Position'),
+                           default=self.camera.get_position())
+        if position is None:
+            raise SOAPFault('ter:InvalidArgVal', 'No position given')
+        speed = _vector(_find(request, 'Speed'), default=(1.0, 1.0, 1.0))
+        self.camera.move_to(position, speed)
+        return '<tptz:AbsoluteMoveResponse/>'
+
+    def _handle_Stop(self, request):
+        self.camera.stop()
+        return '<tptz:StopResponse/>'
+
+    def _handle_GetStatus(self, request):
+        position = self.camera.get_position()
+        state = 'MOVING' if self.camera.is_moving() else 'IDLE'
+        utc_time = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return (f'<tptz:GetStatusResponse><tptz:PTZStatus>'
+                f'{_xml_vector("tt:Position", position)}'
+                f'<tt:MoveStatus><tt:PanTilt>{state}</tt:PanTilt>'
+                f'<tt:Zoom>{state}</tt:Zoom></tt:MoveStatus>'
+                f'<tt:UtcTime>{utc_time}</tt:UtcTime>'
+                f'</tptz:PTZStatus></tptz:GetStatusResponse>')
+
+    def _handle_CreatePullPointSubscription(self, request):
+        termination = _duration(_text(request, 'InitialTerminationTime'),
+                                default=60)
+        with self._subscriptions_lock:
+            self._last_subscription += 1
+            subscription_id = str(self._last_subscription)
+            self._subscriptions[subscription_id] = {
+                'id': subscription_id,
+                'cursor': self.camera.event_cursor(),
+                'termination': termination,
+                'expires': time.monotonic() + termination
+            }
+        return (f'<tev:CreatePullPointSubscriptionResponse>'
+                f'<tev:SubscriptionReference><wsa:Address>http://'
+                f'{self.host}:{self.port}{SUBSCRIPTION_PATH}{subscription_id}'
+                f'</wsa:Address></tev:SubscriptionReference>'
+                f'<wsnt:CurrentTime>{_utc_time()}</wsnt:CurrentTime>'
+                f'<wsnt:TerminationTime>{_utc_time(termination)}'
+                f'</wsnt:TerminationTime>'
+                f'</tev:CreatePullPointSubscriptionResponse>')
+
+    def _handle_subscription_PullMessages(self, subscription, request):
+        timeout = _duration(_text(request, 'Timeout'), default=10)
+        limit = int(_text(request, 'MessageLimit') or 100)
+        events = self.camera.get_events(subscription['cursor'], timeout,
+                                        limit)
+        if events:
+            subscription['cursor'] = events[-1][0]
+        subscription['expires'] = (time.monotonic() 
+                                   + subscription['termination'])
+        messages = ''.join(_xml_notification(topic, items)
+                           for _, topic, items in events)
+        return (f'<tev:PullMessagesResponse>'
+                f'<tev:CurrentTime>{_utc_time()}</tev:CurrentTime>'
+                f'<tev:TerminationTime>'
+                f'{_utc_time(subscription["termination"])}'
+                f'</tev:TerminationTime>{messages}'
+                f'</tev:PullMessagesResponse>')
+
+    def _handle_subscription_Unsubscribe(self, subscription, request):
+        with self._subscriptions_lock:
+            self._subscriptions.pop(subscription['id'], None)
+        return '<wsnt:UnsubscribeResponse/>'
+
+
+class _ViscaRequestHandler(socketserver.BaseRequestHandler):
+    """Handler that answers a VISCA over IP datagram to a
+    ViscaSimulatorServer. A simulated failure drops the datagram, as
+    the network would.
+    """
+    def handle(self):
+        data, sock = self.request
+        camera = self.server.camera
+        try:
+            payload_type, sequence, payload = viscadriver.unpack_message(data)
+        except ValueError:
+            return
+        time.sleep(camera.delay())
+        if camera.should_fail():
+            return
+        if payload_type == viscadriver.CONTROL:
+            replies = [(viscadriver.CONTROL_REPLY, b'\x01', 0)]
+        else:
+            replies = self.server.handle(payload_type, payload)
+
+        def reply(payload_type, payload):
+            sock.sendto(viscadriver.pack_message(payload_type, sequence,
+                                                 payload),
+                        self.client_address)
+        for payload_type, payload, delay in replies:
+            if delay:
+                threading.Timer(delay, reply, (payload_type, payload)).start()
+            else:
+                reply(payload_type, payload)
+
+
+class ViscaSimulatorServer(socketserver.ThreadingUDPServer):
+    """UDP server that serves a SimulatedCamera over VISCA over IP, as
+    a stand-in for the ViscaDriver. It implements memory reset, set
+    and recall, absolute pan-tilt and direct zoom positioning, the
+    pan-tilt and zoom stops, and the pan-tilt and zoom position 
+    inquiries. A recall is acknowledged
+    right away and completed when the camera has arrived. Positions
+    are converted with the default VISCA ranges of globals.
+
+    Attributes
+    ----------
+    camera: SimulatedCamera
+        The simulated camera.
+    host, port: string and integer
+        The address the server listens on.
+
+    Methods
+    -------
+    start():
+        Serve in a background thread.
+    stop():
+        Stop serving and close the socket.
+    get_config(**options): dict
+        Return a camera configuration (as in config.json) for the
+        simulator.
+    handle(payload_type, payload): list
+        Return the replies to a message as a list of (payload type,
+        payload, delay in seconds) tuples.
+    """
+    daemon_threads = True
+
+    def __init__(self, camera=None, host='127.0.0.1', port=0):
+        super().__init__((host, port), _ViscaRequestHandler)
+        self.camera = camera or SimulatedCamera()
+        self.host, self.port = self.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, daemon=True,
+            name=f'ViscaSimulatorServer-{self.camera.name}')
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def get_config(self, **options):
+        return {'cameraname': self.camera.name, 'driver': 'visca',
+                'ip': self.host, 'visca_port': self.port, **options}
+
+    def handle(self, payload_type, payload):
+        reply = viscadriver.REPLY
+        ack = (reply, b'\x90\x41\xff', 0)
+        completion = (reply, b'\x90\x51\xff', 0)
+        syntax_error = [(reply, b'\x90\x60\x02\xff', 0)]
+        pan_range = globals.VISCA_PAN_RANGE
+        tilt_range = globals.VISCA_TILT_RANGE
+        zoom_range = globals.VISCA_ZOOM_RANGE
+        if payload_type == viscadriver.INQUIRY:
+            pan, tilt, zoom = self.camera.get_position()
+            if payload == viscadriver.PAN_TILT_INQUIRY:
+                return [(reply, b'\x90\x50'
+                         + viscadriver.encode_nibbles(
+                             viscadriver.to_units(pan, pan_range))
+                         + viscadriver.encode_nibbles(
+                             viscadriver.to_units(tilt, tilt_range))
+                         + b'\xff', 0)]
+            if payload == viscadriver.ZOOM_INQUIRY:
+                return [(reply, b'\x90\x50'
+                         + viscadriver.encode_nibbles(viscadriver.to_units(
+                             zoom, zoom_range, low=0.0))
+                         + b'\xff', 0)]
+            return syntax_error
+        if payload[:4] == b'\x81\x01\x04\x3f' and len(payload) == 7:
+            action, token = payload[4], str(payload[5])
+            if action == viscadriver.MEMORY_RESET:
+                if token in self.camera.presets:
+                    self.camera.remove_preset(token)
+            elif action == viscadriver.MEMORY_SET:
+                self.camera.set_preset(token=token, create=True)
+            elif action == viscadriver.MEMORY_RECALL:
+                if token not in self.camera.presets:
+                    return [(reply, b'\x90\x61\x41\xff', 0)]
+                self.camera.goto_preset(token)
+                return [ack, (reply, b'\x90\x51\xff',
+                              self.camera.time_to_arrival())]
+            return [ack, completion]
+        if payload[:4] == b'\x81\x01\x06\x02' and len(payload) == 15:
+            speed = (payload[4] / globals.VISCA_MAX_PAN_SPEED,
+                     payload[5] / globals.VISCA_MAX_TILT_SPEED, 1.0)
+            self.camera.move_to((
+                viscadriver.from_units(viscadriver.decode_nibbles(
+                    payload[6:10]), pan_range),
+                viscadriver.from_units(viscadriver.decode_nibbles(
+                    payload[10:14]), tilt_range),
+                None
+            ), speed)
+            return [ack, completion]
+        if payload[:4] == b'\x81\x01\x04\x47' and len(payload) == 9:
+            self.camera.move_to((None, None, viscadriver.from_units(
+                viscadriver.decode_nibbles(payload[4:8], signed=False),
+                zoom_range, low=0.0)))
+            return [ack, completion]
+        if (payload[:4] == b'\x81\x01\x06\x01' and payload[6:] 
+                == b'\x03\x03\xff') or payload == viscadriver.ZOOM_STOP:
+            self.camera.stop()
+            return [ack, completion]
+        return syntax_error
@@ -60,6 +60,16 @@ style.configure('Highlighted.PresetButton.TButton',
     width=17
 )
 
+style.configure('Pending.PresetButton.TButton',
+    font=(DEFAULT_FONT, 9, tkfont.ITALIC),
+    foreground='#808080'
+)
+
+style.configure('Failed.PresetButton.TButton',
+    font=(DEFAULT_FONT, 9),
+    foreground='#C00000'
+)
+
 # Labels
 style.configure('Statusbar.TLabel',
     anchor=tk.W,
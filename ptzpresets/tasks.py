@@ -0,0 +1,97 @@
+#coding: utf-8
+
+"""
+    TaskRunner class that runs functions in the background and
+    hands their results back to the Tk event loop.
+"""
+
+import concurrent.futures
+import queue
+
+
+class TaskRunner:
+    """Run functions in background threads and call their completion
+    handlers in the Tk event loop.
+
+    Tk widgets may only be touched from the thread that runs the
+    mainloop. Completed tasks are therefore put on a queue that is
+    drained periodically with after().
+
+    Attributes
+    ----------
+    master: <tk widget>
+        The widget whose after() is used to drain the queue.
+    poll_interval: integer
+        Milliseconds between two checks of the completion queue.
+
+    Methods
+    -------
+    submit(func, *args, on_done=None, on_error=None, **kwargs): Future
+        Run func(*args, **kwargs) in the background. Afterwards, call
+        on_done(result) or on_error(exception) in the Tk event loop.
+    watch(future, on_done=None, on_error=None, on_cancel=None):
+        Call on_done, on_error or on_cancel() in the Tk event loop as 
+        soon as an existing future is done.
+    call_in_main(func, *args):
+        Call func(*args) in the Tk event loop. May be called from 
+        any thread.
+    shutdown():
+        Stop accepting tasks and stop draining the queue.
+    """
+    def __init__(self, master, max_workers=None, poll_interval=50):
+        self.master = master
+        self.poll_interval = poll_interval
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='TaskRunner')
+        self.completions = queue.Queue()
+        self._after_id = None
+        self._poll()
+
+    def submit(self, func, *args, on_done=None, on_error=None, **kwargs):
+        """Run func in the background and return its future."""
+        future = self.executor.submit(func, *args, **kwargs)
+        self.watch(future, on_done, on_error)
+        return future
+
+    def watch(self, future, on_done=None, on_error=None, on_cancel=None):
+        """Hand the outcome of future to on_done, on_error or on_cancel
+        in the Tk event loop.
+        """
+        future.add_done_callback(
+            lambda f: self.completions.put((f, on_done, on_error, on_cancel)))
+
+    def call_in_main(self, func, *args):
+        """Call func(*args) in the Tk event loop."""
+        future = concurrent.futures.Future()
+        future.set_result(None)
+        self.completions.put((future, lambda result: func(*args), None, None))
+
+    def shutdown(self):
+        """Stop accepting tasks and stop draining the queue."""
+        if self._after_id is not None:
+            self.master.after_cancel(self._after_id)
+            self._after_id = None
+        self.executor.shutdown(wait=False)
+
+    def _poll(self):
+        """Drain the completion queue and reschedule."""
+        while True:
+            try:
+                completion = self.completions.get_nowait()
+            except queue.Empty:
+                break
+            self._complete(*completion)
+        self._after_id = self.master.after(self.poll_interval, self._poll)
+
+    @staticmethod
+    def _complete(future, on_done, on_error, on_cancel):
+        if future.cancelled():
+            if on_cancel is not None:
+                on_cancel()
+            return
+        error = future.exception()
+        if error is None:
+            if on_done is not None:
+                on_done(future.result())
+        elif on_error is not None:
+            on_error(error)
@@ -0,0 +1,116 @@
+#coding: utf-8
+
+"""
+    Pooled keep-alive HTTP transport for the ONVIF services.
+"""
+
+import contextlib
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from zeep.transports import Transport
+
+from ptzpresets import globals
+from ptzpresets import health
+
+
+class PooledTransport(Transport):
+    """zeep Transport that keeps a pool of keep-alive connections
+    to a single camera host.
+
+    The transport is shared by all services of a camera, so that an
+    ONVIF call reuses an open connection instead of setting up a new
+    TCP connection. Cameras tend to close idle connections themselves:
+    urllib3 replaces a connection that the camera has closed when it
+    is taken from the pool. A request that fails is never sent again,
+    because the camera may have carried it out already (a SetPreset 
+    without a token would then create a second preset).
+
+    Every request is subject to an operation timeout and passes the
+    circuit breaker of the host, so that requests to a camera that 
+    is down fail fast.
+
+    Attributes
+    ----------
+    pool_size: integer
+        The maximum number of connections kept open to the host.
+    operation_timeout: float
+        Seconds a request may take (in the current thread).
+    health: ptzpresets.health.CircuitBreaker
+        The circuit breaker of the host.
+
+    Methods
+    -------
+    timeout(seconds):
+        Context manager that sets another operation timeout for the 
+        requests of the current thread (e.g. for long polling).
+    """
+    def __init__(self, pool_size=None, operation_timeout=None, name=None,
+                 **kwargs):
+        self._local = threading.local()
+        self.pool_size = pool_size or globals.HTTP_POOL_SIZE
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_size,
+            max_retries=Retry(total=0, connect=0, read=0, redirect=False))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        super().__init__(session=session, operation_timeout=(
+            operation_timeout or globals.CAMERA_OPERATION_TIMEOUT), **kwargs)
+        self.health = health.CircuitBreaker(name)
+
+    @property
+    def operation_timeout(self):
+        return getattr(self._local, 'timeout', self._operation_timeout)
+
+    @operation_timeout.setter
+    def operation_timeout(self, value):
+        self._operation_timeout = value
+
+    @contextlib.contextmanager
+    def timeout(self, seconds):
+        previous = getattr(self._local, 'timeout', None)
+        self._local.timeout = seconds
+        try:
+            yield
+        finally:
+            if previous is None:
+                del self._local.timeout
+            else:
+                self._local.timeout = previous
+
+    def _request(self, send, *args):
+        """Send a request through the circuit breaker."""
+        self.health.check()
+        try:
+            response = send(*args)
+        except Exception:
+            self.health.record_failure()
+            raise
+        self.health.record_success()
+        return response
+
+    def post(self, address, message, headers):
+        return self._request(super().post, address, message, headers)
+
+    def get(self, address, params, headers):
+        return self._request(super().get, address, params, headers)
+
+
+_transports = dict()
+_transports_lock = threading.Lock()
+
+
+def get_transport(host, pool_size=None, operation_timeout=None):
+    """Return the pooled transport for a camera host. The transport
+    is created on first use and shared afterwards.
+    """
+    with _transports_lock:
+        if host not in _transports:
+            _transports[host] = PooledTransport(
+                pool_size=pool_size, operation_timeout=operation_timeout,
+                name=host)
+        return _transports[host]
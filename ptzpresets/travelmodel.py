@@ -0,0 +1,125 @@
+#coding: utf-8
+
+"""
+    TravelModel class that learns how long a camera takes to move
+    between two positions.
+"""
+
+import threading
+
+import numpy as np
+
+from ptzpresets import globals
+
+
+class TravelModel:
+    """Model of the travel time of a camera, learned from the moves
+    it made.
+
+    A move takes a fixed latency plus the time its slowest axis needs
+    to cover its distance (the axes move at the same time):
+
+        duration = latency + max(seconds_per_unit * |delta|)
+
+    The model is fitted to the recorded moves by least squares. Since
+    the slowest axis depends on the speeds that are fitted, the fit
+    alternates between assigning each move to its slowest axis and
+    fitting the speeds, until the assignment no longer changes.
+
+    Attributes
+    ----------
+    max_samples: int
+        The number of recorded moves that is kept (the most recent
+        ones).
+    min_samples: int
+        The number of recorded moves needed before the model predicts
+        anything.
+
+    Methods
+    -------
+    add_sample(delta, duration):
+        Record a move of delta (pan, tilt, zoom) that took duration
+        seconds.
+    get_samples(): list
+        Return the recorded moves as [pan, tilt, zoom, seconds] lists.
+    predict(start, destination): float
+        Return the predicted travel time in seconds, or None if there
+        are not enough samples.
+    get_axis_weights(): numpy.ndarray
+        Return the fitted seconds per unit along each axis, or None.
+    """
+    def __init__(self, samples=None, max_samples=None, min_samples=None):
+        """
+        Parameters
+        ----------
+        samples : list
+            Recorded moves as [pan, tilt, zoom, seconds] lists (as
+            returned by get_samples).
+        """
+        self.max_samples = max_samples or globals.TRAVEL_MODEL_MAX_SAMPLES
+        self.min_samples = min_samples or globals.TRAVEL_MODEL_MIN_SAMPLES
+        self._samples = [list(s) for s in samples or []][-self.max_samples:]
+        self._fit = None
+        self._lock = threading.Lock()
+
+    def add_sample(self, delta, duration):
+        with self._lock:
+            self._samples.append([*delta, duration])
+            del self._samples[:-self.max_samples]
+            self._fit = None
+
+    def get_samples(self):
+        with self._lock:
+            return [list(s) for s in self._samples]
+
+    def predict(self, start, destination):
+        """Return the predicted number of seconds to travel from start
+        to destination ((pan, tilt, zoom) tuples). Return None if
+        either is unknown or the model has not seen enough moves.
+        """
+        fit = self._get_fit()
+        if fit is None or start is None or destination is None:
+            return None
+        latency, weights = fit
+        delta = np.abs(np.subtract(destination, start))
+        return float(latency + (weights * delta).max())
+
+    def get_axis_weights(self):
+        """Return the fitted seconds per unit along the pan, tilt and
+        zoom axes (e.g. for route.plan_route), or None.
+        """
+        fit = self._get_fit()
+        return None if fit is None else fit[1]
+
+    def _get_fit(self):
+        with self._lock:
+            if self._fit is None and len(self._samples) >= self.min_samples:
+                samples = np.array(self._samples, dtype=float)
+                self._fit = _fit_travel_times(np.abs(samples[:, :3]),
+                                              samples[:, 3])
+            return self._fit
+
+
+def _fit_travel_times(deltas, durations):
+    """Fit latency and seconds per unit along each axis to the moves
+    (absolute deltas as an (n, 3) array) and their durations. Return
+    a tuple (latency, weights).
+    """
+    rows = np.arange(len(deltas))
+    weights = np.ones(3)
+    dominant = None
+    for _ in range(globals.TRAVEL_MODEL_FIT_ITERATIONS):
+        new_dominant = np.argmax(deltas * weights, axis=1)
+        if dominant is not None and (new_dominant == dominant).all():
+            break
+        dominant = new_dominant
+        design = np.zeros((len(deltas), 4))
+        design[:, 0] = 1
+        design[rows, dominant + 1] = deltas[rows, dominant]
+        coefficients, *_ = np.linalg.lstsq(design, durations, rcond=None)
+        latency = max(coefficients[0], 0.0)
+        # Axes that were never the slowest one keep their estimate.
+        is_fitted = design[:, 1:].any(axis=0)
+        weights = np.where(is_fitted, np.maximum(coefficients[1:], 0.0),
+                           weights)
+    return latency, weights
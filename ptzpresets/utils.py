@@ -28,6 +28,15 @@ def get_user_config_dir():
     if not dir.exists():
         dir.mkdir(parents=True)
     return dir
+
+def get_user_cache_dir():
+    """Return the correct user cache directory path. Create
+    the directory if it does not exist.
+    """
+    dir = Path(appdirs.user_cache_dir(globals.APP_TITLE, globals.APP_AUTHOR))
+    if not dir.exists():
+        dir.mkdir(parents=True)
+    return dir
     
     
 
@@ -0,0 +1,375 @@
+#coding: utf-8
+
+"""
+    Camera driver for cameras that speak VISCA over IP (UDP), see
+    driver.Driver. A preset recall is a single small datagram.
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+from ptzpresets import driver
+from ptzpresets import errors
+from ptzpresets import globals
+
+
+# Payload types of the VISCA over IP header.
+COMMAND = 0x0100
+INQUIRY = 0x0110
+REPLY = 0x0111
+CONTROL = 0x0200
+CONTROL_REPLY = 0x0201
+
+HEADER = struct.Struct('>HHI')  # Payload type, payload length, sequence
+
+# Kinds of reply messages (the high nibble of their second byte).
+ACK = 0x40
+COMPLETION = 0x50
+ERROR = 0x60
+
+RESET_SEQUENCE = b'\x01'
+MEMORY_RESET = 0x00
+MEMORY_SET = 0x01
+MEMORY_RECALL = 0x02
+PAN_TILT_INQUIRY = b'\x81\x09\x06\x12\xff'
+ZOOM_INQUIRY = b'\x81\x09\x04\x47\xff'
+ZOOM_STOP = b'\x81\x01\x04\x07\x00\xff'
+
+
+def pack_message(payload_type, sequence, payload):
+    return HEADER.pack(payload_type, len(payload), sequence) + payload
+
+
+def unpack_message(message):
+    """Return the payload type, sequence number and payload of a
+    message. Raise ValueError if it is malformed.
+    """
+    if len(message) < HEADER.size:
+        raise ValueError('Message too short')
+    payload_type, length, sequence = HEADER.unpack_from(message)
+    payload = message[HEADER.size:HEADER.size + length]
+    if len(payload) != length:
+        raise ValueError('Message too short')
+    return payload_type, sequence, payload
+
+
+def encode_nibbles(value, count=4):
+    """Return an integer as count bytes of which only the low nibbles
+    are used (0p 0q 0r 0s), most significant first. Negative values
+    are encoded in two's complement.
+    """
+    value &= (1 << 4 * count) - 1
+    return bytes((value >> 4 * i) & 0x0f for i in reversed(range(count)))
+
+
+def decode_nibbles(data, signed=True):
+    """Return the integer encoded in the low nibbles of data."""
+    value = 0
+    for byte in data:
+        value = value << 4 | byte & 0x0f
+    bits = 4 * len(data)
+    if signed and value >= 1 << bits - 1:
+        value -= 1 << bits
+    return value
+
+
+def to_units(value, bounds, low=-1.0):
+    """Convert a position from low..1 to the camera's units within
+    bounds (a (minimum, maximum) tuple).
+    """
+    fraction = (min(max(value, low), 1.0) - low) / (1.0 - low)
+    return round(bounds[0] + fraction * (bounds[1] - bounds[0]))
+
+
+def from_units(value, bounds, low=-1.0):
+    """Convert a position in the camera's units within bounds to
+    low..1.
+    """
+    return low + (value - bounds[0]) / (bounds[1] - bounds[0]) * (1.0 - low)
+
+
+class PresetStore:
+    """The names and positions of the presets of the VISCA cameras,
+    which VISCA cameras do not keep themselves, stored in a JSON file
+    structured as follows:
+        {"cameraname": {"token": {"name": "...",
+                                  "position": [pan, tilt, zoom]}, ...}, ...}
+    The cameras are keyed by the "cameraname" of their configuration,
+    which is the only name the driver of a camera knows. The tokens
+    are the memory numbers of the presets.
+
+    Methods
+    -------
+    get(camera_name): dictionary
+        Return the presets of a camera by token.
+    set(camera_name, token, name, position):
+        Store a preset.
+    remove(camera_name, token):
+        Forget a preset.
+    """
+    def __init__(self, store_file=None):
+        self.store_file = store_file or globals.VISCA_PRESETS_FILE
+        self._cameras = None
+        self._lock = threading.Lock()
+
+    def get(self, camera_name):
+        with self._lock:
+            return dict(self._load().get(camera_name, dict()))
+
+    def set(self, camera_name, token, name, position):
+        with self._lock:
+            cameras = self._load()
+            cameras.setdefault(camera_name, dict())[token] = {
+                'name': name, 'position': list(position)
+            }
+            self._save(cameras)
+
+    def remove(self, camera_name, token):
+        with self._lock:
+            cameras = self._load()
+            if cameras.get(camera_name, dict()).pop(token, None) is not None:
+                self._save(cameras)
+
+    def _load(self):
+        if self._cameras is None:
+            try:
+                with open(self.store_file, 'rt', encoding='utf8') as f:
+                    self._cameras = json.load(f)
+            except (OSError, ValueError):
+                self._cameras = dict()
+        return self._cameras
+
+    def _save(self, cameras):
+        """Write the store atomically, so that a crash cannot leave a
+        partly written file behind.
+        """
+        temp_file = self.store_file.with_name(
+            f'{self.store_file.name}.{os.getpid()}.tmp')
+        with open(temp_file, 'wt', encoding='utf8') as f:
+            json.dump(cameras, f, indent=4)
+        os.replace(temp_file, self.store_file)
+
+
+store = PresetStore()
+
+
+class ViscaDriver(driver.Driver):
+    """Driver that talks to a camera with VISCA over IP.
+
+    Presets are camera memories, with their memory number as token.
+    Their names and positions are kept in the preset store. A goto
+    returns as soon as the camera acknowledges the recall. The camera
+    reports the completion of the recall when it has arrived, which
+    is picked up with the next request: until then, the camera counts
+    as moving. Recalls have no speed: a speed profile is ignored.
+
+    Requests are sent one at a time. A request without reply within
+    VISCA_TIMEOUT is sent again (with the same sequence number), up to
+    VISCA_RETRIES times, before it counts as failed.
+
+    Attributes
+    ----------
+    address: tuple
+        The (host, port) of the camera.
+    ranges: tuple
+        The (minimum, maximum) pan, tilt and zoom positions in the
+        camera's units.
+    max_presets: integer
+        The number of preset memories.
+
+    Methods
+    -------
+    See driver.Driver.
+    """
+    def __init__(self, config):
+        super().__init__(config)
+        self.address = (config['ip'], config.get('visca_port',
+                                                 globals.VISCA_PORT))
+        self.ranges = (
+            tuple(config.get('visca_pan_range', globals.VISCA_PAN_RANGE)),
+            tuple(config.get('visca_tilt_range', globals.VISCA_TILT_RANGE)),
+            tuple(config.get('visca_zoom_range', globals.VISCA_ZOOM_RANGE)),
+        )
+        self.max_presets = config.get('max_presets',
+                                      globals.VISCA_MAX_PRESETS)
+        self.timeout = config.get('visca_timeout', globals.VISCA_TIMEOUT)
+        self._socket = None
+        self._sequence = 0
+        self._recall = None     # (sequence number, time) of the recall
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Open the socket and reset the sequence number of the camera.
+        Return the presets from the preset store.
+        """
+        with self._lock:
+            try:
+                if self._socket is None:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    try:
+                        sock.connect(self.address)
+                    except OSError:
+                        sock.close()
+                        raise
+                    self._socket = sock
+                self._sequence = 0
+                self._send(CONTROL, RESET_SEQUENCE)
+            except Exception:
+                raise errors.CouldNotCreateCameraError
+        return self.get_presets()
+
+    def get_presets(self):
+        return [{'token': t, 'name': p['name'],
+                 'position': tuple(p['position'])}
+                for t, p in store.get(self.name).items()]
+
+    def set_preset(self, name=None, token=None):
+        """Save the current position in a preset memory: the given one
+        or the first free one. Raise errors.PresetLimitError if there
+        is no free memory.
+        """
+        presets = store.get(self.name)
+        if token is None:
+            token = next((str(n) for n in range(self.max_presets)
+                          if str(n) not in presets), None)
+            if token is None:
+                raise errors.PresetLimitError
+            name = name or f'Preset {token}'
+        elif name is None:
+            name = presets[token]['name'] if token in presets else token
+        position = self.get_status()['position']
+        self._memory(MEMORY_SET, token)
+        store.set(self.name, token, name, position)
+        return token
+
+    def goto_preset(self, token, speed=None):
+        with self._lock:
+            self._send(COMMAND, self._memory_payload(MEMORY_RECALL, token))
+            self._recall = (self._sequence, time.monotonic())
+
+    def remove_preset(self, token):
+        self._memory(MEMORY_RESET, token)
+        store.remove(self.name, token)
+
+    def stop(self):
+        with self._lock:
+            self._send(COMMAND,
+                       b'\x81\x01\x06\x01'
+                       + bytes((globals.VISCA_MAX_PAN_SPEED,
+                                globals.VISCA_MAX_TILT_SPEED))
+                       + b'\x03\x03\xff')
+            self._send(COMMAND, ZOOM_STOP)
+            self._recall = None
+
+    def get_status(self):
+        with self._lock:
+            pan_tilt = self._send(INQUIRY, PAN_TILT_INQUIRY,
+                                  wait_for=COMPLETION)
+            zoom = self._send(INQUIRY, ZOOM_INQUIRY, wait_for=COMPLETION)
+            if self._recall is not None and (time.monotonic()
+                    - self._recall[1] > globals.MOVE_TIMEOUT):
+                self._recall = None     # Its completion got lost.
+            is_moving = self._recall is not None
+        pan_range, tilt_range, zoom_range = self.ranges
+        position = (
+            from_units(decode_nibbles(pan_tilt[2:6]), pan_range),
+            from_units(decode_nibbles(pan_tilt[6:10]), tilt_range),
+            from_units(decode_nibbles(zoom[2:6], signed=False), zoom_range,
+                       low=0.0),
+        )
+        return {'position': position, 'is_moving': is_moving}
+
+    def absolute_move(self, position):
+        pan, tilt, zoom = position
+        pan_range, tilt_range, zoom_range = self.ranges
+        with self._lock:
+            self._send(COMMAND,
+                       b'\x81\x01\x06\x02'
+                       + bytes((globals.VISCA_MAX_PAN_SPEED,
+                                globals.VISCA_MAX_TILT_SPEED))
+                       + encode_nibbles(to_units(pan, pan_range))
+                       + encode_nibbles(to_units(tilt, tilt_range))
+                       + b'\xff')
+            self._send(COMMAND,
+                       b'\x81\x01\x04\x47'
+                       + encode_nibbles(to_units(zoom, zoom_range, low=0.0))
+                       + b'\xff')
+
+    def get_ptz_limits(self):
+        return {
+            'max_presets': self.max_presets,
+            'home_supported': True,
+            'pan_range': [-1.0, 1.0],
+            'tilt_range': [-1.0, 1.0],
+            'zoom_range': [0.0, 1.0],
+            'pan_tilt_speed_range': None,
+            'zoom_speed_range': None,
+        }
+
+    def _memory(self, action, token):
+        with self._lock:
+            self._send(COMMAND, self._memory_payload(action, token))
+
+    @staticmethod
+    def _memory_payload(action, token):
+        return bytes((0x81, 0x01, 0x04, 0x3f, action, int(token), 0xff))
+
+    def _send(self, payload_type, payload, wait_for=ACK):
+        """Send a message and return the payload of the reply: the
+        acknowledgement or the completion (wait_for). Raise
+        errors.ViscaError if the camera answers with an error message,
+        or errors.CameraTimeoutError if it does not answer. Callers 
+        hold the lock.
+        """
+        self.health.check()
+        self._sequence = (self._sequence + 1) & 0xffffffff
+        sequence = self._sequence
+        message = pack_message(payload_type, sequence, payload)
+        for _ in range(globals.VISCA_RETRIES + 1):
+            self._socket.send(message)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                reply = self._receive(deadline)
+                if reply is None:
+                    break   # Send again.
+                reply_type, reply_sequence, reply_payload = reply
+                if reply_sequence != sequence:
+                    continue
+                self.health.record_success()
+                if reply_type == CONTROL_REPLY:
+                    return reply_payload
+                if len(reply_payload) < 3:
+                    continue
+                kind = reply_payload[1] & 0xf0
+                if kind == ERROR:
+                    raise errors.ViscaError(reply_payload[2])
+                if kind == COMPLETION or (kind == ACK and wait_for == ACK):
+                    return reply_payload
+        self.health.record_failure()
+        raise errors.CameraTimeoutError(self.name)
+
+    def _receive(self, deadline):
+        """Return the next reply as unpacked by unpack_message, or None
+        if none arrives before deadline. The completion of a recall is
+        taken note of on the way.
+        """
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._socket.settimeout(remaining)
+            try:
+                reply = unpack_message(self._socket.recv(1024))
+            except (socket.timeout, ConnectionError):
+                return None
+            except ValueError:
+                continue
+            if self._recall is not None and reply[1] == self._recall[0] \
+                    and len(reply[2]) > 1 and reply[2][1] & 0xf0 in (
+                        COMPLETION, ERROR):
+                self._recall = None
+            return reply
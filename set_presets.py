@@ -1,51 +1,62 @@
 #coding: utf-8
 
-from ptzpresets.camera import Camera
-from ptzpresets.utils import read_config
-
-config = read_config('config_dev.json')
-
-presets_L = [
-    'Voorganger',
-    'Tafel',
-    'Tafel zoom',
-    'Muziekgroep',
-    'Middenschip',
-    'Transept',
-    'Orgel',
-    'Doopvont',
-    'Koper',
-    'Kansel overzicht',
-    'Zanger split',
-    'Preset%2014',
-    'Test',
-    'Zangers'
-]
-
-presets_R = [
-    'Kansel',
-    'Tafel',
-    'Tafel%20zoom',
-    'Muziekgroep',
-    'Middenschip',
-    'Transept',
-    'Orgel',
-    'Middenschip',
-    'Kansel overzicht',
-    'Doopvont',
-    'Preset%2011',
-    'Muziekgroep',
-    'Zanger transept',
-    'Kaars',
-    'Onze Vader',
-    'Zangers'
-]
-
-camera_L = Camera(config=config['Camera L'])
-camera_R = Camera(config=config['Camera R'])
-
-for p in presets_L:
-    camera_L.set_preset(p)
-
-for p in presets_R:
-    camera_R.set_preset(p)
+"""
+    Provision the presets of the cameras from a manifest: create,
+    rename and delete presets until each camera has exactly the
+    presets listed for it (see ptzpresets.provision.read_manifest).
+"""
+
+import argparse
+
+from ptzpresets import globals
+from ptzpresets import provision
+from ptzpresets import utils
+
+
+DEFAULT_MANIFEST_FILE = 'presets_manifest.json'
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        'manifest_file',
+        nargs='?',
+        help=(f'The manifest with the presets of each camera '
+              f'(default: {DEFAULT_MANIFEST_FILE}).'),
+        default=DEFAULT_MANIFEST_FILE
+    )
+    argparser.add_argument(
+        '--config', '-c',
+        dest='config_file',
+        help=('A configuration file, other than the default '
+              'config.json in the current directory.'),
+        default=globals.DEFAULT_CONFIG_FILE
+    )
+    argparser.add_argument(
+        '--dry-run', '-n',
+        action='store_true',
+        help='Only show what would be changed.'
+    )
+    argparser.add_argument(
+        '--keep',
+        action='store_true',
+        help='Keep the presets that are not in the manifest.'
+    )
+    args = argparser.parse_args()
+    config = utils.read_config(args.config_file)
+    manifest = provision.read_manifest(args.manifest_file)
+    unknown = [ckey for ckey in manifest if ckey not in config]
+    if unknown:
+        argparser.error(f'Unknown camera(s) in manifest: {", ".join(unknown)}')
+
+    results = provision.provision(config, manifest, delete=not args.keep, 
+                                  dry_run=args.dry_run)
+    for ckey, result in results.items():
+        if isinstance(result, Exception):
+            print(f'{ckey}: Failed ({result!r})')
+            continue
+        plan, names = result
+        if plan.is_empty() and not plan.duplicates:
+            print(f'{ckey}: Presets are up to date')
+        for line in plan.describe(names):
+            print(f'{ckey}: {line}')
@@ -6,9 +6,11 @@ from cx_Freeze import setup, Executable
 VERSION = input(f"{'*'*100}\nVersion: ")
 
 # Dependencies are automatically detected, but it might need
-# fine tuning.
+# fine tuning. The camera drivers are imported by name (see DRIVERS in
+# ptzpresets/driver.py), which the detection cannot follow: include
+# the whole ptzpresets package and the ONVIF libraries.
 build_options = {
-    'packages': [], 
+    'packages': ['ptzpresets', 'onvif', 'zeep'], 
     'excludes': [], 
     'include_files': [
         ('static', 'static'),